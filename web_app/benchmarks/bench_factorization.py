@@ -0,0 +1,60 @@
+'''
+Compare fit time and peak memory of the MFRecommender factorization backends.
+
+Run from the web_app directory:
+    python -m benchmarks.bench_factorization --k 100
+'''
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from recommendation.data_clean import Data_Clean
+from recommendation.useritem import UserItemMatrix
+from recommendation.factorization import BACKENDS, factorize
+
+def measure(func, *args, **kwargs):
+    '''
+    Description: run func once
+    Return:
+     result - what func returned
+     seconds - (float) wall time
+     peak_mb - (float) peak python/numpy memory allocated while func ran
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+def reconstruction_accuracy(user_item, u, s, vt, block_size=1024):
+    '''
+    Description: share of cells of the 0/1 matrix predicted right by round(u s vt), computed in blocks of rows
+    '''
+    errors = 0
+    us = u * s
+    for start in range(0, user_item.shape[0], block_size):
+        pred = np.round(us[start:start + block_size].dot(vt))
+        errors += np.abs(user_item[start:start + block_size].toarray() - pred).sum()
+    return 1 - errors / (user_item.shape[0] * user_item.shape[1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the MFRecommender factorization backends')
+    parser.add_argument('--interact-pth', default='data/user-item-interactions.csv')
+    parser.add_argument('--articles-pth', default='data/articles_community.csv')
+    parser.add_argument('--k', type=int, default=100, help='number of factors')
+    parser.add_argument('--backends', nargs='+', default=sorted(BACKENDS), choices=sorted(BACKENDS))
+    args = parser.parse_args()
+
+    dc = Data_Clean(args.interact_pth, args.articles_pth)
+    user_item = UserItemMatrix.from_interactions(dc.interacts_clean).csr
+    print('user-item matrix {} x {}, {} interactions'.format(user_item.shape[0], user_item.shape[1], user_item.nnz))
+    print('{:<12}{:>10}{:>14}{:>12}'.format('backend', 'fit (s)', 'peak (MB)', 'accuracy'))
+    for backend in args.backends:
+        (u, s, vt), seconds, peak_mb = measure(factorize, user_item, backend, k=args.k)
+        accuracy = reconstruction_accuracy(user_item, u, s, vt)
+        print('{:<12}{:>10.3f}{:>14.1f}{:>12.4f}'.format(backend, seconds, peak_mb, accuracy))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+'''
+Benchmark suite of the recommender hot paths.
+
+Every case is timed on the interaction data scaled 1x, 10x and 100x and its peak memory is measured
+in a separate run under tracemalloc (so the tracing does not slow the timed runs down). A scaled
+dataset holds `scale` copies of the users and articles, each copy with its own emails, article ids and
+titles, and is written once into the work directory. With --synthetic the datasets are generated by
+recommendation.synthetic instead (scale times the size of the IBM data), no data files are needed.
+
+Results are compared with a stored baseline, a case slower or larger than the baseline by more than
+the tolerance fails the run (exit status 1). --save-baseline stores the results of this run instead,
+without it a missing baseline fails the run before anything is measured.
+
+Run from the web_app directory:
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --scales 1 10 --cases ucf_user_advance_recs cb_make_content_recs
+    python -m benchmarks.bench_suite --synthetic --baseline benchmarks/baseline-synthetic.json
+    python -m benchmarks.bench_suite --save-baseline
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from recommendation.data_clean import Data_Clean
+from recommendation.recommender import Recommender
+from recommendation.mfrecommender import MFRecommender
+from recommendation.segments import LIGHT, HEAVY
+from recommendation import synthetic
+
+# users asked for by the per user cases, and calls of the rank based case
+SAMPLE_USERS = 200
+RANK_CALLS = 10000
+# the dense MF fit holds the train matrix as float64 several times, larger train matrices are skipped
+MF_MAX_CELLS = 5 * 10**7
+
+def scale_dataset(interact_pth, articles_pth, scale, work_dir):
+    '''
+    Description: write the interactions and articles repeated scale times, copy 0 is the original data
+    Args:
+     interact_pth, articles_pth - csv files of the original data
+     scale - (int) number of copies
+     work_dir - directory the scaled csv files are written to, they are reused when they exist
+    Return:
+     interact_pth, articles_pth - csv files of the scaled data
+    '''
+    if scale == 1:
+        return interact_pth, articles_pth
+    out_dir = os.path.join(work_dir, 'x{}'.format(scale))
+    out_interact = os.path.join(out_dir, 'user-item-interactions.csv')
+    out_articles = os.path.join(out_dir, 'articles_community.csv')
+    if os.path.exists(out_interact) and os.path.exists(out_articles):
+        return out_interact, out_articles
+    os.makedirs(out_dir, exist_ok=True)
+    interacts = pd.read_csv(interact_pth).drop(columns=['Unnamed: 0'])
+    articles = pd.read_csv(articles_pth).drop(columns=['Unnamed: 0'])
+    # article ids of copy i are shifted by i * span, so the copies never share an article
+    span = int(max(interacts['article_id'].max(), articles['article_id'].max())) + 1
+    interact_copies, article_copies = [], []
+    for i in range(scale):
+        copy = interacts.copy()
+        copy['article_id'] = copy['article_id'] + i * span
+        if i > 0:
+            copy['title'] = copy['title'] + ' ({})'.format(i)
+            copy['email'] = copy['email'].where(copy['email'].isnull(), copy['email'] + '-{}'.format(i))
+        interact_copies.append(copy)
+        copy = articles.copy()
+        copy['article_id'] = copy['article_id'] + i * span
+        if i > 0:
+            copy['doc_full_name'] = copy['doc_full_name'] + ' ({})'.format(i)
+        article_copies.append(copy)
+    pd.concat(interact_copies, ignore_index=True).to_csv(out_interact)
+    pd.concat(article_copies, ignore_index=True).to_csv(out_articles)
+    return out_interact, out_articles
+
+def synthetic_dataset(scale, work_dir, seed=0):
+    '''
+    Description: a synthetic dataset scale times the size of the IBM data, generated once into work_dir
+    Return:
+     interact_pth, articles_pth - csv files of the dataset
+    '''
+    out_dir = os.path.join(work_dir, 'synthetic-x{}-{}'.format(scale, seed))
+    interact_pth = os.path.join(out_dir, synthetic.INTERACTIONS_FILE)
+    articles_pth = os.path.join(out_dir, synthetic.ARTICLES_FILE)
+    if os.path.exists(interact_pth) and os.path.exists(articles_pth):
+        return interact_pth, articles_pth
+    return synthetic.write_dataset(out_dir, scale, seed)
+
+
+class Context():
+    '''
+    Class: Data of one scale shared by the cases, the Recommender is built on first use
+    '''
+    def __init__(self, interact_pth, articles_pth, seed=0):
+        self.interact_pth = interact_pth
+        self.articles_pth = articles_pth
+        self.rng = random.Random(seed)
+        self._rec = None
+
+    @property
+    def rec(self):
+        if self._rec is None:
+            self._rec = Recommender(self.interact_pth, self.articles_pth)
+        return self._rec
+
+    def sample_users(self, segment):
+        user_ids = self.rec.segments.user_ids(segment).tolist()
+        return self.rng.sample(user_ids, min(SAMPLE_USERS, len(user_ids)))
+
+# case name -> setup(ctx), which returns the function to measure (or None when the case does not fit the
+# scale) and the number of operations it runs
+def setup_data_clean(ctx):
+    return (lambda: Data_Clean(ctx.interact_pth, ctx.articles_pth, use_snapshot=False)), 1
+
+def setup_recommender_init(ctx):
+    return (lambda: Recommender(ctx.interact_pth, ctx.articles_pth)), 1
+
+def setup_ucf_user_advance_recs(ctx):
+    ucfr, user_ids = ctx.rec.ucfr, ctx.sample_users(HEAVY)
+    return (lambda: [ucfr.user_advance_recs(user_id, 10) for user_id in user_ids]), len(user_ids)
+
+def setup_cb_make_content_recs(ctx):
+    cbr, user_ids = ctx.rec.cbr, ctx.sample_users(LIGHT)
+    return (lambda: [cbr.make_content_recs(user_id, 10) for user_id in user_ids]), len(user_ids)
+
+def setup_rb_get_top_articles(ctx):
+    rbr = ctx.rec.rbr
+    return (lambda: [rbr.get_top_articles(10) for _ in range(RANK_CALLS)]), RANK_CALLS
+
+def setup_mf_calculate_error(ctx):
+    train_uim, test_uim = ctx.rec.mfr.train_uim, ctx.rec.mfr.test_uim
+    if train_uim.shape[0] * train_uim.shape[1] > MF_MAX_CELLS:
+        return None, 0
+
+    def fit():
+        # no on-disk cache, every run fits
+        mfr = MFRecommender(None, None, cache_dir=None, train_uim=train_uim, test_uim=test_uim, catalog=ctx.rec.catalog)
+        return mfr.calculate_error()
+    return fit, 1
+
+CASES = {
+    'data_clean': setup_data_clean,
+    'recommender_init': setup_recommender_init,
+    'ucf_user_advance_recs': setup_ucf_user_advance_recs,
+    'cb_make_content_recs': setup_cb_make_content_recs,
+    'rb_get_top_articles': setup_rb_get_top_articles,
+    'mf_calculate_error': setup_mf_calculate_error,
+}
+
+def measure(func, repeat):
+    '''
+    Description: median wall time of repeat runs, then the peak memory of one more run under tracemalloc
+    Return:
+     seconds - (float) median seconds of one run
+     peak_mb - (float) peak python/numpy memory allocated by one run
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / 2**20
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    '''
+    Description: cases of results slower or larger than the baseline beyond the tolerances
+    Return:
+     regressions - list of messages
+    '''
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['seconds'] > base['seconds'] * (1 + time_tolerance):
+            regressions.append('{}: {:.4f}s, baseline {:.4f}s'.format(key, result['seconds'], base['seconds']))
+        if result['peak_mb'] > base['peak_mb'] * (1 + memory_tolerance):
+            regressions.append('{}: {:.1f} MB peak, baseline {:.1f} MB'.format(key, result['peak_mb'], base['peak_mb']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and peak memory of the recommender hot paths at several data scales')
+    parser.add_argument('--interact-pth', default='data/user-item-interactions.csv')
+    parser.add_argument('--articles-pth', default='data/articles_community.csv')
+    parser.add_argument('--work-dir', default='data/bench', help='directory of the scaled datasets')
+    parser.add_argument('--synthetic', action='store_true', help='generated datasets instead of the scaled data files')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default='benchmarks/baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--time-tolerance', type=float, default=0.3, help='allowed slow down, 0.3 is 30%%')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1, help='allowed peak memory growth')
+    args = parser.parse_args()
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        # nothing to compare with, a run would pass whatever it measured
+        print('no baseline at {}, store one with --save-baseline'.format(args.baseline))
+        sys.exit(1)
+
+    results = dict()
+    print('{:<24}{:>7}{:>12}{:>12}{:>12}'.format('case', 'scale', 'seconds', 'ms / op', 'peak MB'))
+    for scale in args.scales:
+        if args.synthetic:
+            ctx = Context(*synthetic_dataset(scale, args.work_dir))
+        else:
+            ctx = Context(*scale_dataset(args.interact_pth, args.articles_pth, scale, args.work_dir))
+        for name in args.cases:
+            func, n_ops = CASES[name](ctx)
+            if func is None:
+                print('{:<24}{:>7}{:>12}'.format(name, scale, 'skipped'))
+                continue
+            seconds, peak_mb = measure(func, args.repeat)
+            results['{}@{}'.format(name, scale)] = {'seconds': seconds, 'peak_mb': peak_mb, 'ops': n_ops}
+            print('{:<24}{:>7}{:>12.4f}{:>12.3f}{:>12.1f}'.format(name, scale, seconds, seconds / n_ops * 1000, peak_mb))
+
+    if args.save_baseline:
+        baseline = {'machine': platform.platform(), 'python': platform.python_version(), 'numpy': np.__version__,
+                    'synthetic': args.synthetic, 'results': results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print('baseline written to {}'.format(args.baseline))
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline['results'], args.time_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    if regressions:
+        sys.exit(1)
+    print('no regression against {}'.format(args.baseline))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+'''
+Load test of the JSON recommendation API.
+
+Concurrent clients call GET /api/recommend for random users (and optionally POST /api/recommend/batch)
+and the latency percentiles and throughput of every endpoint are reported. Without --url the web app
+is imported and served in process by the Flask test client (configured by the same REC_* environment
+variables, with REC_STARTUP defaulting to parallel), with --url the requests go over http to a running
+server (gunicorn, uvicorn rec_app.asgi:application, ...).
+
+Run from the web_app directory:
+    python -m benchmarks.load_test --clients 8 --requests 2000
+    python -m benchmarks.load_test --url http://127.0.0.1:3001 --batch-size 100
+'''
+import argparse
+import os
+import json
+import random
+import threading
+import time
+import urllib.request
+import numpy as np
+
+class HttpClient():
+    '''
+    Class: Requests over http to a running server
+    '''
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def get(self, path):
+        with urllib.request.urlopen(self.url + path) as response:
+            response.read()
+            return response.status
+
+    def post(self, path, payload):
+        request = urllib.request.Request(self.url + path, data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            return response.status
+
+class AppClient():
+    '''
+    Class: Requests to an in process app through the Flask test client
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, path):
+        with self.app.test_client() as client:
+            return client.get(path).status_code
+
+    def post(self, path, payload):
+        with self.app.test_client() as client:
+            return client.post(path, json=payload).status_code
+
+def in_process_app():
+    # measure the built models, not the rank based answers of a background startup
+    os.environ.setdefault('REC_STARTUP', 'parallel')
+    from rec_app import app
+
+    return app, app.extensions['recommender'].uim.user_ids.tolist()
+
+def percentiles(latencies):
+    '''
+    Description: p50, p90, p99 and max of latencies, in milliseconds
+    '''
+    ms = np.asarray(latencies) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 90), np.percentile(ms, 99), ms.max()
+
+def run(client, user_ids, clients, n_requests, top_n, batch_size, seed=0):
+    '''
+    Description: n_requests requests spread over clients threads
+    Return:
+     latencies - dict endpoint -> list of seconds
+     errors - number of requests that failed or did not answer 200
+     seconds - wall time
+    '''
+    latencies = {'recommend': [], 'batch': []}
+    errors = [0]
+    lock = threading.Lock()
+    per_client = n_requests // clients
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        local = {'recommend': [], 'batch': []}
+        n_errors = 0
+        for _ in range(per_client):
+            start = time.perf_counter()
+            try:
+                if batch_size and rng.random() < 0.1:
+                    endpoint = 'batch'
+                    status = client.post('/api/recommend/batch', {'user_ids': rng.sample(user_ids, min(batch_size, len(user_ids))), 'n': top_n})
+                else:
+                    endpoint = 'recommend'
+                    status = client.get('/api/recommend?user_id={}&n={}'.format(rng.choice(user_ids), top_n))
+            except Exception:
+                n_errors += 1
+                continue
+            local[endpoint].append(time.perf_counter() - start)
+            n_errors += status != 200
+        with lock:
+            for endpoint, values in local.items():
+                latencies[endpoint].extend(values)
+            errors[0] += n_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency percentiles of the JSON recommendation API under concurrent load')
+    parser.add_argument('--url', default=None, help='base url of a running server, the API is served in process when left out')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=50, help='users per batch request, 0 sends no batch requests')
+    parser.add_argument('--max-user-id', type=int, default=5149, help='users asked for with --url are 1 to this id')
+    args = parser.parse_args()
+
+    if args.url is None:
+        app, user_ids = in_process_app()
+        client = AppClient(app)
+    else:
+        client = HttpClient(args.url)
+        user_ids = list(range(1, args.max_user_id + 1))
+    # a short warm up so one time costs (lazy builds, first imports) are not measured
+    run(client, user_ids, 1, 20, args.top_n, args.batch_size, seed=-1)
+
+    latencies, errors, seconds = run(client, user_ids, args.clients, args.requests, args.top_n, args.batch_size)
+    n_done = sum(len(values) for values in latencies.values())
+    print('{} requests from {} clients in {:.2f}s, {:.0f} requests/s, {} errors'.format(
+        n_done, args.clients, seconds, n_done / seconds if seconds else 0.0, errors))
+    print('{:<12}{:>8}{:>10}{:>10}{:>10}{:>10}'.format('endpoint', 'count', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for endpoint, values in latencies.items():
+        if values:
+            print('{:<12}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(endpoint, len(values), *percentiles(values)))
+
+if __name__ == '__main__':
+    main()
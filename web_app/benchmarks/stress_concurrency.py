@@ -0,0 +1,104 @@
+'''
+Concurrency stress check of one shared Recommender.
+
+Many threads ask for recommendations with different top_n while another thread adds interactions.
+Every answer has to be exactly the answer a single threaded Recommender gives either before or after
+the update, and once the update is published only the after answers are allowed. Exits with status 1
+on any mismatch or error.
+
+Run from the web_app directory:
+    python -m benchmarks.stress_concurrency --threads 8 --seconds 10
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from recommendation.recommender import Recommender
+
+def expected_answers(rec, requests):
+    return {(user_id, top_n): rec.recommend_articles(user_id, top_n) for user_id, top_n in requests}
+
+def update_batch(rec, n_users=20, n_articles=5, seed=0):
+    '''
+    Description: interactions of new users with popular articles, they change the neighbor lists of existing users
+    '''
+    rng = random.Random(seed)
+    popular = rec.uim.article_ids[np.argsort(-rec.uim.article_counts)[:50]].tolist()
+    batch = []
+    for i in range(n_users):
+        for article_id in rng.sample(popular, min(n_articles, len(popular))):
+            batch.append({'email': 'stress-user-{}@example.com'.format(i), 'article_id': article_id})
+    return batch
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that concurrent requests on one Recommender match single threaded answers')
+    parser.add_argument('--interact-pth', default='data/user-item-interactions.csv')
+    parser.add_argument('--articles-pth', default='data/articles_community.csv')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=200, help='number of users asked for')
+    args = parser.parse_args()
+
+    rec = Recommender(args.interact_pth, args.articles_pth)
+    # the emails of the update are not written to the user map of the data directory
+    user_map_pth = os.path.join(tempfile.mkdtemp(), 'user_map.csv')
+    rec.user_map_pth = user_map_pth
+    rng = random.Random(42)
+    user_ids = rec.uim.user_ids.tolist()
+    # existing users of every segment, one unknown user and the users the update adds
+    batch = update_batch(rec)
+    new_user_ids = list(range(rec.user_map.next_id, rec.user_map.next_id + len({row['email'] for row in batch})))
+    asked = rng.sample(user_ids, min(args.users, len(user_ids))) + [-1] + new_user_ids
+    requests = [(user_id, top_n) for user_id in asked for top_n in (1, 5, 10, 20)]
+
+    # single threaded reference answers, before and after the update
+    before = expected_answers(rec, requests)
+    reference = Recommender(args.interact_pth, args.articles_pth)
+    reference.user_map_pth = user_map_pth
+    reference.add_interactions(batch)
+    after = expected_answers(reference, requests)
+
+    errors = []
+    counts = [0] * args.threads
+    published = threading.Event()
+    stop = time.perf_counter() + args.seconds
+
+    def reader(i):
+        local = random.Random(i)
+        while time.perf_counter() < stop and len(errors) < 10:
+            key = local.choice(requests)
+            was_published = published.is_set()
+            try:
+                recs = rec.recommend_articles(*key)
+            except Exception as e:
+                errors.append('{}: {!r}'.format(key, e))
+                continue
+            allowed = [after[key]] if was_published else [before[key], after[key]]
+            if recs not in allowed:
+                errors.append('{}: unexpected answer {}'.format(key, recs))
+            counts[i] += 1
+
+    def writer():
+        time.sleep(args.seconds / 3)
+        rec.add_interactions(batch)
+        published.set()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.threads)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print('{} requests on {} threads, model version {}'.format(sum(counts), args.threads, rec.version))
+    for error in errors:
+        print(error)
+    if errors:
+        sys.exit(1)
+    print('all answers match the single threaded ones')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import numbers
+from flask import Blueprint, current_app, request, jsonify
+
+# JSON recommendation API, registered on an app together with its Recommender by init_api:
+#  GET  /api/recommend?user_id=<int>&n=<int>         - recommendations of one user
+#  POST /api/recommend/batch {"user_ids": [...], "n": <int>} - recommendations of many users, scored together
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# largest n and number of users of one batch a request may ask for
+MAX_N = 100
+MAX_BATCH = 1000
+
+class InvalidRequest(ValueError):
+    '''
+    Class: A request parameter the API cannot answer, returned to the client as a 400 error
+    '''
+
+def init_api(app, rec):
+    '''
+    Description: register the API on app, answered by rec
+    Args:
+     app - Flask app
+     rec - Recommender
+    Return:
+     N/A
+    '''
+    app.extensions['recommender'] = rec
+    app.register_blueprint(api)
+
+def parse_int(value, name, low=None, high=None):
+    '''
+    Description: an integer request parameter, raise InvalidRequest with a message for the client otherwise
+    '''
+    if isinstance(value, bool):
+        raise InvalidRequest('{} must be an integer'.format(name))
+    if isinstance(value, numbers.Integral):
+        number = int(value)
+    else:
+        try:
+            number = int(str(value).strip())
+        except ValueError:
+            raise InvalidRequest('{} must be an integer'.format(name))
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise InvalidRequest('{} must be between {} and {}'.format(name, low, high))
+    return number
+
+def article_number(article_id):
+    '''
+    Description: an article id as a JSON number, 1430.0 becomes 1430
+    '''
+    number = float(article_id)
+    return int(number) if number.is_integer() else number
+
+def result(rec, user_id, answer):
+    '''
+    Description: JSON body of one Answer, every recommended article with its own id and title
+    '''
+    catalog = rec.catalog
+    return {'user_id': user_id, 'strategy': answer.strategy,
+            'recommendations': [{'article_id': article_number(aid), 'title': catalog.title(aid)}
+                                for aid in answer.article_ids]}
+
+@api.errorhandler(InvalidRequest)
+def bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
+@api.route('/recommend')
+def recommend():
+    rec = current_app.extensions['recommender']
+    if 'user_id' not in request.args:
+        raise InvalidRequest('user_id is required')
+    user_id = parse_int(request.args['user_id'], 'user_id')
+    top_n = parse_int(request.args.get('n', rec.top_n), 'n', 1, MAX_N)
+    return jsonify(result(rec, user_id, rec.recommend_answer(user_id, top_n)))
+
+@api.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    rec = current_app.extensions['recommender']
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('user_ids'), list):
+        raise InvalidRequest('expected {"user_ids": [...], "n": <int>}')
+    if not 0 < len(payload['user_ids']) <= MAX_BATCH:
+        raise InvalidRequest('user_ids must hold 1 to {} user ids'.format(MAX_BATCH))
+    user_ids = [parse_int(user_id, 'user_ids') for user_id in payload['user_ids']]
+    top_n = parse_int(payload.get('n', rec.top_n), 'n', 1, MAX_N)
+    answers = rec.recommend_many(user_ids, top_n)
+    return jsonify({'results': [result(rec, user_id, answers[user_id]) for user_id in user_ids]})
@@ -0,0 +1,10 @@
+# ASGI entry point, for example: uvicorn rec_app.asgi:application
+# The Flask app (WSGI) runs in the thread pool of asgiref, which is only needed for this entry point;
+# gunicorn serves recommendation_app:app without it.
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    raise ImportError("Serving over ASGI needs asgiref: pip install asgiref")
+from rec_app import app
+
+application = WsgiToAsgi(app)
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import numpy as np
+import plotly
+from plotly.graph_objs import Scatter, Bar
+from flask import Blueprint, current_app, request, render_template, make_response, jsonify
+
+# The graphs of the index page are built by a background job into one json file
+#  {"format", "model_id", "version", "generated", "graphs": [plotly figures]}
+# and served from it, the page itself never computes anything. The file is replaced atomically, so
+# every worker of the web app can serve the one a job of any worker wrote.
+DASHBOARD_FORMAT = 1
+# number of articles of the popularity graph
+TOP_ARTICLES = 20
+
+# pages served from the artifact, registered on an app together with its Dashboard by init_dashboard:
+#  GET  / and /index       - the home page with the graphs
+#  GET  /dashboard.json    - the artifact itself
+#  POST /dashboard/refresh - rebuild the artifact in the background
+pages = Blueprint('dashboard', __name__)
+
+logger = logging.getLogger(__name__)
+
+def figure(traces, title, xaxis, yaxis):
+    return {'data': traces, 'layout': {'title': title, 'xaxis': {'title': xaxis}, 'yaxis': {'title': yaxis}}}
+
+def build_graphs(state):
+    '''
+    Description: plotly figures of the dashboard, every graph comes from the same published state,
+                 the MF curve is fitted first when needed
+    Args:
+     state - ModelState of a Recommender, its MF recommender built
+    Return:
+     graphs - list of plotly figures
+    '''
+    latent_factors_num, test_accuracy, train_accuracy = state.components['mfr'].calculate_error()
+    uim = state.uim
+    top = np.argsort(-uim.article_counts, kind='stable')[:TOP_ARTICLES]
+    top_titles = [state.catalog.title(aid) or str(aid) for aid in uim.article_ids[top].tolist()]
+    # number of users per number of articles read
+    users_per_count = np.bincount(uim.user_counts.astype(np.int64))
+    counts = np.flatnonzero(users_per_count)
+    segments = state.segments.counts()
+    return [
+        figure([Scatter(x=latent_factors_num, y=train_accuracy, mode='lines', name='train_accuracy'),
+                Scatter(x=latent_factors_num, y=test_accuracy, mode='lines', name='test_accuracy')],
+               'Accuracy vs. Number of Latent Factors', 'Number of Latent Factors', 'Accuracy Rate'),
+        figure([Bar(x=top_titles, y=uim.article_counts[top], name='users')],
+               'Most Read Articles', 'Article', 'Number of Users'),
+        figure([Bar(x=counts, y=users_per_count[counts], name='users')],
+               'Articles Read per User', 'Number of Articles', 'Number of Users'),
+        figure([Bar(x=list(segments.keys()), y=list(segments.values()), name='users')],
+               'Users per Recommender Segment', 'Segment', 'Number of Users'),
+    ]
+
+
+class Dashboard():
+    '''
+    Class: Dashboard json artifact of a Recommender, built in a background thread and cached on disk
+    The served body, its ETag and Last-Modified time only change when a job writes a new file.
+    '''
+    def __init__(self, rec, path='data/dashboard.json'):
+        '''
+        Description: initiate Dashboard, a refresh starts when the file is missing or was built from other data
+        Args:
+         rec - Recommender
+         path - json file of the artifact
+        Return:
+         N/A
+        '''
+        self.rec = rec
+        self.path = path
+        self.lock = threading.Lock()
+        self.thread = None
+        self.error = None
+        # (mtime of the file, artifact), replaced as a whole
+        self.current = None
+        artifact = self.load()
+        if artifact is None or artifact['model_id'] != rec.state.model_id:
+            self.refresh()
+
+    def load(self):
+        '''
+        Description: the cached artifact, read again when a job replaced the file
+        Return:
+         artifact - dict with body, etag, last_modified, model_id and graphs_json (the plotly figures encoded as
+                    json), None before the first job finished
+        '''
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        current = self.current
+        if current is None or current[0] != mtime:
+            with open(self.path, 'rb') as f:
+                body = f.read()
+            data = json.loads(body)
+            if data.get('format') != DASHBOARD_FORMAT:
+                return None
+            artifact = {'body': body, 'etag': hashlib.sha1(body).hexdigest(), 'last_modified': data['generated'],
+                        'model_id': data['model_id'], 'graphs_json': json.dumps(data['graphs'])}
+            current = (mtime, artifact)
+            self.current = current
+        return current[1]
+
+    @property
+    def refreshing(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def refresh(self):
+        '''
+        Description: rebuild the artifact in a background thread
+        Return:
+         started - False when a refresh is already running
+        '''
+        with self.lock:
+            if self.refreshing:
+                return False
+            self.thread = threading.Thread(target=self.write, daemon=True)
+            self.thread.start()
+            return True
+
+    def write(self):
+        '''
+        Description: build the artifact and replace the file, the job of refresh
+        '''
+        try:
+            # built before the state is read, so the one state the graphs and the ids come from holds it
+            self.rec.component('mfr')
+            state = self.rec.state
+            data = {'format': DASHBOARD_FORMAT, 'model_id': state.model_id, 'version': state.version,
+                    'generated': time.time(), 'graphs': build_graphs(state)}
+            body = json.dumps(data, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, self.path)
+            self.error = None
+        except Exception as e:
+            # the previous artifact keeps being served, the error is logged and reported by /dashboard.json
+            logger.exception('building the dashboard %s failed', self.path)
+            self.error = repr(e)
+
+
+def init_dashboard(app, dashboard):
+    '''
+    Description: register the dashboard pages on app, served from dashboard
+    Args:
+     app - Flask app
+     dashboard - Dashboard
+    Return:
+     N/A
+    '''
+    app.extensions['dashboard'] = dashboard
+    app.register_blueprint(pages)
+
+def conditional(response, artifact):
+    # ETag and Last-Modified of the dashboard artifact, a browser holding it gets a 304
+    if artifact is not None:
+        response.set_etag(artifact['etag'])
+        response.last_modified = artifact['last_modified']
+    return response.make_conditional(request)
+
+# index webpage displays cool visuals and receives user input text for model
+@pages.route('/')
+@pages.route('/index')
+def index():
+    # the graphs come from the dashboard artifact, the page shows none until its first job finished
+    artifact = current_app.extensions['dashboard'].load()
+    graphs_json = artifact['graphs_json'] if artifact is not None else '[]'
+    ids = ["graph-{}".format(i) for i, _ in enumerate(json.loads(graphs_json))]
+
+    # render web page with plotly graphs
+    return conditional(make_response(render_template('master.html', ids=ids, graphJSON=graphs_json)), artifact)
+
+# the dashboard artifact itself
+@pages.route('/dashboard.json')
+def dashboard_json():
+    dashboard = current_app.extensions['dashboard']
+    artifact = dashboard.load()
+    if artifact is None:
+        # error is the failure of the last build, a POST to /dashboard/refresh tries again
+        refreshing = dashboard.refreshing
+        if dashboard.error is not None and not refreshing:
+            return jsonify({'error': 'building the dashboard failed: {}'.format(dashboard.error), 'refreshing': refreshing}), 503
+        return jsonify({'error': 'the dashboard is being built', 'refreshing': refreshing}), 503
+    return conditional(current_app.response_class(artifact['body'], mimetype='application/json'), artifact)
+
+# regenerate the dashboard artifact in the background
+@pages.route('/dashboard/refresh', methods=['POST'])
+def refresh_dashboard():
+    dashboard = current_app.extensions['dashboard']
+    started = dashboard.refresh()
+    return jsonify({'started': started, 'refreshing': dashboard.refreshing}), 202
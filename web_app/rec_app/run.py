@@ -1,65 +1,52 @@
 from rec_app import app
+import os
 import json
-import plotly
 import pandas as pd
 # The home directory is the location recommendation_app.py that run app.
 # so import Recommender need add recommendation directory
 from recommendation.recommender import Recommender
+from recommendation.cache import RecommendationCache
+from recommendation.precompute import PrecomputedRecommendations
+from recommendation.metrics import Metrics, SlowRequestProfiler
+from rec_app.api import init_api
+from rec_app.dashboard import Dashboard, init_dashboard
 from flask import Flask
-from flask import render_template, request, jsonify
-from plotly.graph_objs import Scatter
+from flask import render_template, request, jsonify, Response
 
 
 #app = Flask(__name__)  #This should not be used, or app will use this and index.html cannot be found.
 
-rec=Recommender()
-
-
-# index webpage displays cool visuals and receives user input text for model
-@app.route('/')
-@app.route('/index')
-def index():
-    import pdb
-    #pdb.set_trace()
-    # extract data needed for visuals
-    # TODO: Below is an example - modify to extract data for your own visuals
-    ## 1st plot data
-    latent_factors_num,test_accuracy,train_accuracy=rec.mf_calculate_error()
-    # create visuals
-    # TODO: Below is an example - modify to create your own visuals
-    graphs = [
-        {
-            'data': [
-                Scatter(
-                    x=latent_factors_num,
-                    y=train_accuracy,
-                    mode = 'lines',
-                    name = 'train_accuracy'
-                ),
-                Scatter(
-                    x=latent_factors_num,
-                    y=test_accuracy,
-                    mode = 'lines',
-                    name = 'test_accuracy'
-                )
-            ],
-            'layout': {
-                'title': 'Accuracy vs. Number of Latent Factors',
-                'yaxis': {
-                    'title': "Accuracy Rate"
-                },
-                'xaxis': {
-                    'title': "Number of Latent Factors"
-                }
-            }
-        }
-    ]
-    # encode plotly graphs in JSON
-    ids = ["graph-{}".format(i) for i, _ in enumerate(graphs)]
-    graphJSON = json.dumps(graphs, cls=plotly.utils.PlotlyJSONEncoder)
-
-    # render web page with plotly graphs
-    return render_template('master.html', ids=ids, graphJSON=graphJSON)
+# background startup: the worker answers with rank based recommendations while the other models build,
+# REC_STARTUP=eager|parallel|lazy selects another mode of Recommender
+# results are cached per user, REC_CACHE_DIR shares them between the gunicorn workers
+cache_backend=None
+if os.environ.get('REC_CACHE_DIR'):
+    from cachelib import FileSystemCache
+    cache_backend=FileSystemCache(os.environ['REC_CACHE_DIR'])
+cache=RecommendationCache(max_size=int(os.environ.get('REC_CACHE_SIZE', 10000)),
+                          ttl=float(os.environ.get('REC_CACHE_TTL', 300)), backend=cache_backend)
+# REC_PRECOMPUTED is the output directory of python -m recommendation.precompute
+precomputed=PrecomputedRecommendations(os.environ['REC_PRECOMPUTED']) if os.environ.get('REC_PRECOMPUTED') else None
+# request counters and latencies, served at /metrics
+metrics=Metrics()
+# REC_PROFILE_SAMPLE=0.01 profiles 1% of the requests and writes the stats of the ones slower than
+# REC_PROFILE_THRESHOLD seconds to REC_PROFILE_DIR
+profiler=None
+if os.environ.get('REC_PROFILE_SAMPLE'):
+    profiler=SlowRequestProfiler(os.environ.get('REC_PROFILE_DIR', 'data/profiles'),
+                                 threshold=float(os.environ.get('REC_PROFILE_THRESHOLD', 0.1)),
+                                 sample_rate=float(os.environ['REC_PROFILE_SAMPLE']), metrics=metrics)
+# REC_ARTIFACT is the output directory of python -m recommendation.artifact, the workers then share its models
+rec=Recommender(startup=os.environ.get('REC_STARTUP', 'background'), cache=cache, precomputed=precomputed,
+                artifact_pth=os.environ.get('REC_ARTIFACT') or None, metrics=metrics, profiler=profiler)
+# JSON API under /api
+init_api(app, rec)
+
+
+# the graphs of the index page, built by a background job into REC_DASHBOARD (data/dashboard.json)
+dashboard=Dashboard(rec, os.environ.get('REC_DASHBOARD', 'data/dashboard.json'))
+# the home page, /dashboard.json and /dashboard/refresh
+init_dashboard(app, dashboard)
 
 
 # web page that handles user query and displays model results
@@ -68,8 +55,14 @@ def go():
     # save user input in query
     query = request.args.get('query', '')
 
+    try:
+        user_id = int(query)
+    except ValueError:
+        # not a user id, show the page without recommendations
+        return render_template('go.html', query=query, articles_result=[]), 400
+
     # use model to predict classification for query
-    articles = rec.recommend_articles(int(query))
+    articles = rec.recommend_articles(user_id)
 
     # This will render the go.html Please see that file.
     return render_template(
@@ -79,8 +72,31 @@ def go():
     )
 
 
+# endpoint that appends new interactions to the running recommender
+@app.route('/interactions', methods=['POST'])
+def add_interactions():
+    # expected body: {"interactions": [{"article_id": 1430, "title": "...", "email": "..."}, ...]}
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('interactions')
+    if not isinstance(payload, list) or len(payload) == 0:
+        return jsonify({'error': 'expected a non empty list of interactions'}), 400
+    try:
+        n_added = rec.add_interactions(payload)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'received': len(payload), 'added': n_added})
+
+
+# Prometheus metrics of this worker
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(rec), mimetype='text/plain; version=0.0.4')
+
+
 def main():
-    app.run(host='127.0.0.1', port=3001, debug=True)
+    # the debugger allows running code from the browser, it is only turned on with FLASK_DEBUG=1
+    app.run(host='127.0.0.1', port=3001, debug=os.environ.get('FLASK_DEBUG') == '1')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from recommendation import snapshot
+from recommendation.useritem import UserItemMatrix
+from recommendation.catalog import ArticleCatalog
+from recommendation.segments import UserSegments
+from recommendation.neighbors import NeighborIndex
+from recommendation.rbrecommender import RBRecommender
+from recommendation.ucfrecommender import UCFRecommender
+from recommendation.cbrecommender import CBRecommender
+from recommendation.mfrecommender import MFRecommender
+
+# Built models of a Recommender, written once and memory mapped read only by every web worker,
+# so the pages of the large arrays are shared by the OS instead of copied per process.
+# Directory layout:
+#  manifest.json                       - format, model id, version, data id, top_n and the parameters of the models
+#  uim|train|test.<array>.npy          - user_ids, article_ids, indptr, indices, data, first_seen of a user-item matrix
+#  catalog.ids.* catalog.titles.*      - string tables of the article id -> title lookup
+#  segments.table.npy segments.versions.npy - user segment table
+#  rank.article_ids.npy rank.titles.* rank.scores.npy - popularity counts of the rank based recommender
+#  neighbors.<array>.npy               - user_ids, neighbor_ids, similarity of the collaborative neighbor lists
+#  content.article_ids.* content.<array>.npy - article ids, neighbors, scores of the content similarity
+#  mf.<array>.npy                      - fitted factors and accuracy curve of the matrix factorization
+# A directory is written next to the old one and renamed into place, a worker never opens a half written one.
+ARTIFACT_FORMAT = 3
+MANIFEST_FILE = 'manifest.json'
+UIM_ARRAYS = ('user_ids', 'article_ids', 'indptr', 'indices', 'data', 'first_seen')
+MF_ARRAYS = ('u_train', 's_train', 'vt_train', 'latent_factors_num', 'test_accuracy', 'train_accuracy')
+
+def _save(artifact_pth, name, values):
+    np.save(os.path.join(artifact_pth, name + '.npy'), np.ascontiguousarray(values))
+
+def _write_uim(artifact_pth, name, uim):
+    csr = uim.csr
+    for key, values in zip(UIM_ARRAYS, (uim.user_ids, uim.article_ids, csr.indptr, csr.indices, csr.data, uim.first_seen)):
+        _save(artifact_pth, '{}.{}'.format(name, key), values)
+
+def write_artifact(rec, artifact_pth):
+    '''
+    Description: write every model of rec, the ones not built yet are built first and the MF model is fitted,
+                 the user map of rec is saved as well
+    Args:
+     rec - Recommender
+     artifact_pth - artifact directory, replaced when it exists
+    Return:
+     manifest - dict
+    '''
+    rec.mf_calculate_error()
+    state = rec.state
+    ucfr, cbr, mfr = rec.ucfr, rec.cbr, rec.mfr
+    tmp_pth = artifact_pth.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_pth, ignore_errors=True)
+    os.makedirs(tmp_pth)
+
+    _write_uim(tmp_pth, 'uim', state.uim)
+    _write_uim(tmp_pth, 'train', mfr.train_uim)
+    _write_uim(tmp_pth, 'test', mfr.test_uim)
+    article_ids = list(state.catalog.titles.keys())
+    snapshot.write_strings(os.path.join(tmp_pth, 'catalog.ids'), np.asarray(article_ids, dtype=object))
+    snapshot.write_strings(os.path.join(tmp_pth, 'catalog.titles'),
+                            np.asarray([state.catalog.titles[aid] for aid in article_ids], dtype=object))
+    _save(tmp_pth, 'segments.table', state.segments.table)
+    _save(tmp_pth, 'segments.versions', state.segments.versions)
+    rbr = state.rbr
+    _save(tmp_pth, 'rank.article_ids', rbr.article_ids)
+    snapshot.write_strings(os.path.join(tmp_pth, 'rank.titles'), rbr.titles)
+    _save(tmp_pth, 'rank.scores', rbr.scores)
+    neighbors = ucfr.neighbors
+    _save(tmp_pth, 'neighbors.user_ids', neighbors.user_ids)
+    _save(tmp_pth, 'neighbors.neighbor_ids', neighbors.neighbor_ids)
+    _save(tmp_pth, 'neighbors.similarity', neighbors.similarity)
+    snapshot.write_strings(os.path.join(tmp_pth, 'content.article_ids'), np.asarray(cbr.content_article_ids, dtype=object))
+    _save(tmp_pth, 'content.neighbors', cbr.content_neighbors)
+    _save(tmp_pth, 'content.scores', cbr.content_scores)
+    for key in MF_ARRAYS:
+        _save(tmp_pth, 'mf.' + key, mfr.model[key])
+
+    manifest = {'format': ARTIFACT_FORMAT, 'model_id': state.model_id, 'version': state.version, 'data_id': state.data_id,
+                'created': time.time(), 'top_n': rec.top_n, 'light_threshold': state.segments.light_threshold,
+                'n_neighbors': neighbors.k, 'n_similar': cbr.n_similar,
+                'mf_backend': mfr.backend, 'mf_n_factors': mfr.n_factors}
+    # the manifest is written last, a directory without it is never opened
+    with open(os.path.join(tmp_pth, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(artifact_pth, ignore_errors=True)
+    os.rename(tmp_pth, artifact_pth)
+    # the artifact holds encoded user ids, the workers read the emails' ids from the saved map
+    if rec.user_map.changed:
+        rec.user_map.save(rec.user_map_pth)
+    return manifest
+
+
+class ModelArtifact():
+    '''
+    Class: Read only view of an artifact written by write_artifact
+    Every numeric array is memory mapped, the recommenders built from it use the mapped arrays directly.
+    Only the id -> position dicts and the string tables are built in each process.
+    '''
+    def __init__(self, artifact_pth):
+        '''
+        Description: open an artifact, raise ValueError when it has another format or its manifest names
+                     another model than the one its arrays hold
+        Args:
+         artifact_pth - directory written by write_artifact
+        Return:
+         N/A
+        '''
+        self.artifact_pth = artifact_pth
+        with open(os.path.join(artifact_pth, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != ARTIFACT_FORMAT:
+            raise ValueError("Unsupported model artifact format {}".format(self.manifest.get('format')))
+        self.model_id = self.manifest['model_id']
+        self.version = self.manifest['version']
+        self.data_id = self.manifest['data_id']
+        # the ids the web workers key their caches and precomputed tables with have to be the ones of these arrays
+        data_id = '{}-{}'.format(self.user_item().fingerprint(), self.manifest['light_threshold'])
+        if data_id != self.data_id or (self.version == 0 and self.model_id != self.data_id):
+            raise ValueError("Model artifact {} does not hold model {} ({})".format(artifact_pth, self.model_id, self.data_id))
+
+    def load(self, name):
+        return np.load(os.path.join(self.artifact_pth, name + '.npy'), mmap_mode='r')
+
+    def strings(self, name):
+        return snapshot.read_strings(os.path.join(self.artifact_pth, name))
+
+    def user_item(self, name='uim'):
+        '''
+        Description: one of the 'uim', 'train' and 'test' user-item matrices
+        '''
+        user_ids, article_ids, indptr, indices, data, first_seen = [self.load('{}.{}'.format(name, key)) for key in UIM_ARRAYS]
+        csr = sparse.csr_matrix((data, indices, indptr), shape=(len(user_ids), len(article_ids)), copy=False)
+        return UserItemMatrix(user_ids, article_ids, csr, first_seen)
+
+    def catalog(self):
+        return ArticleCatalog(zip(self.strings('catalog.ids').tolist(), self.strings('catalog.titles').tolist()))
+
+    def segments(self):
+        return UserSegments(self.load('segments.table'), self.manifest['light_threshold'], self.load('segments.versions'))
+
+    def rbr(self, top_n=10):
+        index = pd.MultiIndex.from_arrays([self.load('rank.article_ids'), self.strings('rank.titles')],
+                                          names=['article_id', 'title'])
+        return RBRecommender(None, top_n=top_n, popularity=pd.Series(self.load('rank.scores'), index=index))
+
+    def ucfr(self, uim, catalog, top_n=10):
+        neighbors = NeighborIndex(self.load('neighbors.user_ids'), self.load('neighbors.neighbor_ids'),
+                                  self.load('neighbors.similarity'), self.manifest['n_neighbors'])
+        return UCFRecommender(None, top_n=top_n, uim=uim, catalog=catalog, neighbors=neighbors)
+
+    def cbr(self, uim, catalog, top_n=10):
+        content = (self.strings('content.article_ids').astype('str'), self.load('content.neighbors'), self.load('content.scores'))
+        return CBRecommender(None, None, top_n=top_n, catalog=catalog, n_similar=self.manifest['n_similar'],
+                             uim=uim, content=content)
+
+    def mfr(self, catalog, top_n=10):
+        model = {key: self.load('mf.' + key) for key in MF_ARRAYS}
+        return MFRecommender(None, None, top_n=top_n, cache_dir=None, backend=self.manifest['mf_backend'],
+                             n_factors=self.manifest['mf_n_factors'], train_uim=self.user_item('train'),
+                             test_uim=self.user_item('test'), catalog=catalog, model=model)
+
+
+def main():
+    from recommendation.recommender import Recommender
+
+    parser = argparse.ArgumentParser(description='Build the models once and write them as a memory mapped artifact')
+    parser.add_argument('--interact-pth', default='data/user-item-interactions.csv')
+    parser.add_argument('--articles-pth', default='data/articles_community.csv')
+    parser.add_argument('--artifact-pth', default='data/artifact')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rec = Recommender(args.interact_pth, args.articles_pth, startup='parallel')
+    manifest = write_artifact(rec, args.artifact_pth)
+    print('Model {} written to {} in {:.1f}s'.format(manifest['model_id'], args.artifact_pth, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
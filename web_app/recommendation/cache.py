@@ -0,0 +1,154 @@
+import time
+import threading
+from collections import OrderedDict
+
+class LocalBackend():
+    '''
+    Class: In-process stand-in of a shared cache
+    It has the get/set/delete/clear interface of the cachelib caches (SimpleCache, RedisCache,
+    MemcachedCache ...), any of them can be used as RecommendationCache backend instead.
+    '''
+    def __init__(self, clock=time.monotonic):
+        self.data = dict()
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires <= self.clock():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, timeout=None):
+        '''
+        Description: store value, timeout in seconds, None or 0 never expires (cachelib convention)
+        '''
+        with self.lock:
+            self.data[key] = (self.clock() + timeout if timeout else None, value)
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            return self.data.pop(key, None) is not None
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+        return True
+
+
+class RecommendationCache():
+    '''
+    Class: Bounded LRU cache of recommendation results with a time to live
+    Keys hold the model id and a version of the data (see make_key), so an entry is never served once the
+    model it came from changes: the new key simply misses and the old entry ages out. The caller picks
+    the version: a digest of the user's interactions for answers that only depend on them, the id of all
+    the interactions for the others.
+    An optional shared backend (a cachelib cache) is asked on local misses and filled on every set,
+    so several worker processes can share results.
+    '''
+    def __init__(self, max_size=10000, ttl=300, backend=None, clock=time.monotonic):
+        '''
+        Description: initiate RecommendationCache
+        Args:
+         max_size - (int) number of entries kept in process, the least recently used is dropped first
+         ttl - (float) seconds an entry is served, None keeps it until it is evicted
+         backend - optional cachelib style cache shared between processes
+         clock - function returning the current time in seconds
+        Return:
+         N/A
+        '''
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.backend_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(user_id, top_n, model_id, version):
+        '''
+        Description: cache key of one request
+        Args:
+         user_id - user id of the request
+         top_n - (int) number of recommendations
+         model_id - (str) identity of the model the answer comes from
+         version - (str) id of the data the answer is valid for
+        Return:
+         key - (str)
+        '''
+        return 'recs:{}:{}:{}:{}'.format(model_id, user_id, top_n, version)
+
+    def get(self, key):
+        '''
+        Description: cached value of key, None when it is missing or expired
+        '''
+        now = self.clock()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.expirations += 1
+        value = self.backend.get(key) if self.backend is not None else None
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.backend_hits += 1
+        self.store(key, value)
+        return value
+
+    def set(self, key, value):
+        '''
+        Description: cache value under key, locally and in the backend
+        '''
+        self.store(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, timeout=self.ttl)
+
+    def store(self, key, value):
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        '''
+        Description: hit/miss counters of the cache
+        Return:
+         stats - dict
+        '''
+        with self.lock:
+            requests = self.hits + self.misses
+            return {'size': len(self.entries), 'max_size': self.max_size,
+                    'hits': self.hits, 'misses': self.misses, 'backend_hits': self.backend_hits,
+                    'hit_rate': self.hits / requests if requests else 0.0,
+                    'evictions': self.evictions, 'expirations': self.expirations}
@@ -0,0 +1,96 @@
+from types import MappingProxyType
+
+def normalize_article_id(article_id):
+    '''
+    Description: normalize an article id, 1430, 1430.0 and '1430.0' all become '1430.0'
+    Args:
+     article_id - int, float or str article id
+    Return:
+     article_id - (str) normalized article id
+    '''
+    return str(float(article_id))
+
+class ArticleCatalog():
+    '''
+    Class: Immutable article id <-> title lookup table
+    Built once from the interactions, it answers id -> title and title -> id with a dict lookup
+    instead of scanning the interactions dataframe. Ids are normalized with normalize_article_id.
+    '''
+    def __init__(self, titles):
+        '''
+        Description: initiate ArticleCatalog
+        Args:
+         titles - dict, normalized article id -> title
+        Return:
+         N/A
+        '''
+        self.titles = MappingProxyType(dict(titles))
+        ids = dict()
+        for article_id, title in self.titles.items():
+            # keep the first id when several articles share a title
+            ids.setdefault(title, article_id)
+        self.ids = MappingProxyType(ids)
+
+    @classmethod
+    def from_interactions(cls, df):
+        '''
+        Description: build the catalog from an interactions dataframe, the first title of an id wins
+        Args:
+         df - pandas dataframe with article_id, title columns
+        Return:
+         ArticleCatalog
+        '''
+        articles = df[['article_id', 'title']].drop_duplicates(subset=['article_id'])
+        article_ids = articles['article_id'].values.astype('float').astype('str').tolist()
+        return cls(zip(article_ids, articles['title'].values.tolist()))
+
+    def extend(self, df):
+        '''
+        Description: a new catalog with the articles of df that are not known yet, this one is left as is
+        Args:
+         df - pandas dataframe with article_id, title columns
+        Return:
+         ArticleCatalog
+        '''
+        titles = dict(ArticleCatalog.from_interactions(df).titles)
+        titles.update(self.titles)
+        return ArticleCatalog(titles)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, article_id):
+        return normalize_article_id(article_id) in self.titles
+
+    def title(self, article_id):
+        '''
+        Description: title of one article id, None when it is unknown
+        '''
+        return self.titles.get(normalize_article_id(article_id))
+
+    def article_id(self, title):
+        '''
+        Description: normalized article id of one title, None when it is unknown
+        '''
+        return self.ids.get(title)
+
+    def get_article_names(self, article_ids):
+        '''
+        Description: titles of article ids, in the same order, unknown ids skipped and repeated titles kept once
+        Args:
+         article_ids - list of article ids
+        Return:
+         article_names - (list) list of titles
+        '''
+        article_names = [self.titles.get(normalize_article_id(aid)) for aid in article_ids]
+        return list(dict.fromkeys(name for name in article_names if name is not None))
+
+    def get_article_ids(self, titles):
+        '''
+        Description: normalized article ids of titles, in the same order, unknown titles skipped
+        Args:
+         titles - list of titles
+        Return:
+         article_ids - (list) list of normalized article ids
+        '''
+        return [self.ids[title] for title in titles if title in self.ids]
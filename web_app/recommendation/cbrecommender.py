@@ -1,9 +1,11 @@
+import copy
 import pandas as pd
 import numpy as np
 from collections import defaultdict
 from sklearn.feature_extraction.text import TfidfVectorizer
-# Import linear_kernel to compute the dot product
-from sklearn.metrics.pairwise import linear_kernel
+from recommendation.catalog import ArticleCatalog, normalize_article_id
+from recommendation.useritem import UserItemMatrix
+from recommendation.neighbors import BLOCK_CELLS, top_k_rows
 class CBRecommender():
     '''
     Class: Content Based Recommendations
@@ -16,22 +18,61 @@ class CBRecommender():
     One additional idea is that you might want to choose the most popular recommendations that meet your 'content criteria',
     but again, there is a lot of flexibility in how you might make these recommendations.
     '''
-    def __init__(self, articles_clean,interacts_clean,top_n=10):
+    def __init__(self, articles_clean,interacts_clean,top_n=10,catalog=None,n_similar=10,uim=None,content=None):
+        '''
+        Args:
+         content - (content_article_ids, content_neighbors, content_scores) used instead of computing the
+                   similarity of articles_clean, e.g. read from a model artifact; articles_clean can then be None
+        '''
         self.top_n = top_n
         self.df_content=articles_clean
         self.df = interacts_clean
-        self.content_cosine=self.create_content_cosine_similar()
-        # prepare the article location and user reading datafram
-        self.users=self.df.user_id.unique()
-        self.reading_users=interacts_clean
-        self.reading_users=self.reading_users.reset_index().drop('index',axis=1)
-        self.reading_users.set_index('user_id',inplace=True)
+        # article id <-> title lookup, normally the one built by Data_Clean
+        self.catalog=catalog if catalog is not None else ArticleCatalog.from_interactions(self.df)
+        # sparse user-item store, the articles each user read are read from it
+        self.uim=uim if uim is not None else UserItemMatrix.from_interactions(self.df)
+        # only the n_similar most similar articles of each article are kept
+        self.n_similar=n_similar
+        if content is None:
+            self.content_neighbors, self.content_scores=self.create_content_cosine_similar()
+            # normalized article id of every df_content row
+            self.content_article_ids=self.df_content['article_id'].values.astype('float').astype('str')
+        else:
+            self.content_article_ids, self.content_neighbors, self.content_scores=content
+        # id -> first row lookup
+        self.article_rows=dict()
+        for row, aid in enumerate(self.content_article_ids.tolist()):
+            self.article_rows.setdefault(aid, row)
+        self.without_content=set(self.article_id_without_content().tolist())
+        # users with at least one interaction
+        self.users=self.uim.user_ids
+
+    def refresh_interactions(self, uim, catalog):
+        '''
+        Description: a new recommender on a user-item matrix and catalog that include new interactions,
+                     this one is left as is. The content similarity does not depend on them and is shared.
+        Args:
+         uim - (UserItemMatrix) the user-item matrix including new interactions
+         catalog - (ArticleCatalog) the catalog including new articles
+        Return:
+         cbr - CBRecommender
+        '''
+        cbr=copy.copy(self)
+        cbr.uim=uim
+        cbr.users=uim.user_ids
+        cbr.catalog=catalog
+        cbr.without_content=set(self.article_id_without_content(catalog).tolist())
+        return cbr
 
     def create_content_cosine_similar(self):
         '''
+        Description:
+          Top n_similar cosine similar articles of every article, the similarity is computed in blocks of
+          rows so the full article by article matrix never exists
         Args:
         Return:
-          content_cosine_sim: np, article_id by article_id
+          content_neighbors: np, article row by n_similar, row positions in df_content, most similar first
+          content_scores: np, article row by n_similar, the matching cosine similarity
         '''
         #Define a TF-IDF Vectorizer Object. Remove all english stopwords
         tfidf = TfidfVectorizer(stop_words='english')
@@ -39,9 +80,21 @@ class CBRecommender():
         df_articles=self.df_content['doc_description']
         #Construct the required TF-IDF matrix by applying the fit_transform method on the doc_description feature
         tfidf_articles = tfidf.fit_transform(df_articles)
-        # Compute the cosine similarity matrix
-        content_cosine_sim = linear_kernel(tfidf_articles, tfidf_articles)
-        return content_cosine_sim
+        # tfidf rows are l2 normalized, so the dot product is the cosine similarity
+        n_articles=tfidf_articles.shape[0]
+        k=min(self.n_similar, max(n_articles-1, 0))
+        content_neighbors=np.zeros((n_articles, k), dtype=np.int32)
+        content_scores=np.zeros((n_articles, k), dtype=np.float32)
+        block_size=max(1, BLOCK_CELLS // max(n_articles, 1))
+        for start in range(0, n_articles, block_size):
+            stop=min(start+block_size, n_articles)
+            block_sim=tfidf_articles[start:stop].dot(tfidf_articles.T).toarray()
+            # an article is not similar to itself
+            block_sim[np.arange(stop-start), np.arange(start, stop)]=-np.inf
+            top_idx=top_k_rows(block_sim, k)
+            content_neighbors[start:stop]=top_idx
+            content_scores[start:stop]=np.take_along_axis(block_sim, top_idx, axis=1)
+        return content_neighbors, content_scores
 
     def find_similar_article_ids(self,article_id):
         '''
@@ -50,66 +103,82 @@ class CBRecommender():
         OUTPUT
         similar_article_ids - an array of the most similar article id
         '''
+        # find the row of each article id
         try:
-            # find the row of each article id
-            article_idx =  np.where(self.df_content['article_id'].astype(float).astype('str') ==  article_id)[0][0]
-
-            # find the most similar article indices - to start I said they need to be the same for all content
-            max_similar_idx=np.argsort(self.content_cosine[article_idx])[-2:-5:-1] # -1 is current article id, -2 is max similar usrs.
-
-            # pull the article ids based on the similar_idxs
-            raw_article_ids=self.df_content.iloc[max_similar_idx,4].values.astype('float').astype('str')
-
-            # filter out article id doesn't exist in artical content dataset.
-            similar_article_ids=np.array([aid for aid in raw_article_ids if aid not in self.article_id_without_content()])
-        except :
-            #if df_content.article_id doesn't include the df.article_id, keyError show, return empty np.
-            similar_article_ids=np.array([])
-
+            article_idx=self.article_rows.get(normalize_article_id(article_id))
+        except (TypeError, ValueError):
+            # not an article id at all
+            article_idx=None
+        if article_idx is None:
+            #if df_content.article_id doesn't include the df.article_id, return empty np.
+            return np.array([])
+
+        # find the most similar article indices - to start I said they need to be the same for all content
+        max_similar_idx=self.content_neighbors[article_idx][:3] # the 3 most similar articles, the article itself is not in the index
+
+        # pull the article ids based on the similar_idxs
+        raw_article_ids=self.content_article_ids[max_similar_idx]
+
+        # filter out article id doesn't exist in artical content dataset.
+        similar_article_ids=np.array([aid for aid in raw_article_ids.tolist() if aid not in self.without_content])
         return similar_article_ids
     def get_article_names(self, article_ids):
         '''
         INPUT:
         article_ids - (list) a list of article ids
-        self.df - (pandas dataframe) df as defined at the top of the notebook
+        self.catalog - (ArticleCatalog) article id -> title lookup
 
         OUTPUT:
         article_names - (list) a list of article names associated with the list of article ids
-                        (this is identified by the title column)
+                        (this is identified by the title column), in the order of article_ids
         '''
-        article_names=self.df.drop_duplicates().loc[self.df['article_id'].isin(article_ids),'title'].unique().tolist()
+        article_names=self.catalog.get_article_names(article_ids)
         return article_names # Return the article names associated with list of article ids
 
-    def article_id_without_content(self):
+    def article_id_without_content(self, catalog=None):
         '''
         Description: Get the article id that doesn't exist in article content datasets
+        Args:
+         catalog - (ArticleCatalog) articles to check, self.catalog when None
         '''
-        df_rid=self.df['article_id'].astype('str').unique()
-        df_crid=self.df_content['article_id'].astype('float').astype('str').unique()
+        catalog=catalog if catalog is not None else self.catalog
+        df_rid=np.array(list(catalog.titles.keys()), dtype='str')
+        df_crid=np.unique(self.content_article_ids)
         return np.setdiff1d(df_rid, df_crid).astype('str')
 
-    def make_content_recs(self, user_id, top_n=10 ):
+    def make_content_recs(self, user_id, top_n=None):
         '''
         INPUT
         user_id: a user id
-        reading_users: dataframe which removes duplicated rows and includes user id, article id and title
+        top_n: the number of recommendations, self.top_n when None
+        self.uim: sparse user-item store
         None
         OUTPUT
         recs
         '''
-        recs_list = []
-        if top_n != 10:
-            self.top_n = top_n
-        import pdb
-        #pdb.set_trace()
         # Pull only the reviews the user has seen
-        if user_id not in self.reading_users.index.values:
+        if user_id not in self.uim.user_index:
             return ("Content based recommendation cannot work for new user.")
-        users_temp = self.reading_users.loc[user_id] # users_temp is user list that read articles.
-        # artcle_ids  is article ids np that users read.
-        article_ids = np.array(users_temp.drop_duplicates()['article_id'].astype('str'))
-        if  article_ids.size == 1:
-            article_ids=[article_ids.tolist()]
+        _, recs_list = self.content_recs(user_id, top_n)
+        return recs_list
+
+    def content_recs(self, user_id, top_n=None):
+        '''
+        INPUT
+        user_id: a user id, a new user gets empty lists
+        top_n: the number of recommendations, self.top_n when None
+        OUTPUT
+        rec_ids: at most top_n recommended article ids (float), each one once
+        recs: the titles of make_content_recs
+        '''
+        recs_list = []
+        # article id -> None, the recommended ids in order without repeats
+        rec_ids = dict()
+        top_n = self.top_n if top_n is None else top_n
+        if user_id not in self.uim.user_index:
+            return [], []
+        # artcle_ids  is article ids np that users read, in the order they read them.
+        article_ids = self.uim.user_article_ids(user_id, in_seen_order=True).astype('float').astype('str')
 
         # Look at each of the articles (most similar first),
         # pull the articles the user hasn't seen that are most similar
@@ -122,19 +191,18 @@ class CBRecommender():
             temp_recs = self.get_article_names(temp_rec_ids)
             if len(temp_recs) > 0:
                 recs_list +=temp_recs
+                rec_ids.update(dict.fromkeys(aid for aid in temp_rec_ids.tolist() if aid in self.catalog))
 
-            # If there are more than
-            if len(recs_list) > self.top_n:
-                recs_list=recs_list[:self.top_n]
+            # the titles can repeat an article, keep going until there are top_n ids as well
+            if len(recs_list) >= top_n and len(rec_ids) >= top_n:
                 break
 
-        return recs_list
+        return [float(aid) for aid in rec_ids][:top_n], recs_list[:top_n]
 
     def make_recs(self,users=None):
         '''
         INPUT
         users: user id list
-        reading_users: dataframe which removes duplicated rows and includes user id, article id and title
         None
         OUTPUT
         recs - a dictionary with keys of the user and values of the recommendations
@@ -153,8 +221,8 @@ class CBRecommender():
 
 
 if __name__ == '__main__':
-    from data_clean import Data_Clean
-    from cbrecommender import CBRecommender
+    # run from the web_app directory: python -m recommendation.cbrecommender
+    from recommendation.data_clean import Data_Clean
 
     #instantiate data clean
     dc = Data_Clean()
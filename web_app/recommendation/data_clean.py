@@ -1,46 +1,106 @@
+import os
 import pandas as pd
 import numpy as np
+from recommendation.catalog import ArticleCatalog
+from recommendation import snapshot
+from recommendation.usermap import UserIdMap
+from recommendation.ingest import InteractionStream
 class Data_Clean():
     '''
     This Data_Clean is used to build the dataset, clean the dataset
     '''
-    def __init__(self,  interact_pth='data/user-item-interactions.csv', articles_pth='data/articles_community.csv'):
+    def __init__(self,  interact_pth='data/user-item-interactions.csv', articles_pth='data/articles_community.csv',
+                 snapshot_pth=None, use_snapshot=True, user_map_pth=None, chunksize=None):
         '''
         Description: initiate Data_Clean class
         Args:
          interact_pth - path to csv with at least the four columns: article_id,title,email
          articles_pth - path to csv with each movie and movie information in each row
+         snapshot_pth - directory of the binary snapshot written by compile(), defaults to snapshot next to interact_pth
+         use_snapshot - load the snapshot instead of the csv files when it is newer than both of them
+         user_map_pth - csv file of the persistent email -> user_id map, defaults to user_map.csv next to interact_pth,
+                        it is read first and written back at the end when the csv files had new emails, so the
+                        ids given out here are the ones every later start keeps
+         chunksize - when set, the interactions are streamed chunksize rows at a time into self.stream and
+                     the interaction frames stay None, see InteractionStream
         Return:
          N/A
         '''
         self.interacts_clean = None
         self.articles_clean = None
-        self.interacts = pd.read_csv(interact_pth)
-        self.articles = pd.read_csv(articles_pth)
-        del self.interacts['Unnamed: 0']
-        del self.articles['Unnamed: 0']
-        email_encoded = self.email_mapper()
-        del self.interacts['email']
-        self.interacts['user_id'] = email_encoded
-        self.interacts_clean, self.articles_clean = self.remove_duplicated()
+        self.catalog = None
+        self.stream = None
+        self.sources = [interact_pth, articles_pth]
+        if snapshot_pth is None:
+            snapshot_pth = os.path.join(os.path.dirname(interact_pth), 'snapshot')
+        self.snapshot_pth = snapshot_pth
+        if user_map_pth is None:
+            user_map_pth = os.path.join(os.path.dirname(interact_pth), 'user_map.csv')
+        self.user_map_pth = user_map_pth
+        self.user_map = UserIdMap.load(self.user_map_pth)
+        if chunksize is not None:
+            self.interacts = None
+            self.articles = pd.read_csv(articles_pth)
+            del self.articles['Unnamed: 0']
+            self.stream = InteractionStream(self.user_map, chunksize).ingest(interact_pth)
+            self.articles_clean = self.articles.drop_duplicates(subset=['article_id'])
+        elif use_snapshot and snapshot.is_fresh(self.snapshot_pth, self.sources):
+            self.interacts, self.articles, self.interacts_clean, self.articles_clean = snapshot.read_snapshot(self.snapshot_pth)
+        else:
+            self.interacts = pd.read_csv(interact_pth)
+            self.articles = pd.read_csv(articles_pth)
+            del self.interacts['Unnamed: 0']
+            del self.articles['Unnamed: 0']
+            email_encoded = self.email_mapper()
+            del self.interacts['email']
+            self.interacts['user_id'] = email_encoded
+            self.interacts_clean, self.articles_clean = self.remove_duplicated()
         self.fill_NaN()
+        # article id <-> title lookup shared by the recommenders
+        if self.stream is not None:
+            self.catalog = self.stream.catalog()
+        else:
+            self.catalog = ArticleCatalog.from_interactions(self.interacts_clean)
+        self.save_user_map()
+
+    def compile(self):
+        '''
+        Description: write the encoded and cleaned frames to a binary snapshot at self.snapshot_pth,
+                     later Data_Clean instances load it instead of parsing the csv files
+                     (not available in chunked mode, the interaction frames are never built).
+                     The snapshot only holds the encoded user ids, the user map __init__ saved decodes them.
+        Args:
+          N/A
+        Return：
+          N/A
+        '''
+        snapshot.write_snapshot(self.snapshot_pth, self.sources, self.interacts, self.articles,
+                                self.interacts_clean, self.articles_clean)
+        self.save_user_map()
+
+    def save_user_map(self):
+        '''
+        Description: write the email -> user_id map to self.user_map_pth when emails were added to it,
+                     atomically so a reader never sees half a map
+        Args:
+          N/A
+        Return：
+          N/A
+        '''
+        if self.user_map.changed:
+            self.user_map.save(self.user_map_pth)
 
     def email_mapper(self):
         '''
-        Description: Run this cell to map the user email to a user_id column and remove the email column
+        Description: Run this cell to map the user email to a user_id column and remove the email column.
+                     Emails already in the persistent user map keep their id, new ones are appended in first
+                     seen order (in memory, save_user_map writes them).
         Args:
           N/A
         Return：
-         email_encoded: dict list,key: email, value: user_id
+         email_encoded: np array of user_id, one per interaction
         '''
-        coded_dict = dict()
-        cter = 1
-        email_encoded = []
-        for val in self.interacts['email']:
-            if val not in coded_dict:
-                coded_dict[val] = cter
-                cter+=1
-            email_encoded.append(coded_dict[val])
+        email_encoded = self.user_map.encode(self.interacts['email'])
         return email_encoded
 
     def remove_duplicated(self):
@@ -71,10 +131,10 @@ class Data_Clean():
             self.articles_clean = self.articles_clean.fillna('')
 
 if __name__ == '__main__':
-    import data_clean as dc
+    # run from the web_app directory: python -m recommendation.data_clean
 
     #instantiate data clean
-    pre_dc = dc.Data_Clean()
+    pre_dc = Data_Clean()
     print(pre_dc.interacts.head())
     print(pre_dc.articles.head())
     print(pre_dc.articles_clean.shape, pre_dc.interacts_clean.shape)
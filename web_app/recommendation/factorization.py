@@ -0,0 +1,143 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+from sklearn.utils.extmath import randomized_svd as sk_randomized_svd
+
+# Factorization backends for MFRecommender.
+# Every backend takes a scipy sparse user-item matrix and returns u, s, vt like np.linalg.svd with
+# full_matrices=False: u (users, k), s (k,) sorted from the largest value, vt (k, articles).
+
+def dense_svd(user_item, k=None):
+    '''
+    Description: full np.linalg.svd of the dense matrix, the original MFRecommender path
+    Args:
+     user_item - scipy sparse matrix, users by articles
+     k - (int) number of factors to keep, None keeps all of them
+    Return:
+     u, s, vt
+    '''
+    u, s, vt = np.linalg.svd(user_item.toarray(), full_matrices=False)
+    return u[:, :k], s[:k], vt[:k, :]
+
+def truncated_svd(user_item, k=None):
+    '''
+    Description: the k largest singular triplets of the sparse matrix with ARPACK (scipy svds)
+    Args:
+     user_item - scipy sparse matrix, users by articles
+     k - (int) number of factors to keep, capped at min(shape)-1
+    Return:
+     u, s, vt
+    '''
+    max_k = min(user_item.shape) - 1
+    k = max_k if k is None else min(k, max_k)
+    u, s, vt = svds(sparse.csr_matrix(user_item, dtype=np.float64), k=k)
+    # svds returns the singular values in ascending order
+    order = np.argsort(-s)
+    return u[:, order], s[order], vt[order, :]
+
+def randomized_svd(user_item, k=None, n_iter=5, random_state=42):
+    '''
+    Description: randomized svd (Halko et al.) of the sparse matrix
+    Args:
+     user_item - scipy sparse matrix, users by articles
+     k - (int) number of factors to keep
+     n_iter - (int) number of power iterations
+     random_state - (int) seed
+    Return:
+     u, s, vt
+    '''
+    k = min(user_item.shape) if k is None else min(k, min(user_item.shape))
+    return sk_randomized_svd(sparse.csr_matrix(user_item, dtype=np.float64), n_components=k,
+                             n_iter=n_iter, random_state=random_state)
+
+def implicit_als(user_item, k=64, alpha=40.0, regularization=0.1, iterations=10, random_state=42):
+    '''
+    Description:
+     Alternating least squares for implicit feedback (Hu, Koren, Volinsky 2008). Every 1 in the matrix
+     is a preference with confidence 1+alpha, every 0 a preference of 0 with confidence 1.
+     The user and item factors are turned into the u, s, vt form with two QR decompositions and the svd
+     of a k by k matrix, so the product u s vt is exactly the ALS prediction.
+    Args:
+     user_item - scipy sparse matrix, users by articles
+     k - (int) number of factors
+     alpha - (float) confidence of an observed interaction
+     regularization - (float) l2 penalty on the factors
+     iterations - (int) number of user/item sweeps
+     random_state - (int) seed
+    Return:
+     u, s, vt
+    '''
+    k = 64 if k is None else min(k, min(user_item.shape))
+    ratings = sparse.csr_matrix(user_item, dtype=np.float64)
+    rng = np.random.RandomState(random_state)
+    user_factors = rng.normal(scale=0.01, size=(ratings.shape[0], k))
+    item_factors = rng.normal(scale=0.01, size=(ratings.shape[1], k))
+    ratings_t = ratings.T.tocsr()
+    for _ in range(iterations):
+        user_factors = _als_step(ratings, item_factors, alpha, regularization)
+        item_factors = _als_step(ratings_t, user_factors, alpha, regularization)
+    # user_factors.dot(item_factors.T) == q_u r_u r_i^T q_i^T == (q_u a) diag(s) (q_i b)^T
+    q_u, r_u = np.linalg.qr(user_factors)
+    q_i, r_i = np.linalg.qr(item_factors)
+    a, s, bt = np.linalg.svd(r_u.dot(r_i.T))
+    return q_u.dot(a), s, bt.dot(q_i.T)
+
+# floats of the factor blocks _als_step holds at once, about 8 times as many bytes
+ALS_BLOCK_ENTRIES = 2**24
+
+def _als_step(ratings, fixed, alpha, regularization):
+    '''
+    Description:
+     solve the factors of every row of ratings while the factors of the other side are fixed.
+     Rows with the same number of interactions are solved together with one batched np.linalg.solve.
+     A row with fewer interactions c than factors k solves a c by c system instead of the k by k one
+     (Woodbury identity on the shared gram matrix), so the cost follows the interactions of the row.
+    '''
+    k = fixed.shape[1]
+    gram = fixed.T.dot(fixed) + regularization * np.eye(k)
+    gram_inv = np.linalg.inv(gram)
+    solved = np.zeros((ratings.shape[0], k))
+    counts = np.diff(ratings.indptr)
+    # rows without interactions keep 0 factors
+    for count in np.unique(counts[counts > 0]).tolist():
+        rows = np.flatnonzero(counts == count)
+        block_rows = max(ALS_BLOCK_ENTRIES // (count * k + min(count, k) ** 2), 1)
+        for start in range(0, len(rows), block_rows):
+            block = rows[start:start + block_rows]
+            # the columns of rows with the same number of interactions form a (rows, count) matrix
+            factors = fixed[ratings.indices[ratings.indptr[block][:, None] + np.arange(count)]]
+            b = (1.0 + alpha) * factors.sum(axis=1)
+            if count < k and alpha > 0:
+                # (gram + alpha f^T f)^-1 = gram^-1 - gram^-1 f^T (I / alpha + f gram^-1 f^T)^-1 f gram^-1
+                y = b.dot(gram_inv)
+                factors_gram = factors.dot(gram_inv)
+                small = np.eye(count) / alpha + np.matmul(factors_gram, factors.transpose(0, 2, 1))
+                z = np.linalg.solve(small, np.matmul(factors, y[:, :, None]))
+                solved[block] = y - np.matmul(factors_gram.transpose(0, 2, 1), z)[:, :, 0]
+            else:
+                # only the observed entries differ from the shared gram matrix
+                a = gram + alpha * np.matmul(factors.transpose(0, 2, 1), factors)
+                solved[block] = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+    return solved
+
+BACKENDS = {
+    'dense': dense_svd,
+    'truncated': truncated_svd,
+    'randomized': randomized_svd,
+    'als': implicit_als,
+}
+
+def factorize(user_item, backend='dense', k=None, **kwargs):
+    '''
+    Description: factorize a sparse user-item matrix with one of BACKENDS
+    Args:
+     user_item - scipy sparse matrix, users by articles
+     backend - (str) key of BACKENDS
+     k - (int) number of factors
+     kwargs - extra arguments of the backend
+    Return:
+     u, s, vt
+    '''
+    if backend not in BACKENDS:
+        raise ValueError("Unknown factorization backend {}, use one of {}".format(backend, sorted(BACKENDS)))
+    return BACKENDS[backend](user_item, k=k, **kwargs)
@@ -0,0 +1,174 @@
+import pandas as pd
+import numpy as np
+from collections import deque
+from recommendation.useritem import UserItemMatrix
+from recommendation.catalog import ArticleCatalog
+from recommendation.usermap import UserIdMap
+
+# a (user, article) pair is one int64 key: user_id in the high bits, article code in the low bits
+ARTICLE_BITS = 32
+
+class InteractionStream():
+    '''
+    Class: Chunked ingestion of the interactions csv
+    The csv is read chunksize rows at a time. Every chunk is encoded (email -> user_id, article id -> code)
+    and deduplicated against the pairs seen so far, then dropped. Only the distinct (user, article) pairs,
+    the first title of every article and the train/test split are kept, so peak memory depends on the number
+    of distinct interactions and not on the length of the log. The distinct pairs are kept twice, sorted for the
+    lookups and in first seen order for the user-item matrix.
+    Pairs are numbered in first seen order, the same order drop_duplicates keeps: the first train_size
+    distinct pairs are the train set and the last test_size ones the test set, like
+    MFRecommender.create_test_and_train_size on the cleaned frame.
+    '''
+    # merge the pending blocks of keys into the sorted store once there are this many of them
+    MAX_PENDING = 8
+
+    def __init__(self, user_map=None, chunksize=100000, train_size=40000, test_size=5993):
+        '''
+        Description: initiate InteractionStream
+        Args:
+         user_map - UserIdMap used to encode the emails, a new empty map when None
+         chunksize - (int) number of csv rows read at once
+         train_size, test_size - (int) distinct interactions in the train and test sets
+        Return:
+         N/A
+        '''
+        self.user_map = user_map if user_map is not None else UserIdMap()
+        self.chunksize = chunksize
+        self.train_size = train_size
+        self.test_size = test_size
+        # article id -> code and code -> article id
+        self.article_codes = dict()
+        self.article_ids = []
+        # normalized article id -> first title seen
+        self.titles = dict()
+        # distinct keys: one sorted array plus sorted blocks not merged yet
+        self.keys = np.array([], dtype=np.int64)
+        self.pending = []
+        # blocks of distinct keys in first seen order
+        self.seen_keys = []
+        self.n_rows = 0
+        self.n_pairs = 0
+        self.train_keys = []
+        self.test_keys = deque()
+        self.n_test = 0
+
+    def ingest(self, interact_pth):
+        '''
+        Description: read an interactions csv chunk by chunk
+        Args:
+         interact_pth - path to csv with at least the columns article_id, title, email
+        Return:
+         self
+        '''
+        for chunk in pd.read_csv(interact_pth, usecols=['article_id', 'title', 'email'], chunksize=self.chunksize):
+            self.add_chunk(chunk)
+        return self
+
+    def add_chunk(self, chunk):
+        '''
+        Description: encode and deduplicate one chunk of interactions
+        Args:
+         chunk - pandas dataframe with article_id, title, email columns
+        Return:
+         N/A
+        '''
+        self.n_rows += len(chunk)
+        chunk = chunk[chunk['article_id'].notnull()]
+        user_ids = self.user_map.encode(chunk['email'])
+        codes, uniques = pd.factorize(chunk['article_id'].values.astype('float'))
+        first_rows = pd.Series(np.arange(len(codes))).groupby(codes).first().values
+        titles = chunk['title'].values
+        unique_codes = np.empty(len(uniques), dtype=np.int64)
+        for i, article_id in enumerate(uniques.tolist()):
+            code = self.article_codes.get(article_id)
+            if code is None:
+                code = len(self.article_ids)
+                self.article_codes[article_id] = code
+                self.article_ids.append(article_id)
+                self.titles[str(article_id)] = titles[first_rows[i]]
+            unique_codes[i] = code
+        keys = (user_ids.astype(np.int64) << ARTICLE_BITS) | unique_codes[codes]
+        # distinct keys of the chunk in first seen order, then the ones never seen before
+        chunk_keys, first = np.unique(keys, return_index=True)
+        chunk_keys = chunk_keys[np.argsort(first)]
+        new_keys = chunk_keys[~self.is_seen(chunk_keys)]
+        self.add_keys(new_keys)
+
+    def is_seen(self, keys):
+        '''
+        Description: True for the keys already stored
+        '''
+        seen = np.zeros(len(keys), dtype=bool)
+        for block in [self.keys] + self.pending:
+            if len(block) == 0:
+                continue
+            pos = np.minimum(np.searchsorted(block, keys), len(block) - 1)
+            seen |= block[pos] == keys
+        return seen
+
+    def add_keys(self, new_keys):
+        '''
+        Description: store new distinct keys, given in first seen order, and update the train/test split
+        '''
+        if len(new_keys) == 0:
+            return
+        n_train = min(max(self.train_size - self.n_pairs, 0), len(new_keys))
+        if n_train > 0:
+            self.train_keys.append(new_keys[:n_train])
+        # only the last test_size keys can end up in the test set
+        self.test_keys.append(new_keys[-self.test_size:] if self.test_size > 0 else new_keys[:0])
+        self.n_test += len(self.test_keys[-1])
+        while len(self.test_keys) > 1 and self.n_test - len(self.test_keys[0]) >= self.test_size:
+            self.n_test -= len(self.test_keys.popleft())
+        self.n_pairs += len(new_keys)
+        self.seen_keys.append(new_keys)
+        self.pending.append(np.sort(new_keys))
+        if len(self.pending) >= self.MAX_PENDING or sum(len(block) for block in self.pending) > len(self.keys):
+            self.keys = np.sort(np.concatenate([self.keys] + self.pending))
+            self.pending = []
+
+    def decode(self, keys):
+        '''
+        Description: user ids and article ids of keys
+        '''
+        user_ids = keys >> ARTICLE_BITS
+        article_ids = np.asarray(self.article_ids, dtype='float')[keys & ((1 << ARTICLE_BITS) - 1)]
+        return user_ids, article_ids
+
+    def user_item(self, keys=None):
+        '''
+        Description: sparse user-item matrix of keys, all the distinct interactions when None
+        Args:
+         keys - np array of keys in first seen order
+        Return:
+         UserItemMatrix
+        '''
+        if keys is None:
+            keys = np.concatenate(self.seen_keys) if len(self.seen_keys) > 0 else np.array([], dtype=np.int64)
+        return UserItemMatrix.from_pairs(*self.decode(keys))
+
+    def train_test(self):
+        '''
+        Description: sparse user-item matrices of the train and test interactions
+        Return:
+         train_uim, test_uim - UserItemMatrix
+        '''
+        train_keys = np.concatenate(self.train_keys) if len(self.train_keys) > 0 else np.array([], dtype=np.int64)
+        test_keys = np.concatenate(self.test_keys) if len(self.test_keys) > 0 else np.array([], dtype=np.int64)
+        return self.user_item(train_keys), self.user_item(test_keys[-self.test_size:] if self.test_size > 0 else test_keys[:0])
+
+    def catalog(self):
+        return ArticleCatalog(self.titles)
+
+    def popularity(self, uim):
+        '''
+        Description: number of distinct readers per (article_id, title), the counts RBRecommender ranks
+        Args:
+         uim - UserItemMatrix returned by user_item()
+        Return:
+         popularity - pandas series indexed by article_id, title
+        '''
+        titles = [self.titles[str(article_id)] for article_id in uim.article_ids.tolist()]
+        index = pd.MultiIndex.from_arrays([uim.article_ids, titles], names=['article_id', 'title'])
+        return pd.Series(uim.article_counts, index=index)
@@ -0,0 +1,194 @@
+import os
+import time
+import random
+import cProfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# name -> (type, help) of every metric Metrics.render writes
+METRICS = {
+    'rec_requests_total': ('counter', 'Recommendation requests by source (precomputed, cache, computed) and strategy'),
+    'rec_fallbacks_total': ('counter', 'Requests of the light or heavy segment answered by the rank based strategy, '
+                                       'because the recommender was still building or had no recommendation, '
+                                       'counted when computed and not on cache hits'),
+    'rec_request_seconds': ('histogram', 'Latency of recommendation requests by strategy'),
+    'rec_stage_seconds': ('histogram', 'Time spent in each stage of the recommender'),
+    'rec_profiles_total': ('counter', 'Slow requests whose cProfile stats were written'),
+    'rec_cache_hits_total': ('counter', 'Recommendation cache hits'),
+    'rec_cache_misses_total': ('counter', 'Recommendation cache misses'),
+    'rec_cache_evictions_total': ('counter', 'Recommendation cache entries dropped by the LRU bound'),
+    'rec_cache_hit_ratio': ('gauge', 'Share of cache lookups that hit'),
+    'rec_cache_entries': ('gauge', 'Entries held by the in process recommendation cache'),
+    'rec_segment_users': ('gauge', 'Users per recommender segment'),
+    'rec_model_version': ('gauge', 'Number of add_interactions applied to the served model'),
+    'rec_build_seconds': ('gauge', 'Build time of every part of the Recommender'),
+}
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+class Metrics():
+    '''
+    Class: Counters and latency histograms of one process, written in the Prometheus text format
+    Every gunicorn worker keeps its own, the scraper adds them up per instance.
+    '''
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # (name, labels) -> value, labels a sorted tuple of (key, value)
+        self.counters = defaultdict(float)
+        # (name, labels) -> [count per bucket, sum, count]
+        self.histograms = dict()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        '''
+        Description: time the block into the rec_stage_seconds histogram of stage
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('rec_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def snapshot(self, rec=None):
+        '''
+        Description: every value, the gauges of rec (cache, segments, version, build times) included
+        Return:
+         samples - list of (name, labels, value)
+        '''
+        samples = []
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                samples.append((name, labels, value))
+            for (name, labels), (bucket_counts, total, count) in self.histograms.items():
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    samples.append((name + '_bucket', labels + (('le', repr(bound)),), bucket_count))
+                samples.append((name + '_bucket', labels + (('le', '+Inf'),), count))
+                samples.append((name + '_sum', labels, total))
+                samples.append((name + '_count', labels, count))
+        if rec is None:
+            return samples
+        state = rec.state
+        samples.append(('rec_model_version', (), state.version))
+        for segment, users in state.segments.counts().items():
+            samples.append(('rec_segment_users', (('segment', segment),), users))
+        for part, seconds in dict(rec.build_timings).items():
+            samples.append(('rec_build_seconds', (('part', part),), seconds))
+        if rec.cache is not None:
+            stats = rec.cache.stats()
+            samples += [('rec_cache_hits_total', (), stats['hits']), ('rec_cache_misses_total', (), stats['misses']),
+                        ('rec_cache_evictions_total', (), stats['evictions']),
+                        ('rec_cache_hit_ratio', (), stats['hit_rate']), ('rec_cache_entries', (), stats['size'])]
+        return samples
+
+    def render(self, rec=None):
+        '''
+        Description: Prometheus text exposition of every metric
+        Args:
+         rec - optional Recommender whose gauges are added
+        Return:
+         text - (str)
+        '''
+        by_metric = defaultdict(list)
+        for name, labels, value in self.snapshot(rec):
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                    base = name[:-len(suffix)]
+                    break
+            else:
+                base = name
+            by_metric[base].append((name, labels, value))
+        lines = []
+        for base in sorted(by_metric):
+            kind, help_text = METRICS.get(base, ('untyped', base))
+            lines.append('# HELP {} {}'.format(base, help_text))
+            lines.append('# TYPE {} {}'.format(base, kind))
+            for name, labels, value in by_metric[base]:
+                lines.append('{}{} {}'.format(name, format_labels(labels), repr(float(value))))
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler():
+    '''
+    Class: Opt-in sampling profiler of recommendation requests
+    A sample_rate share of the requests runs under cProfile, the stats of those slower than threshold
+    are written to out_dir (pstats files, open them with python -m pstats or snakeviz).
+    '''
+    def __init__(self, out_dir='data/profiles', threshold=0.1, sample_rate=0.01, max_files=100, metrics=None):
+        '''
+        Description: initiate SlowRequestProfiler
+        Args:
+         out_dir - directory of the stats files
+         threshold - (float) seconds from which a profiled request is written
+         sample_rate - (float) share of the requests that are profiled
+         max_files - (int) files written at most by this process
+         metrics - optional Metrics counting the written profiles
+        Return:
+         N/A
+        '''
+        self.out_dir = out_dir
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.metrics = metrics
+        self.n_written = 0
+        self.lock = threading.Lock()
+        # one profile at a time, cProfile cannot profile several threads at once
+        self.active = threading.Lock()
+
+    def sample(self):
+        return random.random() < self.sample_rate
+
+    def run(self, func, *args, label=''):
+        '''
+        Description: func(*args) under cProfile, its stats are written when it took longer than threshold,
+                     func runs without profiling while another request is profiled
+        '''
+        if not self.active.acquire(blocking=False):
+            return func(*args)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            seconds = time.perf_counter() - start
+            self.active.release()
+            if seconds >= self.threshold:
+                self.write(profile, seconds, label)
+
+    def write(self, profile, seconds, label):
+        with self.lock:
+            if self.n_written >= self.max_files:
+                return
+            self.n_written += 1
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = '{}-{}-{:.0f}ms-{}.prof'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid(), seconds * 1000, label)
+        profile.dump_stats(os.path.join(self.out_dir, name))
+        if self.metrics is not None:
+            self.metrics.inc('rec_profiles_total')
@@ -1,6 +1,13 @@
+import os
+import glob
+import hashlib
 import pandas as pd
 import numpy as np
 from collections import defaultdict
+from recommendation.useritem import UserItemMatrix
+from recommendation.factorization import factorize
+from recommendation.catalog import ArticleCatalog
+from recommendation.neighbors import top_k_rows
 #import matplotlib.pyplot as plt
 
 class MFRecommender():
@@ -8,11 +15,94 @@ class MFRecommender():
     class: Matrix Factorization
     In this part , matrix factorization is built to make article recommendations to the users on the IBM Watson Studio platform.
     '''
-    def __init__(self, articles_clean,interacts_clean,top_n=10):
+    # the latent factor sweep never goes beyond this many factors
+    MAX_LATENT_FACTORS = 700
+    # rows of the prediction held in memory at once by sweep_error
+    SWEEP_CHUNK_ROWS = 1024
+
+    def __init__(self, articles_clean,interacts_clean,top_n=10,cache_dir='data/cache',backend='dense',n_factors=None,
+                 train_uim=None,test_uim=None,catalog=None,model=None):
+        '''
+        Args:
+         backend - factorization used by fit: 'dense' (np.linalg.svd), 'truncated' (sparse svds),
+                   'randomized' (randomized svd) or 'als' (implicit alternating least squares)
+         n_factors - number of factors to fit, None fits MAX_LATENT_FACTORS (64 for 'als', which solves a
+                     n_factors by n_factors system per user and article)
+         train_uim, test_uim - UserItemMatrix of the train and test interactions, used instead of splitting
+                               interacts_clean (the chunked ingestion builds them without keeping the interactions)
+         catalog - (ArticleCatalog) article id -> title lookup used by recommend_many
+         model - fitted model as returned by fit, e.g. read from a model artifact, it is then not fitted again
+        '''
         self.top_n = top_n
         self.df_content=articles_clean
         self.df = interacts_clean
-        self.df_train , self.df_test = self.create_test_and_train_size()
+        self.backend=backend
+        self.catalog=catalog if catalog is not None else ArticleCatalog.from_interactions(self.df)
+        if n_factors is None:
+            n_factors=64 if backend == 'als' else self.MAX_LATENT_FACTORS
+        self.n_factors=n_factors
+        if train_uim is None or test_uim is None:
+            self.df_train , self.df_test = self.create_test_and_train_size()
+            # sparse train and test matrices, rows and columns sorted by id like the frames
+            train_uim=UserItemMatrix.from_interactions(self.df_train.drop_duplicates())
+            test_uim=UserItemMatrix.from_interactions(self.df_test.drop_duplicates())
+        else:
+            self.df_train , self.df_test = None, None
+        self.train_uim=train_uim
+        self.test_uim=test_uim
+        # fitted factors and accuracy curve are kept on disk, keyed by the interaction data
+        self.cache_dir=cache_dir
+        self.model_key=self.create_model_key()
+        self.model=model
+
+    def create_model_key(self):
+        '''
+        Description: fingerprint of the train/test interactions, the cached model is only valid for the same data
+        Return:
+         model_key - (str) hex digest
+        '''
+        digest=hashlib.sha1('{}-{}'.format(self.backend, self.n_factors).encode())
+        for uim in (self.train_uim, self.test_uim):
+            for values in (uim.user_ids, uim.article_ids, uim.csr.indptr, uim.csr.indices):
+                digest.update(np.ascontiguousarray(values).tobytes())
+            digest.update(str(uim.shape).encode())
+        return digest.hexdigest()[:16]
+
+    def model_prefix(self):
+        # every model of one backend and number of factors shares the prefix, whatever data it was fitted on
+        return os.path.join(self.cache_dir, 'mf-{}-{}-'.format(self.backend, self.n_factors))
+
+    def model_path(self):
+        return self.model_prefix()+'{}.npz'.format(self.model_key)
+
+    def load_model(self):
+        '''
+        Description: load the fitted model of the current data from memory or from the cache directory
+        Return:
+         model - dict with u_train, s_train, vt_train, latent_factors_num, test_accuracy, train_accuracy, None if missing
+        '''
+        if self.model is None and self.cache_dir is not None and os.path.exists(self.model_path()):
+            with np.load(self.model_path()) as npz:
+                self.model={key: npz[key] for key in npz.files}
+        return self.model
+
+    def save_model(self, model):
+        '''
+        Description: keep the fitted model in memory and write it to the cache directory, the models of older data
+                     with the same backend and number of factors are removed, the ones of other settings are kept
+        '''
+        self.model=model
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for stale in glob.glob(glob.escape(self.model_prefix())+'*.npz'):
+            if stale != self.model_path():
+                os.remove(stale)
+        # write to a temporary name first so another worker never reads a half written file
+        tmp_path=self.model_path()+'.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **model)
+        os.replace(tmp_path, self.model_path())
 
     def create_user_item_matrix(self,df):
         '''
@@ -25,13 +115,8 @@ class MFRecommender():
         OUTPUT:
         self.user_item - user item matrix
         '''
-        # Fill in the function here
-        # drop duplicate row and count interact
-        user_item=df.drop_duplicates().groupby(['user_id','article_id']).size().unstack(level=1)
-        # fill Null to 0
-        user_item=user_item.fillna(0)
-        # conver float to int
-        user_item=user_item.astype('int')
+        # build it through the shared sparse store
+        user_item=UserItemMatrix.from_interactions(df.drop_duplicates()).to_frame()
         return user_item # return the user_item matrix
 
     def create_test_and_train_size(self, train_size=40000, test_size=5993):
@@ -52,62 +137,145 @@ class MFRecommender():
         test_idx - all of the test user ids
         test_arts - all of the test article ids
         '''
-        user_item_train = self.create_user_item_matrix(self.df_train)
-        user_item_test = self.create_user_item_matrix(self.df_test)
+        user_item_train = self.train_uim.to_frame()
+        user_item_test = self.test_uim.to_frame()
         test_idx = user_item_test.index.values
         test_arts = user_item_test.columns.values.astype('str')
         return user_item_train, user_item_test, test_idx, test_arts
 
     def calculate_error(self):
+        """
+        Return the latent factors number vs accuary rate curve, fitted once per interaction data
+        and reused from memory or the cache directory afterwards.
+        """
+        model=self.load_model()
+        if model is None:
+            model=self.fit()
+            self.save_model(model)
+        return model['latent_factors_num'],model['test_accuracy'],model['train_accuracy']
+
+    def fit(self):
         """
         1 Build the test SVD matrix.
         2 remove test users with cold start issue
         3 draw a curve of  latent factors number vs accuary rate
         """
-        # Define the vairable:
-        train_errors=[]
-        test_errors=[]
-        train_accuracy=[]
-        test_accuracy=[]
-        # create test and train datasets
-        user_item_train, user_item_test, test_idx, test_arts = self.create_test_and_train_user_item()
+        # test and train datasets as sparse matrices
+        train_uim, test_uim=self.train_uim, self.test_uim
         # fit SVD on the user_item_train matrix
-        u_train, s_train, vt_train =np.linalg.svd(user_item_train, full_matrices=False)
+        u_train, s_train, vt_train =factorize(train_uim.csr, self.backend, k=self.n_factors)
 
         # Build the test SVD matrix.
         ##  Find out user id and article id in both train and test datasets
-        pred_users=np.intersect1d(test_idx,user_item_train.index.values)
-        pred_arts=np.intersect1d(test_arts,user_item_train.columns.values.astype('str'))
-        pred_users_mask=user_item_train.index.isin(pred_users)
-        pred_arts_mask= user_item_train.columns.isin(pred_arts)
+        pred_users=np.intersect1d(test_uim.user_ids,train_uim.user_ids)
+        pred_arts=np.intersect1d(test_uim.article_ids,train_uim.article_ids)
         ##  Find out U, S,VT matrix based on above user id and article id
-        u_test=u_train[pred_users_mask,:]
+        u_test=u_train[np.searchsorted(train_uim.user_ids,pred_users),:]
         s_test=s_train
-        vt_test=vt_train[:,pred_arts_mask]
+        vt_test=vt_train[:,np.searchsorted(train_uim.article_ids,pred_arts)]
 
-        # remove test users with cold start issue
-        user_item_test_actual=user_item_test.loc[pred_users,pred_arts.astype('float')]
+        # remove test users with cold start issue, rows and columns in the same order as u_test and vt_test
+        user_item_test_actual=test_uim.csr[np.searchsorted(test_uim.user_ids,pred_users)][:,np.searchsorted(test_uim.article_ids,pred_arts)]
 
         # draw a curve of  latent factors number vs accuary rate
         ## According to latent factors number vs accuary rate curve, find out latent factors number ranges is from 0 to 700.
         ### store the step of latent factor numbe into latent_factors_list.
-        latent_factors_num=np.arange(10,700+10,20)
+        latent_factors_num=np.arange(10,self.MAX_LATENT_FACTORS+10,20)
         ## In each step of latent factor number, calculate the errors between actual value and predict value
-        for lf in latent_factors_num:
-            ### calculate the predict value. np.round will be used becasue interact number belong to [0,1]
-            user_item_test_pred=np.round(u_test[:,:lf].dot(np.diag(s_test[:lf]).dot(vt_test[:lf,:])))
-            user_item_train_pred=np.round(u_train[:,:lf].dot(np.diag(s_train[:lf]).dot(vt_train[:lf,:])))
-            ### calculate errors
-            test_diff  = np.subtract(user_item_test_actual,user_item_test_pred)
-            train_diff = np.subtract(user_item_train,user_item_train_pred)
-            test_error = np.sum(np.sum(np.abs(test_diff)))
-            train_error=np.sum(np.sum(np.abs(train_diff)))
-            ### store error into a error_list.
-            test_errors.append(test_error)
-            train_errors.append(train_error)
-        test_accuracy= 1 - np.array(test_errors)/(user_item_test_actual.size)
-        train_accuracy= 1 - np.array(train_errors)/(user_item_train.size)
-        return latent_factors_num,test_accuracy,train_accuracy
+        test_errors=self.sweep_error(u_test,s_test,vt_test,user_item_test_actual,latent_factors_num)
+        train_errors=self.sweep_error(u_train,s_train,vt_train,train_uim.csr,latent_factors_num)
+        test_size=user_item_test_actual.shape[0]*user_item_test_actual.shape[1]
+        train_size=train_uim.shape[0]*train_uim.shape[1]
+        test_accuracy= 1 - test_errors/test_size if test_size else np.ones(len(latent_factors_num))
+        train_accuracy= 1 - train_errors/train_size
+        return {'u_train':u_train, 's_train':s_train, 'vt_train':vt_train,
+                'latent_factors_num':latent_factors_num, 'test_accuracy':test_accuracy, 'train_accuracy':train_accuracy}
+
+    def recommend_many(self, user_ids, top_n=None, latent_factors=None, batch_size=1024):
+        '''
+        INPUT:
+        user_ids - (list) user ids
+        top_n - (int) the number of recommendations you want for each user, self.top_n when None
+        latent_factors - (int) number of factors used to predict, None takes the best test accuracy of the curve
+        batch_size - (int) the number of users predicted by one matrix multiply
+
+        OUTPUT:
+        recs - (dict) user id -> (recs, rec_names), the articles with the highest predicted value the user
+               has not read in the train set, users missing from the train set get empty lists
+
+        Description:
+        Batched recommendations from the fitted train factorization, fitted first when needed.
+        '''
+        top_n = self.top_n if top_n is None else top_n
+        model=self.load_model()
+        if model is None:
+            self.calculate_error()
+            model=self.model
+        if latent_factors is None:
+            latent_factors=int(model['latent_factors_num'][np.argmax(model['test_accuracy'])])
+        us=model['u_train'][:, :latent_factors]*model['s_train'][:latent_factors]
+        vt=model['vt_train'][:latent_factors, :]
+        train_uim=self.train_uim
+        recs={u_id: ([], []) for u_id in user_ids}
+        known=[u_id for u_id in user_ids if u_id in train_uim.user_index]
+        for start in range(0, len(known), batch_size):
+            batch_ids=known[start:start+batch_size]
+            rows=np.array([train_uim.user_row(u_id) for u_id in batch_ids], dtype=np.int64)
+            scores=us[rows].dot(vt)
+            # the articles read in the train set cannot be recommended
+            seen=train_uim.csr[rows].tocoo()
+            scores[seen.row, seen.col]=-np.inf
+            top_cols=top_k_rows(scores, top_n)
+            for i, u_id in enumerate(batch_ids):
+                cols=top_cols[i][np.isfinite(scores[i, top_cols[i]])]
+                aids=train_uim.article_ids[cols].tolist()
+                recs[u_id]=(aids, self.catalog.get_article_names(aids))
+        return recs
+
+    def sweep_error(self, u, s, vt, actual, latent_factors_num, dtype=np.float32):
+        """
+        Description:
+        Errors of round(u[:,:lf] diag(s[:lf]) vt[:lf,:]) against actual for every lf of latent_factors_num.
+        The prediction of one chunk of rows is grown one rank slice at a time in a preallocated buffer,
+        so every factor is multiplied once for the whole sweep and memory stays at SWEEP_CHUNK_ROWS rows.
+        Args:
+        u, s, vt - factorization, s sorted from the largest value
+        actual - scipy sparse 0/1 matrix with the rows of u and the columns of vt
+        latent_factors_num - increasing numbers of latent factors
+        dtype - buffer dtype
+        Return:
+        errors - np array, sum of absolute errors per latent factors number
+        """
+        errors=np.zeros(len(latent_factors_num))
+        n_rows, n_cols=actual.shape
+        if n_rows == 0 or n_cols == 0:
+            return errors
+        us=(u*s).astype(dtype)
+        vt=vt.astype(dtype)
+        chunk_rows=min(self.SWEEP_CHUNK_ROWS, n_rows)
+        pred_buf=np.empty((chunk_rows, n_cols), dtype=dtype)
+        work_buf=np.empty((chunk_rows, n_cols), dtype=dtype)
+        actual_buf=np.empty((chunk_rows, n_cols), dtype=dtype)
+        for start in range(0, n_rows, chunk_rows):
+            stop=min(start+chunk_rows, n_rows)
+            pred=pred_buf[:stop-start]
+            work=work_buf[:stop-start]
+            actual_chunk=actual_buf[:stop-start]
+            pred.fill(0)
+            actual_chunk[...]=actual[start:stop].toarray()
+            done=0
+            for i, lf in enumerate(latent_factors_num):
+                lf=min(lf, len(s))
+                if lf > done:
+                    # add the rank slice done..lf to the prediction
+                    np.matmul(us[start:stop,done:lf], vt[done:lf,:], out=work)
+                    pred+=work
+                    done=lf
+                np.round(pred, out=work)
+                work-=actual_chunk
+                np.abs(work, out=work)
+                errors[i]+=work.sum(dtype=np.float64)
+        return errors
     '''
     # Web server use ploly to draw curve, so comment out the following.
     def draw_curve(self,latent_factors_num,test_accuracy,train_accuracy):
@@ -132,8 +300,8 @@ class MFRecommender():
         plt.show()
     '''
 if __name__ == '__main__':
-    from data_clean import Data_Clean
-    from mfrecommender import MFRecommender
+    # run from the web_app directory: python -m recommendation.mfrecommender
+    from recommendation.data_clean import Data_Clean
 
     #instantiate data clean
     dc = Data_Clean()
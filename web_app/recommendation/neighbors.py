@@ -0,0 +1,178 @@
+import numpy as np
+
+# number of matrix cells a similarity block may hold while building an index
+BLOCK_CELLS = 2**24
+
+def top_k_rows(keys, k):
+    '''
+    Description: positions of the k largest keys of every row, largest first
+    Args:
+     keys - 2d np array, one row of scores per item, ties must already be broken inside the keys
+     k - (int) number of positions to keep per row
+    Return:
+     top_idx - 2d np array (rows, k) of column positions
+    '''
+    k = min(k, keys.shape[1])
+    if k == 0:
+        return np.empty((keys.shape[0], 0), dtype=np.int64)
+    if k < keys.shape[1]:
+        top_idx = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    else:
+        top_idx = np.tile(np.arange(keys.shape[1]), (keys.shape[0], 1))
+    top_keys = np.take_along_axis(keys, top_idx, axis=1)
+    order = np.argsort(-top_keys, axis=1, kind='stable')
+    return np.take_along_axis(top_idx, order, axis=1)
+
+
+class NeighborIndex():
+    '''
+    Class: Precomputed top-K user-user neighbor lists
+    For every user the K most similar users are stored, ordered by similarity (dot product of the
+    user-item rows), then by number of interactions, then by user id. Lists are padded with -1 when
+    there are fewer than K other users.
+    '''
+    def __init__(self, user_ids, neighbor_ids, similarity, k=None):
+        '''
+        Description: initiate NeighborIndex from already built arrays, use build() to compute them
+        Args:
+         user_ids - np array of sorted user ids, one per row
+         neighbor_ids - 2d np array (users, K) of neighbor user ids
+         similarity - 2d np array (users, K) of the matching similarities
+         k - (int) requested list length, it can be larger than K while there are few users
+        Return:
+         N/A
+        '''
+        self.user_ids = user_ids
+        self.neighbor_ids = neighbor_ids
+        self.similarity = similarity
+        self.k = k if k is not None else neighbor_ids.shape[1]
+        self.user_index = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+
+    @classmethod
+    def build(cls, uim, k=50):
+        '''
+        Description: offline build of the index from a UserItemMatrix, computed in blocks of rows
+        Args:
+         uim - UserItemMatrix
+         k - (int) number of neighbors kept per user
+        Return:
+         NeighborIndex
+        '''
+        n_users = uim.shape[0]
+        width = max(min(k, n_users - 1), 0)
+        neighbor_ids = np.full((n_users, width), -1, dtype=np.int64)
+        similarity = np.zeros((n_users, width), dtype=np.int32)
+        for start, stop, block_ids, block_sims in cls._blocks(uim, np.arange(n_users), width):
+            neighbor_ids[start:stop] = block_ids
+            similarity[start:stop] = block_sims
+        return cls(uim.user_ids.copy(), neighbor_ids, similarity, k)
+
+    @staticmethod
+    def _blocks(uim, rows, k):
+        '''
+        Description: compute the top-k neighbors of the given rows, one block of rows at a time
+        '''
+        n_users = uim.shape[0]
+        block_size = max(1, BLOCK_CELLS // max(n_users, 1))
+        tie = NeighborIndex._tie_keys(uim)
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start:start + block_size]
+            sims = uim.csr[block_rows].dot(uim.csr.T).toarray()
+            keys = NeighborIndex._sort_keys(sims, tie, n_users)
+            # a user is not his own neighbor
+            keys[np.arange(len(block_rows)), block_rows] = -1
+            top_idx = top_k_rows(keys, k)
+            yield start, start + len(block_rows), uim.user_ids[top_idx], np.take_along_axis(sims, top_idx, axis=1)
+
+    @staticmethod
+    def _tie_keys(uim):
+        '''
+        Description: secondary sort key per user, more interactions first and then the smaller user id
+        '''
+        rank = np.lexsort((-uim.user_ids, uim.user_counts))
+        tie = np.empty(len(rank), dtype=np.int64)
+        tie[rank] = np.arange(len(rank))
+        return tie
+
+    @staticmethod
+    def _sort_keys(sims, tie, n_users):
+        '''
+        Description: combine similarity and tie key (0..n_users-1) into one int64 key, larger is closer
+        '''
+        return sims.astype(np.int64) * n_users + tie
+
+    def neighbors(self, user_id):
+        '''
+        Description: ordered neighbor list of a user
+        Args:
+         user_id - (int) a user id
+        Return:
+         neighbor_ids - np array of neighbor user ids, closest first
+         similarity - np array of the matching similarities
+        '''
+        row = self.user_index[user_id]
+        valid = self.neighbor_ids[row] >= 0
+        return self.neighbor_ids[row][valid], self.similarity[row][valid]
+
+    def refresh(self, uim, user_ids):
+        '''
+        Description:
+        Return a new index that reflects new interactions of user_ids, without touching this one.
+        The rows of user_ids are recomputed and every other list is merged with the new similarities
+        to user_ids. Interactions are only ever added, so a user can only move up in other lists.
+        Args:
+         uim - UserItemMatrix that already contains the new interactions
+         user_ids - list of user ids whose interactions changed (new users included)
+        Return:
+         NeighborIndex
+        '''
+        n_users = uim.shape[0]
+        k = max(min(self.k, n_users - 1), 0)
+        neighbor_ids = np.full((n_users, k), -1, dtype=np.int64)
+        similarity = np.zeros((n_users, k), dtype=np.int32)
+        # carry over the lists of the users this index already knows
+        old_rows = np.minimum(np.searchsorted(self.user_ids, uim.user_ids), max(len(self.user_ids) - 1, 0))
+        known = self.user_ids[old_rows] == uim.user_ids if len(self.user_ids) else np.zeros(n_users, dtype=bool)
+        width = self.neighbor_ids.shape[1]
+        neighbor_ids[known, :width] = self.neighbor_ids[old_rows[known]]
+        similarity[known, :width] = self.similarity[old_rows[known]]
+
+        touched_rows = np.array(sorted(uim.user_row(uid) for uid in set(user_ids)), dtype=np.int64)
+        touched_ids = uim.user_ids[touched_rows]
+        # merge the touched users into everybody else's list
+        sims = uim.csr.dot(uim.csr[touched_rows].T).toarray()
+        tie = self._tie_keys(uim)
+        affected = (sims > 0).any(axis=1) | np.isin(neighbor_ids, touched_ids).any(axis=1) | (neighbor_ids < 0).any(axis=1)
+        affected[touched_rows] = False
+        rows = np.where(affected)[0]
+        if len(rows) > 0 and k > 0:
+            cur_ids = neighbor_ids[rows]
+            cur_rows = np.minimum(np.searchsorted(uim.user_ids, cur_ids), n_users - 1)
+            cur_keys = self._sort_keys(similarity[rows], tie[cur_rows], n_users)
+            # drop stale entries of touched users and empty slots, they are added back below
+            cur_keys[(cur_ids < 0) | np.isin(cur_ids, touched_ids)] = -1
+            new_keys = self._sort_keys(sims[rows], tie[touched_rows], n_users)
+            all_keys = np.hstack([cur_keys, new_keys])
+            all_ids = np.hstack([cur_ids, np.tile(touched_ids, (len(rows), 1))])
+            all_sims = np.hstack([similarity[rows], sims[rows].astype(np.int32)])
+            top_idx = top_k_rows(all_keys, k)
+            top_keys = np.take_along_axis(all_keys, top_idx, axis=1)
+            neighbor_ids[rows] = np.where(top_keys >= 0, np.take_along_axis(all_ids, top_idx, axis=1), -1)
+            similarity[rows] = np.where(top_keys >= 0, np.take_along_axis(all_sims, top_idx, axis=1), 0)
+        # and recompute the lists of the touched users from scratch
+        for start, stop, block_ids, block_sims in self._blocks(uim, touched_rows, k):
+            neighbor_ids[touched_rows[start:stop]] = block_ids
+            similarity[touched_rows[start:stop]] = block_sims
+        return NeighborIndex(uim.user_ids.copy(), neighbor_ids, similarity, self.k)
+
+
+if __name__ == '__main__':
+    # run from the web_app directory: python -m recommendation.neighbors
+    from recommendation.data_clean import Data_Clean
+    from recommendation.useritem import UserItemMatrix
+
+    #instantiate data clean
+    dc = Data_Clean()
+    uim = UserItemMatrix.from_interactions(dc.interacts_clean)
+    index = NeighborIndex.build(uim)
+    print(index.neighbors(20))
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from recommendation import snapshot
+from recommendation.segments import LIGHT, HEAVY
+
+# Offline table of the top_n recommendations of every known user for every strategy.
+# Directory layout:
+#  manifest.json                  - format, model id, top_n, shard size, strategies
+#  titles.*                       - string table of every title, recommendations are codes into it
+#  segments.npy                   - user segment table, the routing of Recommender.route
+#  rank.npy rank.ids.npy          - the rank based recommendations, the same for every user
+#  <strategy>.<shard>.users.npy   - sorted user ids of one shard
+#  <strategy>.<shard>.ids.npy     - (users, top_n) article ids of the recommendations, NaN pads short lists
+#  <strategy>.<shard>.recs.npy    - (users, top_n) title codes, -1 pads short lists
+# A shard is complete once its recs file exists, an interrupted job resumes from the missing shards.
+PRECOMPUTE_FORMAT = 2
+MANIFEST_FILE = 'manifest.json'
+STRATEGIES = ('rank', 'ucf', 'content', 'mf')
+
+# the Recommender of the job and the title -> code table, forked worker processes inherit them
+_recommender = None
+_title_codes = None
+
+def shard_prefix(out_pth, strategy, shard):
+    return os.path.join(out_pth, '{}.{:05d}'.format(strategy, shard))
+
+def encode_titles(recs, title_codes, top_n):
+    '''
+    Description: (users, top_n) int32 matrix of title codes, -1 pads short lists
+    '''
+    codes = np.full((len(recs), top_n), -1, dtype=np.int32)
+    for i, titles in enumerate(recs):
+        titles = titles[:top_n]
+        # a title missing from the table (a missing title) is left out like padding
+        codes[i, :len(titles)] = [title_codes.get(title, -1) for title in titles]
+    return codes
+
+def encode_ids(rec_ids, top_n):
+    '''
+    Description: (users, top_n) float64 matrix of article ids, NaN pads short lists
+    '''
+    ids = np.full((len(rec_ids), top_n), np.nan)
+    for i, article_ids in enumerate(rec_ids):
+        article_ids = article_ids[:top_n]
+        ids[i, :len(article_ids)] = article_ids
+    return ids
+
+def compute_recs(rec, strategy, user_ids, top_n):
+    '''
+    Description: recommended article ids and titles of user_ids with one strategy, with the batched methods
+                 where there are
+    Return:
+     rec_ids - list of article id lists, one per user
+     recs - list of title lists, one per user
+    '''
+    if strategy == 'ucf':
+        recs = rec.ucfr.recommend_many(user_ids, top_n)
+    elif strategy == 'mf':
+        recs = rec.mfr.recommend_many(user_ids, top_n)
+    elif strategy == 'content':
+        cbr = rec.cbr
+        recs = {u_id: cbr.content_recs(u_id, top_n) for u_id in user_ids}
+    else:
+        raise ValueError("Unknown strategy {}, use one of {}".format(strategy, STRATEGIES))
+    return [recs[u_id][0] for u_id in user_ids], [recs[u_id][1] for u_id in user_ids]
+
+def run_shard(out_pth, strategy, shard, user_ids, top_n):
+    '''
+    Description: compute and write one shard, in a worker process or in the job itself
+    Return:
+     strategy, shard, number of users, seconds
+    '''
+    start = time.perf_counter()
+    rec_ids, recs = compute_recs(_recommender, strategy, user_ids, top_n)
+    codes = encode_titles(recs, _title_codes, top_n)
+    prefix = shard_prefix(out_pth, strategy, shard)
+    np.save(prefix + '.users.npy', np.asarray(user_ids, dtype=np.int64))
+    np.save(prefix + '.ids.npy', encode_ids(rec_ids, top_n))
+    # the recs file marks the shard as done, so it is renamed into place last
+    with open(prefix + '.recs.tmp', 'wb') as f:
+        np.save(f, codes)
+    os.replace(prefix + '.recs.tmp', prefix + '.recs.npy')
+    return strategy, shard, len(user_ids), time.perf_counter() - start
+
+def title_table(rec):
+    '''
+    Description: sorted titles every strategy can recommend
+    '''
+    titles = set(rec.catalog.ids) | set(rec.rbr.ranking[1])
+    return sorted(title for title in titles if isinstance(title, str))
+
+def write_tables(rec, out_pth, manifest, titles):
+    '''
+    Description: start a new output directory with the manifest and the tables shared by every shard
+    '''
+    shutil.rmtree(out_pth, ignore_errors=True)
+    os.makedirs(out_pth)
+    snapshot.write_strings(os.path.join(out_pth, 'titles'), np.asarray(titles, dtype=object))
+    np.save(os.path.join(out_pth, 'segments.npy'), rec.segments.table)
+    title_codes = {title: code for code, title in enumerate(titles)}
+    np.save(os.path.join(out_pth, 'rank.npy'), encode_titles([rec.rbr.get_top_articles(manifest['top_n'])], title_codes, manifest['top_n']))
+    rank_ids = [float(aid) for aid in rec.rbr.get_top_article_ids(manifest['top_n'])]
+    np.save(os.path.join(out_pth, 'rank.ids.npy'), encode_ids([rank_ids], manifest['top_n']))
+    with open(os.path.join(out_pth, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+def precompute(rec, out_pth, strategies=STRATEGIES, top_n=10, shard_size=5000, workers=None, resume=True):
+    '''
+    Description: write the recommendations of every user known to rec for every strategy
+    Args:
+     rec - Recommender
+     out_pth - output directory
+     strategies - strategies to compute, from STRATEGIES
+     top_n - (int) recommendations per user
+     shard_size - (int) users per shard, the unit of work of a process and of resuming
+     workers - (int) processes, None uses every cpu, 0 computes in this process
+     resume - keep the finished shards of an earlier run of the same model
+    Return:
+     report - dict strategy -> (users, seconds of computation)
+    '''
+    global _recommender, _title_codes
+    titles = title_table(rec)
+    manifest = {'format': PRECOMPUTE_FORMAT, 'model_id': rec.state.model_id, 'top_n': top_n,
+                'shard_size': shard_size, 'strategies': list(strategies)}
+    manifest_pth = os.path.join(out_pth, MANIFEST_FILE)
+    previous = None
+    if resume and os.path.exists(manifest_pth):
+        with open(manifest_pth) as f:
+            previous = json.load(f)
+    if previous is None or any(previous.get(key) != manifest[key] for key in ('format', 'model_id', 'top_n', 'shard_size')):
+        write_tables(rec, out_pth, manifest, titles)
+    elif previous['strategies'] != manifest['strategies']:
+        with open(manifest_pth, 'w') as f:
+            json.dump(manifest, f)
+
+    user_ids = rec.uim.user_ids.tolist()
+    tasks = []
+    for strategy in strategies:
+        if strategy == 'rank':
+            continue
+        for shard, start in enumerate(range(0, len(user_ids), shard_size)):
+            if not os.path.exists(shard_prefix(out_pth, strategy, shard) + '.recs.npy'):
+                tasks.append((out_pth, strategy, shard, user_ids[start:start + shard_size], top_n))
+    if 'mf' in strategies and any(task[1] == 'mf' for task in tasks):
+        # fit once here, the workers share the fitted factors
+        rec.mf_calculate_error()
+    for strategy in strategies:
+        if strategy != 'rank':
+            rec.component({'ucf': 'ucfr', 'content': 'cbr', 'mf': 'mfr'}[strategy])
+
+    _recommender = rec
+    _title_codes = {title: code for code, title in enumerate(titles)}
+    report = {strategy: [0, 0.0] for strategy in strategies if strategy != 'rank'}
+    # without fork every worker would have to rebuild the models, the shards are then computed here
+    if workers == 0 or 'fork' not in multiprocessing.get_all_start_methods() or len(tasks) == 0:
+        results = [run_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(run_shard, *task) for task in tasks]
+            results = [future.result() for future in as_completed(futures)]
+    for strategy, shard, n_users, seconds in results:
+        report[strategy][0] += n_users
+        report[strategy][1] += seconds
+    return {strategy: tuple(values) for strategy, values in report.items()}
+
+
+class PrecomputedRecommendations():
+    '''
+    Class: Read only lookup of a table written by precompute
+    Every array is memory mapped, a lookup is a binary search in one shard.
+    '''
+    def __init__(self, out_pth):
+        '''
+        Description: open a precomputed table
+        Args:
+         out_pth - directory written by precompute
+        Return:
+         N/A
+        '''
+        with open(os.path.join(out_pth, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != PRECOMPUTE_FORMAT:
+            raise ValueError("Unsupported precomputed table format {}".format(self.manifest.get('format')))
+        self.model_id = self.manifest['model_id']
+        self.top_n = self.manifest['top_n']
+        self.titles = snapshot.read_strings(os.path.join(out_pth, 'titles'))
+        self.segments = np.load(os.path.join(out_pth, 'segments.npy'))
+        self.rank = np.load(os.path.join(out_pth, 'rank.npy'))[0]
+        self.rank_ids = np.load(os.path.join(out_pth, 'rank.ids.npy'))[0]
+        # strategy -> first user id of every shard, users, article ids and recs of every shard
+        self.shards = dict()
+        for strategy in self.manifest['strategies']:
+            if strategy == 'rank':
+                continue
+            shards = []
+            shard = 0
+            while os.path.exists(shard_prefix(out_pth, strategy, shard) + '.recs.npy'):
+                prefix = shard_prefix(out_pth, strategy, shard)
+                shards.append((np.load(prefix + '.users.npy', mmap_mode='r'), np.load(prefix + '.ids.npy', mmap_mode='r'),
+                               np.load(prefix + '.recs.npy', mmap_mode='r')))
+                shard += 1
+            first_ids = np.array([users[0] if len(users) else np.iinfo(np.int64).max for users, _, _ in shards], dtype=np.int64)
+            self.shards[strategy] = (first_ids, shards)
+
+    def decode(self, codes, top_n=None):
+        codes = codes[:self.top_n if top_n is None else top_n]
+        return [self.titles[code] for code in codes.tolist() if code >= 0]
+
+    def decode_ids(self, ids, top_n=None):
+        ids = ids[:self.top_n if top_n is None else top_n]
+        return [aid for aid in ids.tolist() if aid == aid]
+
+    def get(self, user_id, strategy, top_n=None):
+        '''
+        Description: recommended titles of one user with one strategy
+        Return:
+         titles - (list) at most top_n titles, None when the user is not in the table
+        '''
+        found = self.get_answer(user_id, strategy, top_n)
+        return found[1] if found is not None else None
+
+    def get_answer(self, user_id, strategy, top_n=None):
+        '''
+        Description: recommended article ids and titles of one user with one strategy
+        Return:
+         article_ids, titles - (lists) at most top_n article ids and titles, None when the user is not in the table
+        '''
+        if strategy == 'rank':
+            return self.decode_ids(self.rank_ids, top_n), self.decode(self.rank, top_n)
+        first_ids, shards = self.shards[strategy]
+        shard = np.searchsorted(first_ids, user_id, side='right') - 1
+        if shard < 0:
+            return None
+        users, ids, recs = shards[shard]
+        pos = np.searchsorted(users, user_id)
+        if pos >= len(users) or users[pos] != user_id:
+            return None
+        return self.decode_ids(ids[pos], top_n), self.decode(recs[pos], top_n)
+
+    def recommend_articles(self, user_id, top_n=None):
+        '''
+        Description: the answer Recommender.recommend_articles gave when the table was written, None when unknown
+        '''
+        answer = self.recommend(user_id, top_n)
+        return answer[0] if answer is not None else None
+
+    def recommend(self, user_id, top_n=None):
+        '''
+        Description: the answer Recommender.recommend gave when the table was written, None when unknown
+        Return:
+         recs - list of titles
+         strategy - the strategy of the titles
+        '''
+        answer = self.recommend_answer(user_id, top_n)
+        return answer[:2] if answer is not None else None
+
+    def recommend_answer(self, user_id, top_n=None):
+        '''
+        Description: the answer Recommender.recommend_answer gave when the table was written, None when unknown
+        Return:
+         recs - list of titles
+         strategy - the strategy of the titles
+         article_ids - list of the recommended article ids
+        '''
+        if top_n is not None and top_n > self.top_n:
+            return None
+        in_table = isinstance(user_id, (int, np.integer)) and 0 <= user_id < len(self.segments)
+        segment = self.segments[user_id] if in_table else 0
+        found = ([], [])
+        strategy = 'rank'
+        if segment == LIGHT and 'content' in self.shards:
+            found, strategy = self.get_answer(user_id, 'content', top_n), 'content'
+        elif segment == HEAVY and 'ucf' in self.shards:
+            found, strategy = self.get_answer(user_id, 'ucf', top_n), 'ucf'
+        elif segment in (LIGHT, HEAVY):
+            return None
+        if found is None:
+            return None
+        if len(found[1]) == 0:
+            found, strategy = self.get_answer(user_id, 'rank', top_n), 'rank'
+        article_ids, recs = found
+        return recs, strategy, article_ids
+
+
+def main():
+    from recommendation.recommender import Recommender
+
+    parser = argparse.ArgumentParser(description='Precompute the recommendations of every user')
+    parser.add_argument('--interact-pth', default='data/user-item-interactions.csv')
+    parser.add_argument('--articles-pth', default='data/articles_community.csv')
+    parser.add_argument('--out-pth', default='data/precomputed')
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=STRATEGIES)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--shard-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None, help='processes, 0 runs in this process')
+    parser.add_argument('--no-resume', action='store_true', help='start over even when finished shards exist')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rec = Recommender(args.interact_pth, args.articles_pth, startup='parallel')
+    print('models built in {:.1f}s'.format(time.perf_counter() - start))
+    start = time.perf_counter()
+    report = precompute(rec, args.out_pth, args.strategies, args.top_n, args.shard_size, args.workers,
+                        resume=not args.no_resume)
+    seconds = time.perf_counter() - start
+    for strategy, (n_users, cpu_seconds) in report.items():
+        rate = n_users / cpu_seconds if cpu_seconds else 0.0
+        print('{:<8}{:>10} users{:>12.0f} users/s per process'.format(strategy, n_users, rate))
+    n_users = sum(n for n, _ in report.values())
+    print('{} user recommendations in {:.1f}s, {:.0f} users/s, written to {}'.format(
+        n_users, seconds, n_users / seconds if seconds else 0.0, args.out_pth))
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,170 @@
+import copy
 import pandas as pd
 import numpy as np
+from collections import deque
 
 class RBRecommender():
     '''
     Class: Rank-Based Recommendations
     we don't actually have ratings for whether a user liked an article or not. We only know that a user has interacted with an article.
     In these cases, the popularity of an article can really only be based on how often an article was interacted with.
+
+    The popularity is computed once into a ranked array, and kept up to date by add_interactions.
+    By default every interaction counts 1. Optionally only the last `window` interactions count, and/or
+    every interaction weighs half as much after `half_life` newer interactions.
     '''
-    def __init__(self, df,top_n=10):
+    # renormalize the decayed scores before 2**exponent gets near the float64 limit
+    MAX_EXPONENT = 512
+
+    def __init__(self, df,top_n=10, window=None, half_life=None, popularity=None):
+        '''
+        Args:
+         df - interactions dataframe, can be None when popularity is given
+         popularity - pandas series of interaction counts indexed by (article_id, title), used instead of
+                      counting df (the chunked ingestion builds it without keeping the interactions)
+        '''
         self.top_n = top_n
         self.df=df
+        self.popularity=popularity
+        self.window=window
+        self.half_life=half_life
+        # (article_id, title) -> position in the score arrays
+        self.key_index=dict()
+        self.article_ids=np.array([], dtype='float')
+        self.titles=np.array([], dtype='object')
+        self.scores=np.array([], dtype='float')
+        # interactions of every article still inside the window
+        self.window_counts=np.array([], dtype=np.int64)
+        self.n_events=0
+        self.exponent_offset=0
+        self.events=deque()
+        self.ranking=(np.array([], dtype='str'), [])
+        self.create_popularity()
+
+    def create_popularity(self):
+        '''
+        Description: count the interactions of self.df per (article_id, title) and rank them
+        '''
+        if self.window is None and self.half_life is None:
+            # plain counts, one groupby at start up
+            df_tmp=self.popularity if self.popularity is not None else self.df.groupby(['article_id','title']).size()
+            keys=df_tmp.index.tolist()
+            self.key_index={key: i for i, key in enumerate(keys)}
+            self.article_ids=df_tmp.index.get_level_values('article_id').values.astype('float')
+            self.titles=df_tmp.index.get_level_values('title').values.astype('object')
+            self.scores=df_tmp.values.astype('float')
+            self.n_events=int(df_tmp.sum())
+            self.rank()
+        else:
+            self.add_interactions(self.df)
+
+    def rank(self):
+        '''
+        Description: sort the articles by popularity, ties go to the smaller article_id
+        '''
+        order=np.lexsort((np.arange(len(self.scores)), self.article_ids, -self.scores))
+        # one assignment so readers always see a consistent ranking
+        self.ranking=(self.article_ids[order].astype('str'), self.titles[order].tolist())
+
+    def event_weights(self, n):
+        '''
+        Description: weights of the next n interactions, growing by 2**(1/half_life) per interaction
+        '''
+        if self.half_life is None:
+            return np.ones(n)
+        exponents=(self.n_events+np.arange(n))/self.half_life-self.exponent_offset
+        if n > 0 and exponents[-1] > self.MAX_EXPONENT:
+            # scale every stored score down, only the relative order matters
+            shift=np.floor(exponents[-1])
+            self.scores=self.scores*2.0**(-shift)
+            self.events=deque((pos, weight*2.0**(-shift)) for pos, weight in self.events)
+            self.exponent_offset+=shift
+            exponents-=shift
+        return 2.0**exponents
+
+    def add_interactions(self, df):
+        '''
+        Description: add new interactions to the popularity and re-rank
+        Args:
+         df - pandas dataframe with article_id, title columns, one row per new interaction
+        Return:
+         N/A
+        '''
+        keys=list(zip(df['article_id'].values.astype('float').tolist(), df['title'].values.tolist()))
+        new_keys=[key for key in dict.fromkeys(keys) if key not in self.key_index]
+        if len(new_keys) > 0:
+            for key in new_keys:
+                self.key_index[key]=len(self.key_index)
+            self.article_ids=np.concatenate([self.article_ids, np.array([key[0] for key in new_keys], dtype='float')])
+            self.titles=np.concatenate([self.titles, np.array([key[1] for key in new_keys], dtype='object')])
+            self.scores=np.concatenate([self.scores, np.zeros(len(new_keys))])
+            self.window_counts=np.concatenate([self.window_counts, np.zeros(len(new_keys), dtype=np.int64)])
+        positions=np.array([self.key_index[key] for key in keys], dtype=np.int64)
+        weights=self.event_weights(len(positions))
+        scores=self.scores.copy()
+        np.add.at(scores, positions, weights)
+        if self.window is not None:
+            window_counts=self.window_counts.copy()
+            np.add.at(window_counts, positions, 1)
+            self.events.extend(zip(positions.tolist(), weights.tolist()))
+            # interactions that fell out of the window stop counting
+            while len(self.events) > self.window:
+                pos, weight=self.events.popleft()
+                scores[pos]-=weight
+                window_counts[pos]-=1
+            # no rounding residue is left where every interaction of an article fell out, so those tie at 0
+            scores[window_counts == 0]=0.0
+            self.window_counts=window_counts
+        self.scores=scores
+        self.n_events+=len(positions)
+        self.rank()
+
+    def refresh_interactions(self, df):
+        '''
+        Description: a new recommender with the interactions of df added, this one is left as is
+        Args:
+         df - pandas dataframe with article_id, title columns, one row per new interaction
+        Return:
+         RBRecommender
+        '''
+        rbr=copy.copy(self)
+        rbr.key_index=dict(self.key_index)
+        rbr.events=deque(self.events)
+        rbr.add_interactions(df)
+        return rbr
 
-    def get_top_articles(self, n=10):
+    def get_top_articles(self, n=None):
         '''
         INPUT:
-        n - (int) the number of top articles to return
-        df - (pandas dataframe) df as defined at the top of the notebook
+        n - (int) the number of top articles to return, self.top_n when None
+        self.ranking - precomputed article ranking
 
         OUTPUT:
         top_articles - (list) A list of the top 'n' article titles
 
         '''
-        if n != 10:
-            self.top_n = n
-        df_tmp=self.df.groupby(['article_id','title']).size()
-        df_article=df_tmp.sort_values(ascending=False).head(self.top_n).reset_index()
-        top_articles=df_article['title'].values.tolist()
+        n = self.top_n if n is None else n
+        _, titles=self.ranking
+        top_articles=titles[:n]
         return top_articles # Return the top article titles from df (not df_content)
 
-    def get_top_article_ids(self, n=10):
+    def get_top_article_ids(self, n=None):
         '''
         INPUT:
-        n - (int) the number of top articles to return
-        df - (pandas dataframe) df as defined at the top of the notebook
+        n - (int) the number of top articles to return, self.top_n when None
+        self.ranking - precomputed article ranking
 
         OUTPUT:
         top_article_ids - (list) A list of the top 'n' article ids
         '''
-        if n != 10:
-            self.top_n = n
-        df_article=self.df.groupby(['article_id','title']).size().nlargest(self.top_n).reset_index() #
-        top_article_ids=df_article['article_id'].values.astype('str').tolist()
+        n = self.top_n if n is None else n
+        article_ids, _=self.ranking
+        top_article_ids=article_ids[:n].tolist()
         return top_article_ids # Return the top article ids
 
 if __name__ == '__main__':
-    from data_clean import Data_Clean
-    from rbrecommender import RBRecommender
+    # run from the web_app directory: python -m recommendation.rbrecommender
+    from recommendation.data_clean import Data_Clean
 
     #instantiate data clean
     dc = Data_Clean()
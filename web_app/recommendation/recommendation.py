@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from recommender import Recommender
+from recommendation.recommender import Recommender
 
 if __name__ == '__main__':
+    # run from the web_app directory: python -m recommendation.recommendation
 
     rec=Recommender()
 
@@ -1,49 +1,576 @@
+import os
+import time
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 # web app use plotly , so remove : import matplotlib.pyplot as plt
 from recommendation.data_clean import Data_Clean
+from recommendation.usermap import UserIdMap
+from recommendation.artifact import ModelArtifact
+from recommendation.useritem import UserItemMatrix
+from recommendation.segments import UserSegments, NEW, LIGHT, HEAVY, SEGMENT_NAMES
 from recommendation.rbrecommender import RBRecommender
 from recommendation.ucfrecommender import UCFRecommender
 from recommendation.mfrecommender import MFRecommender
 from recommendation.cbrecommender import CBRecommender
 
+# how Recommender builds UCFRecommender, CBRecommender and MFRecommender:
+#  eager      - one after another in __init__
+#  parallel   - concurrently in a thread pool, __init__ waits for all of them
+#  background - concurrently in a thread pool, __init__ returns right away and requests are answered
+#               by RBRecommender until the recommender they need is built
+#  lazy       - each one when it is first used
+STARTUP_MODES = ('eager', 'parallel', 'background', 'lazy')
+
+# Everything a request reads, replaced as a whole and never modified once it is published.
+# model_id identifies the data the models were built from, version grows by one with every
+# add_interactions that changed something, data_id identifies the interactions of the state
+# (the model_id until the first add_interactions), so processes that applied different batches
+# never share ids. components maps 'ucfr', 'cbr' and 'mfr' to the recommenders built so far.
+ModelState = namedtuple('ModelState', ['model_id', 'version', 'data_id', 'uim', 'catalog', 'segments', 'rbr', 'components'])
+
+# One answer of Recommender: recs are the titles of recommend_articles, article_ids the ids (float) of the
+# recommended articles. Titles can repeat across articles, so there can be more ids than titles.
+Answer = namedtuple('Answer', ['recs', 'strategy', 'article_ids'])
+
+def fingerprint_id(uim, light_threshold):
+    '''
+    Description: id of a user-item matrix segmented with light_threshold, equal data gives equal ids
+    '''
+    return '{}-{}'.format(uim.fingerprint(), light_threshold)
+
 class Recommender():
     '''
     Class: User Based Collaborative Filtering Recommendations
     '''
-    def __init__(self, interact_pth='data/user-item-interactions.csv', articles_pth='data/articles_community.csv',top_n=10):
+    def __init__(self, interact_pth='data/user-item-interactions.csv', articles_pth='data/articles_community.csv',top_n=10,
+                 chunksize=None, startup='eager', max_workers=3, light_threshold=3, cache=None, precomputed=None,
+                 artifact_pth=None, metrics=None, profiler=None):
+        '''
+        Args:
+         chunksize - stream the interactions csv chunksize rows at a time, the recommenders are then built
+                     from the sparse structures only and no interaction dataframe is kept
+         startup - one of STARTUP_MODES
+         max_workers - (int) threads of the parallel and background modes
+         light_threshold - (int) users with fewer articles than this get content based recommendations
+         cache - optional RecommendationCache in front of recommend_articles
+         precomputed - optional PrecomputedRecommendations written by the precompute job for this data,
+                       answers are looked up there until the first add_interactions
+         artifact_pth - directory written by recommendation.artifact, the models are opened from it memory
+                        mapped instead of being built from the csv files (light_threshold is the artifact's)
+         metrics - optional Metrics, recommend and add_interactions count and time their requests into it
+         profiler - optional SlowRequestProfiler run on a sample of the recommend requests
+        '''
+        if startup not in STARTUP_MODES:
+            raise ValueError("Unknown startup mode {}, use one of {}".format(startup, STARTUP_MODES))
         self.top_n = top_n
-        dc=Data_Clean(interact_pth, articles_pth)
-        self.ucfr=UCFRecommender(dc.interacts_clean)
-        self.rbr=RBRecommender(dc.interacts_clean)
-        self.cbr=CBRecommender(dc.articles_clean,dc.interacts_clean)
-        self.mfr=MFRecommender(dc.articles_clean,dc.interacts_clean)
-        self.user_with_few_articles = self.ucfr.user_item.index[self.ucfr.user_item.sum(axis=1)<3].values
+        self.startup=startup
+        self.cache=cache
+        self.precomputed=precomputed
+        self.metrics=metrics
+        self.profiler=profiler
+        # seconds spent building each part, filled in as the parts finish
+        self.build_timings=dict()
+        # add_interactions calls are applied one at a time, readers never take it
+        self.write_lock=threading.Lock()
+        # serializes the replacement of self.state
+        self.state_lock=threading.Lock()
+        if artifact_pth is not None:
+            self.open_artifact(artifact_pth, interact_pth)
+        else:
+            self.build_state(interact_pth, articles_pth, chunksize, light_threshold)
+        self.futures=dict()
+        self.executor=None
+        self.build_lock=threading.Lock()
+        if startup == 'eager':
+            for name in list(self.builders):
+                self.build_component(name)
+        elif startup in ('parallel', 'background'):
+            self.executor=ThreadPoolExecutor(max_workers=max_workers)
+            for name in list(self.builders):
+                self.futures[name]=self.executor.submit(self.build_component, name)
+            if startup == 'parallel':
+                for future in self.futures.values():
+                    future.result()
+
+    def build_state(self, interact_pth, articles_pth, chunksize, light_threshold):
+        '''
+        Description: read the csv files, build the first ModelState and the builders of the other recommenders
+        '''
+        start=time.perf_counter()
+        dc=Data_Clean(interact_pth, articles_pth, chunksize=chunksize)
+        self.build_timings['data']=time.perf_counter()-start
+        self.user_map=dc.user_map
+        self.user_map_pth=dc.user_map_pth
+        start=time.perf_counter()
+        if dc.stream is None:
+            # one sparse user-item matrix shared by the recommenders
+            uim=UserItemMatrix.from_interactions(dc.interacts_clean)
+            popularity, train_uim, test_uim=None, None, None
+        else:
+            uim=dc.stream.user_item()
+            popularity=dc.stream.popularity(uim)
+            train_uim, test_uim=dc.stream.train_test()
+        # new / light / heavy segment of every user id
+        segments=UserSegments.from_counts(uim.user_ids, uim.user_counts, light_threshold)
+        self.build_timings['uim']=time.perf_counter()-start
+        # the rank based recommender is cheap and answers every request while the others build
+        start=time.perf_counter()
+        rbr=RBRecommender(dc.interacts_clean, popularity=popularity)
+        self.build_timings['rbr']=time.perf_counter()-start
+        model_id=fingerprint_id(uim, light_threshold)
+        self.state=ModelState(model_id=model_id, version=0, data_id=model_id, uim=uim, catalog=dc.catalog, segments=segments,
+                              rbr=rbr, components=dict())
+
+        self.builders={
+            'ucfr': lambda: UCFRecommender(dc.interacts_clean, uim=uim, catalog=dc.catalog),
+            'cbr': lambda: CBRecommender(dc.articles_clean,dc.interacts_clean,catalog=dc.catalog,uim=uim),
+            'mfr': lambda: MFRecommender(dc.articles_clean,dc.interacts_clean,train_uim=train_uim,test_uim=test_uim,
+                                         catalog=dc.catalog),
+        }
+
+    def open_artifact(self, artifact_pth, interact_pth):
+        '''
+        Description: the first ModelState and the builders of the other recommenders from a model artifact,
+                     the builders only wrap the memory mapped arrays so every startup mode is fast
+        '''
+        start=time.perf_counter()
+        artifact=ModelArtifact(artifact_pth)
+        # the same email -> user_id map Data_Clean uses for these interactions
+        self.user_map_pth=os.path.join(os.path.dirname(interact_pth), 'user_map.csv')
+        self.user_map=UserIdMap.load(self.user_map_pth)
+        uim=artifact.user_item()
+        catalog=artifact.catalog()
+        segments=artifact.segments()
+        self.build_timings['uim']=time.perf_counter()-start
+        start=time.perf_counter()
+        rbr=artifact.rbr(self.top_n)
+        self.build_timings['rbr']=time.perf_counter()-start
+        self.state=ModelState(model_id=artifact.model_id, version=artifact.version, data_id=artifact.data_id, uim=uim,
+                              catalog=catalog, segments=segments, rbr=rbr, components=dict())
+        self.builders={
+            'ucfr': lambda: artifact.ucfr(uim, catalog, self.top_n),
+            'cbr': lambda: artifact.cbr(uim, catalog, self.top_n),
+            'mfr': lambda: artifact.mfr(catalog, self.top_n),
+        }
+
+    def build_component(self, name):
+        '''
+        Description: build one of self.builders and record how long it took
+        '''
+        start=time.perf_counter()
+        component=self.builders[name]()
+        self.build_timings[name]=time.perf_counter()-start
+        with self.state_lock:
+            components=dict(self.state.components)
+            components[name]=component
+            self.state=self.state._replace(components=components)
+            built=all(builder in components for builder in self.builders)
+        if built:
+            self.release_builders()
+        return component
+
+    def release_builders(self):
+        '''
+        Description: once every recommender is built, shut the executor down and drop the builders,
+                     their closures hold the Data_Clean frames
+        '''
+        self.builders=dict()
+        self.futures=dict()
+        executor, self.executor=self.executor, None
+        if executor is not None:
+            # called from a worker thread too, which can not wait for itself
+            executor.shutdown(wait=False)
+
+    def component(self, name):
+        '''
+        Description: a built recommender, waiting for its background build or building it on first use
+        '''
+        component=self.state.components.get(name)
+        if component is not None:
+            return component
+        future=self.futures.get(name)
+        if future is not None:
+            return future.result()
+        with self.build_lock:
+            if name not in self.state.components:
+                self.build_component(name)
+        return self.state.components[name]
+
+    def serving(self, state, name):
+        '''
+        Description: the recommender of state that answers a request, None while its background build runs
+        '''
+        component=state.components.get(name)
+        if component is None and self.startup != 'background':
+            component=self.component(name)
+        return component
+
+    @property
+    def version(self):
+        return self.state.version
+
+    @property
+    def uim(self):
+        return self.state.uim
+
+    @property
+    def catalog(self):
+        return self.state.catalog
+
+    @property
+    def segments(self):
+        return self.state.segments
+
+    @property
+    def rbr(self):
+        return self.state.rbr
+
+    @property
+    def user_with_few_articles(self):
+        return self.state.segments.user_ids(LIGHT)
+
+    @property
+    def ucfr(self):
+        return self.component('ucfr')
+
+    @property
+    def cbr(self):
+        return self.component('cbr')
+
+    @property
+    def mfr(self):
+        return self.component('mfr')
 
-    def recommend_articles(self, user_id, top_n=10):
+    def recommend_articles(self, user_id, top_n=None):
         '''
         Description:
          Acording to users type:
            new user: RBRecommender
            old user and articles : UCFRecommender/MFRecommender
            user reading few articles: CBRecommender
+         While a background startup is still building the recommender a user needs, RBRecommender answers.
+         The whole request reads one ModelState, so it is not affected by a concurrent add_interactions.
+         Answers come from the precomputed table while it matches the model, then from the cache,
+         which reuses content answers until the user's interactions change and the others until
+         the next add_interactions.
         Args:
           user_id
+          top_n - number of recommendations, self.top_n when None
         Return:
           Recs: list of recommendations
         '''
-        if top_n != 10:
-            self.top_n = top_n
-        if user_id in self.cbr.users:
-            if user_id in self.user_with_few_articles:
-                recs=self.cbr.make_content_recs(user_id, self.top_n)
+        recs, _=self.recommend(user_id, top_n)
+        return recs
+
+    def recommend(self, user_id, top_n=None):
+        '''
+        Description: recommend_articles together with the strategy that answered
+        Return:
+          recs - list of recommendations
+          strategy - 'rank', 'ucf' or 'content'
+        '''
+        answer=self.recommend_answer(user_id, top_n)
+        return answer.recs, answer.strategy
+
+    def recommend_answer(self, user_id, top_n=None):
+        '''
+        Description: recommend together with the ids of the recommended articles
+        Return:
+          answer - Answer
+        '''
+        if self.profiler is not None and self.profiler.sample():
+            return self.profiler.run(self.answer, user_id, top_n, label='user{}'.format(user_id))
+        return self.answer(user_id, top_n)
+
+    def answer(self, user_id, top_n=None):
+        '''
+        Description: the work of recommend, counted and timed into self.metrics
+        '''
+        start=time.perf_counter()
+        top_n=self.top_n if top_n is None else top_n
+        state=self.state
+        answer, source=self.lookup(state, user_id, top_n)
+        stages=[('lookup', time.perf_counter()-start)]
+        complete=True
+        if answer is None:
+            route_start=time.perf_counter()
+            answer, complete=self.route(state, user_id, top_n, stages)
+            stages.append(('route', time.perf_counter()-route_start))
+            self.remember(state, user_id, top_n, answer, complete)
+            source='computed'
+        if self.metrics is not None:
+            self.record(state, user_id, source, answer.strategy, complete, stages, time.perf_counter()-start)
+        return Answer(list(answer.recs), answer.strategy, list(answer.article_ids))
+
+    def record(self, state, user_id, source, strategy, complete, stages, seconds):
+        '''
+        Description: count one request in self.metrics
+        Args:
+          source - 'precomputed', 'cache' or 'computed'
+          strategy - strategy of the answer
+          complete - False when route fell back because the recommender of the segment was still building
+          stages - list of (stage, seconds)
+          seconds - (float) latency of the whole request, None for the users of a batch
+        '''
+        metrics=self.metrics
+        metrics.inc('rec_requests_total', source=source, strategy=strategy)
+        segment=state.segments.segment(user_id)
+        if source == 'computed' and segment != NEW and strategy == 'rank':
+            # the content or collaborative answer was replaced by the rank based one, counted when it happened
+            # and not again on every cache hit
+            metrics.inc('rec_fallbacks_total', segment=SEGMENT_NAMES[segment], reason='empty' if complete else 'building')
+        for stage, stage_seconds in stages:
+            metrics.observe('rec_stage_seconds', stage_seconds, stage=stage)
+        if seconds is not None:
+            metrics.observe('rec_request_seconds', seconds, strategy=strategy)
+
+    def recommend_many(self, user_ids, top_n=None):
+        '''
+        Description:
+         recommend for many users at once from one ModelState, the users of the collaborative filtering
+         segment are scored together by UCFRecommender.recommend_many
+        Args:
+          user_ids - list of user ids
+          top_n - number of recommendations, self.top_n when None
+        Return:
+          answers - dict user id -> Answer like recommend_answer
+        '''
+        start=time.perf_counter()
+        top_n=self.top_n if top_n is None else top_n
+        state=self.state
+        answers=dict()
+        # user id -> (source, complete, stages) for the metrics
+        sources=dict()
+        heavy=[]
+        for user_id in dict.fromkeys(user_ids):
+            answer, source=self.lookup(state, user_id, top_n)
+            if answer is not None:
+                answers[user_id]=Answer(list(answer.recs), answer.strategy, list(answer.article_ids))
+                sources[user_id]=(source, True, [])
+            elif state.segments.segment(user_id) == HEAVY and self.serving(state, 'ucfr') is not None:
+                heavy.append(user_id)
+            else:
+                stages=[]
+                answer, complete=self.route(state, user_id, top_n, stages)
+                self.remember(state, user_id, top_n, answer, complete)
+                answers[user_id]=answer
+                sources[user_id]=('computed', complete, stages)
+        if len(heavy) > 0:
+            ucf_recs=state.components['ucfr'].recommend_many(heavy, top_n)
+            for user_id in heavy:
+                rec_ids, recs=ucf_recs[user_id]
+                answer=Answer(recs, 'ucf', rec_ids)
+                stages=[]
                 if len(recs) == 0:
-                    recs=self.rbr.get_top_articles()
+                    fallback_start=time.perf_counter()
+                    answer=self.rank_answer(state, top_n)
+                    stages.append(('fallback', time.perf_counter()-fallback_start))
+                self.remember(state, user_id, top_n, answer, True)
+                answers[user_id]=answer
+                sources[user_id]=('computed', True, stages)
+        if self.metrics is not None:
+            for user_id, (source, complete, stages) in sources.items():
+                self.record(state, user_id, source, answers[user_id].strategy, complete, stages, None)
+            self.metrics.observe('rec_stage_seconds', time.perf_counter()-start, stage='batch')
+        return answers
+
+    def lookup(self, state, user_id, top_n):
+        '''
+        Description: the answer of the precomputed table or of the cache
+        Return:
+          answer - Answer, None when neither has one
+          source - 'precomputed' or 'cache', where the answer came from
+        '''
+        if self.precomputed is not None and state.version == 0 and self.precomputed.model_id == state.model_id:
+            answer=self.precomputed.recommend_answer(user_id, top_n)
+            if answer is not None:
+                return Answer(*answer), 'precomputed'
+        if self.cache is None:
+            return None, None
+        return self.cache.get(self.cache_key(state, user_id, top_n)), 'cache'
+
+    def remember(self, state, user_id, top_n, answer, complete):
+        '''
+        Description: cache an answer of route, the stand-in answers of a background startup are not kept
+        '''
+        if self.cache is None or not complete:
+            return
+        if state.segments.segment(user_id) == LIGHT and answer.strategy == 'rank':
+            # the rank fallback of a light user changes with the model, not with the user's version
+            return
+        self.cache.set(self.cache_key(state, user_id, top_n), answer)
+
+    def cache_key(self, state, user_id, top_n):
+        '''
+        Description: cache key of a request. Content answers only change with the user's own interactions,
+                     rank and collaborative answers can change with every published version. Both are keyed
+                     by the data they come from, not by a version of this process, as the cache can be shared
+                     with processes that applied other batches.
+        '''
+        if state.segments.segment(user_id) == LIGHT:
+            article_ids=state.uim.user_article_ids(user_id, in_seen_order=True)
+            version=hashlib.sha1(np.ascontiguousarray(article_ids, dtype='float').tobytes()).hexdigest()[:16]
+        else:
+            version=state.data_id
+        return self.cache.make_key(user_id, top_n, state.model_id, version)
+
+    def route(self, state, user_id, top_n, stages=None):
+        '''
+        Description: answer one request from state with the recommender of the user's segment
+        Args:
+          stages - optional list, (stage, seconds) of the recommender calls are appended to it: 'content',
+                   'ucf', 'rank' for new users and 'fallback' when the rank based answer replaced another one
+        Return:
+          answer - Answer, its strategy is 'rank', 'ucf' or 'content', the recommender that answered
+          complete - False when the recommender of the segment was still building and RBRecommender answered
+        '''
+        segment=state.segments.segment(user_id)
+        answer=None
+        complete=True
+        start=time.perf_counter()
+        if segment == LIGHT:
+            cbr=self.serving(state, 'cbr')
+            if cbr is not None:
+                rec_ids, recs=cbr.content_recs(user_id, top_n)
+                answer=Answer(recs, 'content', rec_ids)
             else:
-                _, recs=self.ucfr.user_advance_recs(user_id, self.top_n)
+                complete=False
+        elif segment == HEAVY:
+            ucfr=self.serving(state, 'ucfr')
+            if ucfr is not None:
+                rec_ids, recs=ucfr.user_advance_recs(user_id, top_n)
+                answer=Answer(recs, 'ucf', rec_ids)
+            else:
+                complete=False
+        if answer is not None and stages is not None:
+            stages.append((answer.strategy, time.perf_counter()-start))
+        if answer is None or len(answer.recs) == 0:
+            start=time.perf_counter()
+            answer=self.rank_answer(state, top_n)
+            if stages is not None:
+                stages.append(('rank' if segment == NEW else 'fallback', time.perf_counter()-start))
+        return answer, complete
+
+    def rank_answer(self, state, top_n):
+        '''
+        Description: the rank based answer of state, the same for every user
+        '''
+        rec_ids=[float(aid) for aid in state.rbr.get_top_article_ids(top_n)]
+        return Answer(state.rbr.get_top_articles(top_n), 'rank', rec_ids)
+
+    def add_interactions(self, batch):
+        '''
+        Description:
+         Add new interactions without rebuilding the recommenders. The user-item rows, the popularity
+         counts, the users with few articles and the neighbor lists of the touched users are updated;
+         the content similarity and the MF curve are left as they are.
+         A new ModelState is built next to the current one and swapped in with a single assignment, so
+         recommend_articles keeps answering from the previous state while an update runs.
+        Args:
+          batch - pandas dataframe or list of dicts with article_id, title and user_id or email;
+                  title can be left out for articles that are already known
+        Return:
+          n_added - (int) number of new user/article interactions, repeated ones are not counted again
+        '''
+        if self.metrics is not None:
+            with self.metrics.timer('add_interactions'):
+                return self.apply_interactions(batch)
+        return self.apply_interactions(batch)
+
+    def apply_interactions(self, batch):
+        '''
+        Description: the work of add_interactions
+        '''
+        with self.write_lock:
+            # the recommenders to refresh have to exist first
+            self.component('ucfr')
+            self.component('cbr')
+            state=self.state
+            ucfr, cbr=state.components['ucfr'], state.components['cbr']
+            batch=self.prepare_batch(batch, state)
+            # like Data_Clean.remove_duplicated, an interaction a user already had counts once
+            is_new=~state.uim.contains_pairs(batch['user_id'].values, batch['article_id'].values)
+            batch=batch[is_new].drop_duplicates(subset=['user_id','article_id'])
+            if len(batch) == 0:
+                return 0
+            uim=state.uim.add_pairs(batch['user_id'].values, batch['article_id'].values)
+            catalog=state.catalog.extend(batch)
+            touched=np.unique(batch['user_id'].values)
+            version=state.version+1
+            segments=state.segments.update(touched, uim.user_counts[[uim.user_row(uid) for uid in touched.tolist()]], version)
+            rbr=state.rbr.refresh_interactions(batch)
+            ucfr=ucfr.refresh_neighbors(uim, touched, catalog)
+            cbr=cbr.refresh_interactions(uim, catalog)
+            data_id=fingerprint_id(uim, segments.light_threshold)
+            with self.state_lock:
+                components=dict(self.state.components)
+                components.update(ucfr=ucfr, cbr=cbr)
+                self.state=ModelState(model_id=state.model_id, version=version, data_id=data_id, uim=uim, catalog=catalog,
+                                      segments=segments, rbr=rbr, components=components)
+            return len(batch)
+
+    def prepare_batch(self, batch, state):
+        '''
+        Description: check a batch of new interactions and encode it like Data_Clean does, raise ValueError when
+                     an article id is missing or not a number or a user id is not one the user map gave out
+        Args:
+          batch - pandas dataframe or list of dicts with article_id, title and user_id or email
+          state - (ModelState) the published state the batch is added to
+        Return:
+          batch - dataframe with article_id (float), title and user_id (int) columns
+        '''
+        batch=pd.DataFrame(batch)
+        if 'article_id' not in batch.columns:
+            raise ValueError("Interactions need an article_id")
+        # a missing or non numeric article id would become a NaN column of the matrix
+        article_ids=pd.to_numeric(batch['article_id'], errors='coerce').values.astype('float')
+        invalid=~np.isfinite(article_ids)
+        if invalid.any():
+            raise ValueError("Article ids must be numbers: {}".format(batch['article_id'][invalid].tolist()[:10]))
+        if 'user_id' in batch.columns:
+            user_ids=self.parse_user_ids(batch['user_id'], state)
+        elif 'email' in batch.columns:
+            user_ids=self.user_map.encode(batch['email'])
+            if self.user_map.changed:
+                self.user_map.save(self.user_map_pth)
         else:
-            recs=self.rbr.get_top_articles()
-        return recs
+            raise ValueError("Interactions need a user_id or an email")
+        if 'title' in batch.columns:
+            titles=batch['title'].values.astype('object')
+        else:
+            titles=np.full(len(batch), None, dtype='object')
+        # missing titles come from the catalog
+        missing=pd.isnull(titles)
+        titles[missing]=[state.catalog.title(aid) for aid in article_ids[missing].tolist()]
+        if pd.isnull(titles).any():
+            raise ValueError("Unknown article ids need a title: {}".format(sorted(set(article_ids[pd.isnull(titles)].tolist()))))
+        return pd.DataFrame({'article_id':article_ids, 'title':titles, 'user_id':user_ids})
+
+    def parse_user_ids(self, values, state):
+        '''
+        Description: user ids of a batch as int64, raise ValueError when one is not an integer between 1 and
+                     the largest id given out so far
+        Args:
+          values - pandas series of user ids
+          state - (ModelState) the published state the batch is added to
+        Return:
+          user_ids - np array of int64
+        '''
+        numbers=pd.to_numeric(values, errors='coerce').values.astype('float')
+        invalid=~np.isfinite(numbers) | (numbers != np.round(numbers))
+        if invalid.any():
+            raise ValueError("User ids must be integers: {}".format(values[invalid].tolist()[:10]))
+        # the segment table is indexed by user id, new users get their id from the user map by email
+        max_user_id=max(self.user_map.next_id-1, int(state.uim.user_ids.max()) if len(state.uim.user_ids) > 0 else 0)
+        invalid=(numbers < 1) | (numbers > max_user_id)
+        if invalid.any():
+            raise ValueError("User ids must be between 1 and {}, new users are added by email: {}".format(
+                max_user_id, values[invalid].tolist()[:10]))
+        return numbers.astype(np.int64)
 
     def mf_calculate_error(self):
         return self.mfr.calculate_error()
@@ -54,8 +581,10 @@ class Recommender():
         self.mfr.draw_curve(latent_factors_num,test_accuracy,train_accuracy)
     '''
 if __name__ == '__main__':
+    # run from the web_app directory: python -m recommendation.recommender
 
     rec=Recommender()
+    print(rec.build_timings)
 
     # Quick spot check just use it to test your functions
     # normal users
@@ -0,0 +1,107 @@
+import numbers
+import numpy as np
+
+# user segments, they decide which recommender answers a user
+NEW = 0     # no interactions, rank based
+LIGHT = 1   # fewer than light_threshold articles, content based
+HEAVY = 2   # collaborative filtering
+SEGMENT_NAMES = ('new', 'light', 'heavy')
+
+class UserSegments():
+    '''
+    Class: Segment of every user, stored in an array indexed by user id
+    User ids are small consecutive integers (see UserIdMap), so the lookup of a request is a single
+    array read. Users that are not in the table are new.
+    Next to the segment, the table keeps the model version at which the interactions of each user
+    last changed, the result cache keys content answers on it.
+    '''
+    def __init__(self, table, light_threshold=3, versions=None):
+        '''
+        Description: initiate UserSegments from an already built table, use from_counts to build one
+        Args:
+         table - np array of int8, segment per user id
+         light_threshold - (int) users with fewer articles than this are light
+         versions - np array of int64, version per user id, all 0 when None
+        Return:
+         N/A
+        '''
+        self.table = table
+        self.light_threshold = light_threshold
+        self.versions = versions if versions is not None else np.zeros(len(table), dtype=np.int64)
+
+    @classmethod
+    def from_counts(cls, user_ids, user_counts, light_threshold=3):
+        '''
+        Description: build the table from the number of articles of every user
+        Args:
+         user_ids - np array of int user ids
+         user_counts - np array, number of articles per user id
+         light_threshold - (int) users with fewer articles than this are light
+        Return:
+         UserSegments
+        '''
+        size = int(np.max(user_ids)) + 1 if len(user_ids) > 0 else 0
+        table = np.full(size, NEW, dtype=np.int8)
+        segments = cls(table, light_threshold)
+        table[np.asarray(user_ids, dtype=np.int64)] = segments.classify(user_counts)
+        return segments
+
+    def classify(self, user_counts):
+        '''
+        Description: segment of users with the given numbers of articles
+        '''
+        user_counts = np.asarray(user_counts)
+        return np.where(user_counts == 0, NEW, np.where(user_counts < self.light_threshold, LIGHT, HEAVY)).astype(np.int8)
+
+    def contains(self, user_id):
+        '''
+        Description: True when user_id is a valid position of the table
+        '''
+        return isinstance(user_id, numbers.Integral) and 0 <= user_id < len(self.table)
+
+    def segment(self, user_id):
+        '''
+        Description: segment of one user id, NEW for unknown ids
+        '''
+        return int(self.table[user_id]) if self.contains(user_id) else NEW
+
+    def version(self, user_id):
+        '''
+        Description: model version at which the interactions of user_id last changed, 0 for unknown ids
+        '''
+        return int(self.versions[user_id]) if self.contains(user_id) else 0
+
+    def user_ids(self, segment):
+        '''
+        Description: sorted user ids of one segment (NEW only lists the unused ids below the largest one)
+        '''
+        return np.flatnonzero(self.table == segment)
+
+    def update(self, user_ids, user_counts, version=0):
+        '''
+        Description: a new table with the segments of user_ids set from their new counts, this one is left as is
+        Args:
+         user_ids - np array of int user ids whose number of articles changed
+         user_counts - np array, their new number of articles
+         version - (int) model version of the change
+        Return:
+         UserSegments
+        '''
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if len(user_ids) > 0 and user_ids.min() < 0:
+            raise ValueError("User ids can not be negative")
+        size = max(len(self.table), int(np.max(user_ids)) + 1 if len(user_ids) > 0 else 0)
+        table = np.full(size, NEW, dtype=np.int8)
+        table[:len(self.table)] = self.table
+        table[user_ids] = self.classify(user_counts)
+        versions = np.zeros(size, dtype=np.int64)
+        versions[:len(self.versions)] = self.versions
+        versions[user_ids] = version
+        return UserSegments(table, self.light_threshold, versions)
+
+    def counts(self):
+        '''
+        Description: number of users per segment name, new users that never interacted are not counted
+        '''
+        sizes = np.bincount(self.table, minlength=len(SEGMENT_NAMES))
+        return {name: int(sizes[segment]) for segment, name in enumerate(SEGMENT_NAMES) if segment != NEW}
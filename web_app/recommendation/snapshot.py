@@ -0,0 +1,174 @@
+import os
+import json
+import shutil
+import argparse
+import pandas as pd
+import numpy as np
+
+# Columnar binary snapshot of the cleaned Data_Clean frames.
+# Every column is stored in its own .npy file so it can be memory mapped:
+#  numeric  - the column values
+#  string   - utf-8 bytes of all values, offsets into them and a null mask
+#  category - int32 codes and the categories as a string column
+SNAPSHOT_FORMAT = 1
+META_FILE = 'meta.json'
+
+def source_stats(paths):
+    '''
+    Description: absolute path, size and modification time of the source files
+    '''
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append({'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime})
+    return stats
+
+def is_fresh(snapshot_pth, sources):
+    '''
+    Description: True when snapshot_pth holds a snapshot of exactly these source files written after they last changed
+    Args:
+     snapshot_pth - snapshot directory
+     sources - list of csv paths the snapshot was compiled from
+    Return:
+     fresh - bool
+    '''
+    meta_pth = os.path.join(snapshot_pth, META_FILE)
+    if not os.path.exists(meta_pth) or not all(os.path.exists(path) for path in sources):
+        return False
+    with open(meta_pth) as f:
+        meta = json.load(f)
+    if meta.get('format') != SNAPSHOT_FORMAT:
+        return False
+    recorded = meta['sources']
+    current = source_stats(sources)
+    if [s['path'] for s in recorded] != [s['path'] for s in current]:
+        return False
+    snapshot_mtime = os.stat(meta_pth).st_mtime
+    return all(r['size'] == c['size'] and c['mtime'] <= snapshot_mtime for r, c in zip(recorded, current))
+
+def write_strings(prefix, values):
+    '''
+    Description: write an array of strings as utf-8 bytes, offsets and nulls, missing values stay missing
+    Args:
+     prefix - path of the files without the .bytes.npy / .offsets.npy / .nulls.npy suffix
+     values - np array or list of strings, NaN or None for missing values
+    Return:
+     N/A
+    '''
+    nulls = pd.isnull(values)
+    encoded = [b'' if null else str(value).encode('utf-8') for value, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    np.save(prefix + '.bytes.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(prefix + '.offsets.npy', offsets)
+    np.save(prefix + '.nulls.npy', np.asarray(nulls, dtype=bool))
+
+def read_strings(prefix):
+    '''
+    Description: the strings written by write_strings, np array of object with NaN for missing values
+    '''
+    data = np.load(prefix + '.bytes.npy', mmap_mode='r')
+    offsets = np.load(prefix + '.offsets.npy')
+    nulls = np.load(prefix + '.nulls.npy')
+    raw = data.tobytes()
+    values = np.empty(len(nulls), dtype=object)
+    for i in range(len(nulls)):
+        values[i] = np.nan if nulls[i] else raw[offsets[i]:offsets[i + 1]].decode('utf-8')
+    return values
+
+def _write_frame(snapshot_pth, name, df, categorical=()):
+    '''
+    Description: write every column of df, return the column description kept in the meta file
+    '''
+    columns = []
+    np.save(os.path.join(snapshot_pth, '{}.index.npy'.format(name)), df.index.values)
+    for i, column in enumerate(df.columns):
+        prefix = os.path.join(snapshot_pth, '{}.{}'.format(name, i))
+        values = df[column]
+        if column in categorical:
+            codes, categories = pd.factorize(values)
+            np.save(prefix + '.codes.npy', codes.astype(np.int32))
+            write_strings(prefix + '.categories', np.asarray(categories, dtype=object))
+            kind = 'category'
+        elif pd.api.types.is_numeric_dtype(values):
+            np.save(prefix + '.npy', values.values)
+            kind = 'numeric'
+        else:
+            write_strings(prefix, np.asarray(values, dtype=object))
+            kind = 'string'
+        columns.append({'name': column, 'kind': kind})
+    return columns
+
+def _read_frame(snapshot_pth, name, columns):
+    data = dict()
+    for i, column in enumerate(columns):
+        prefix = os.path.join(snapshot_pth, '{}.{}'.format(name, i))
+        if column['kind'] == 'category':
+            codes = np.load(prefix + '.codes.npy', mmap_mode='r')
+            categories = read_strings(prefix + '.categories')
+            # the category objects are shared by every row, -1 codes are missing values
+            values = np.append(categories, np.nan)[codes]
+        elif column['kind'] == 'string':
+            values = read_strings(prefix)
+        else:
+            values = np.load(prefix + '.npy', mmap_mode='r')
+        data[column['name']] = values
+    index = np.load(os.path.join(snapshot_pth, '{}.index.npy'.format(name)))
+    return pd.DataFrame(data, index=index, columns=[column['name'] for column in columns])
+
+def write_snapshot(snapshot_pth, sources, interacts, articles, interacts_clean, articles_clean):
+    '''
+    Description: write the encoded interactions and articles and the rows kept by the cleaning
+    Args:
+     snapshot_pth - snapshot directory, replaced when it exists
+     sources - list of csv paths the frames were read from
+     interacts, articles - Data_Clean frames before removing duplicates
+     interacts_clean, articles_clean - Data_Clean frames after removing duplicates
+    Return:
+     N/A
+    '''
+    tmp_pth = snapshot_pth.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_pth, ignore_errors=True)
+    os.makedirs(tmp_pth)
+    meta = {'format': SNAPSHOT_FORMAT, 'sources': source_stats(sources), 'frames': dict()}
+    meta['frames']['interacts'] = _write_frame(tmp_pth, 'interacts', interacts, categorical=('title',))
+    meta['frames']['articles'] = _write_frame(tmp_pth, 'articles', articles)
+    np.save(os.path.join(tmp_pth, 'interacts_clean.rows.npy'), interacts.index.get_indexer(interacts_clean.index))
+    np.save(os.path.join(tmp_pth, 'articles_clean.rows.npy'), articles.index.get_indexer(articles_clean.index))
+    # the meta file is written last, a snapshot without it is never used
+    with open(os.path.join(tmp_pth, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(snapshot_pth, ignore_errors=True)
+    os.rename(tmp_pth, snapshot_pth)
+
+def read_snapshot(snapshot_pth):
+    '''
+    Description: load a snapshot written by write_snapshot
+    Args:
+     snapshot_pth - snapshot directory
+    Return:
+     interacts, articles, interacts_clean, articles_clean - dataframes
+    '''
+    with open(os.path.join(snapshot_pth, META_FILE)) as f:
+        meta = json.load(f)
+    interacts = _read_frame(snapshot_pth, 'interacts', meta['frames']['interacts'])
+    articles = _read_frame(snapshot_pth, 'articles', meta['frames']['articles'])
+    interacts_clean = interacts.iloc[np.load(os.path.join(snapshot_pth, 'interacts_clean.rows.npy'))]
+    articles_clean = articles.iloc[np.load(os.path.join(snapshot_pth, 'articles_clean.rows.npy'))]
+    return interacts, articles, interacts_clean, articles_clean
+
+def main():
+    from recommendation.data_clean import Data_Clean
+
+    parser = argparse.ArgumentParser(description='Compile the interaction and article csv files into a binary snapshot')
+    parser.add_argument('--interact-pth', default='data/user-item-interactions.csv')
+    parser.add_argument('--articles-pth', default='data/articles_community.csv')
+    parser.add_argument('--snapshot-pth', default=None, help='defaults to a snapshot directory next to the interactions csv')
+    args = parser.parse_args()
+
+    dc = Data_Clean(args.interact_pth, args.articles_pth, snapshot_pth=args.snapshot_pth, use_snapshot=False)
+    dc.compile()
+    print('Snapshot written to {}'.format(dc.snapshot_pth))
+
+if __name__ == '__main__':
+    main()
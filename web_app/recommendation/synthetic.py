@@ -0,0 +1,142 @@
+import os
+import hashlib
+import argparse
+import pandas as pd
+import numpy as np
+
+# Synthetic data with the schema of the IBM Watson Studio files, so every part of the project can run
+# and be measured offline at any size:
+#  user-item-interactions.csv - index, article_id (float), title, email (sha1 hex, a few missing)
+#  articles_community.csv     - index, doc_body, doc_description, doc_full_name, doc_status, article_id
+# The defaults are the size of the IBM data. Article popularity and user activity follow power laws, every
+# article and user has a topic, and users read mostly articles of their topic, whose texts share words, so
+# the collaborative and content based recommenders have something to find.
+IBM_SIZE = {'n_users': 5149, 'n_articles': 1328, 'n_content': 1051, 'n_interactions': 45993}
+INTERACTIONS_FILE = 'user-item-interactions.csv'
+ARTICLES_FILE = 'articles_community.csv'
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'vo', 'shi', 'den', 'gra', 'pel', 'tor', 'qua', 'zen', 'bis', 'fu')
+
+def vocabulary(size, rng):
+    '''
+    Description: size distinct made up words of two to four syllables
+    '''
+    words = set()
+    while len(words) < size:
+        n = rng.integers(2, 5)
+        words.add(''.join(SYLLABLES[i] for i in rng.integers(0, len(SYLLABLES), n)))
+    return np.array(sorted(words), dtype=object)
+
+def power_law(n, exponent, rng):
+    '''
+    Description: weights of n items following a power law of their (shuffled) rank, summing to 1
+    '''
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+def texts(topics, n_words, words, topic_words, topic_share, rng):
+    '''
+    Description: one text of n_words per topic, topic_share of the words come from the topic's own words
+    '''
+    own = rng.random((len(topics), n_words)) < topic_share
+    codes = rng.integers(0, len(words), (len(topics), n_words))
+    own_codes = topic_words[topics[:, None], rng.integers(0, topic_words.shape[1], (len(topics), n_words))]
+    codes[own] = own_codes[own]
+    return [' '.join(row) for row in words[codes].tolist()]
+
+def generate(n_users=5149, n_articles=1328, n_content=1051, n_interactions=45993, n_topics=20,
+             popularity_exponent=1.0, activity_exponent=1.1, topic_affinity=0.7, missing_emails=0.0005,
+             duplicated_articles=5, body_words=120, seed=0):
+    '''
+    Description: synthetic interactions and articles frames
+    Args:
+     n_users - (int) number of users (emails), each one has at least one interaction when n_interactions allows
+     n_articles - (int) number of article ids
+     n_content - (int) article ids 0 .. n_content-1 have a row in the articles frame, like the IBM data
+                 the others are only known from the interactions
+     n_interactions - (int) number of interaction rows, repeated reads of an article included
+     n_topics - (int) number of topics of articles and users
+     popularity_exponent, activity_exponent - power law exponents of article popularity and user activity
+     topic_affinity - share of the reads of a user that go to articles of the user's topic
+     missing_emails - share of interactions without an email
+     duplicated_articles - (int) articles whose row is repeated in the articles frame
+     body_words - (int) words of a doc_body
+     seed - (int) seed of the random generator, the same arguments always give the same frames
+    Return:
+     interacts - dataframe with article_id, title, email columns
+     articles - dataframe with doc_body, doc_description, doc_full_name, doc_status, article_id columns
+    '''
+    rng = np.random.default_rng(seed)
+    words = vocabulary(max(200, 50 * n_topics), rng)
+    topic_words = rng.integers(0, len(words), (n_topics, 30))
+    article_topics = rng.integers(0, n_topics, n_articles)
+    user_topics = rng.integers(0, n_topics, n_users)
+
+    # interactions: users by activity, articles by popularity, mostly within the user's topic
+    popularity = power_law(n_articles, popularity_exponent, rng)
+    users = rng.choice(n_users, size=n_interactions, p=power_law(n_users, activity_exponent, rng))
+    # like the IBM data every user read at least one article
+    users[rng.permutation(n_interactions)[:n_users]] = rng.permutation(n_users)[:n_interactions]
+    articles_read = rng.choice(n_articles, size=n_interactions, p=popularity)
+    in_topic = rng.random(n_interactions) < topic_affinity
+    for topic in range(n_topics):
+        candidates = np.flatnonzero(article_topics == topic)
+        rows = np.flatnonzero(in_topic & (user_topics[users] == topic))
+        if len(candidates) > 0 and len(rows) > 0:
+            weights = popularity[candidates] / popularity[candidates].sum()
+            articles_read[rows] = rng.choice(candidates, size=len(rows), p=weights)
+
+    names = texts(article_topics, 5, words, topic_words, 0.6, rng)
+    full_names = [name.title() for name in names]
+    emails = np.array([hashlib.sha1('{}-{}'.format(seed, user).encode()).hexdigest() for user in range(n_users)], dtype=object)
+    email_column = emails[users]
+    email_column[rng.random(n_interactions) < missing_emails] = np.nan
+    interacts = pd.DataFrame({'article_id': articles_read.astype('float'),
+                              'title': np.array(names, dtype=object)[articles_read],
+                              'email': email_column})
+
+    content_topics = article_topics[:n_content]
+    articles = pd.DataFrame({'doc_body': texts(content_topics, body_words, words, topic_words, 0.5, rng),
+                             'doc_description': texts(content_topics, 15, words, topic_words, 0.5, rng),
+                             'doc_full_name': full_names[:n_content],
+                             'doc_status': 'Live',
+                             'article_id': np.arange(n_content)})
+    if duplicated_articles > 0 and n_content > 0:
+        repeated = articles.iloc[rng.choice(n_content, size=duplicated_articles)]
+        articles = pd.concat([articles, repeated], ignore_index=True)
+    return interacts, articles
+
+def write_dataset(out_dir, scale=1, seed=0, **kwargs):
+    '''
+    Description: write a synthetic dataset the size of the IBM data times scale
+    Args:
+     out_dir - directory of the two csv files
+     scale - (float) multiplies the number of users, articles and interactions
+     seed - (int) seed of the random generator
+     kwargs - other arguments of generate, they override the scaled sizes
+    Return:
+     interact_pth, articles_pth - paths of the written csv files
+    '''
+    sizes = {key: max(1, int(round(value * scale))) for key, value in IBM_SIZE.items()}
+    sizes.update(kwargs)
+    interacts, articles = generate(seed=seed, **sizes)
+    os.makedirs(out_dir, exist_ok=True)
+    interact_pth = os.path.join(out_dir, INTERACTIONS_FILE)
+    articles_pth = os.path.join(out_dir, ARTICLES_FILE)
+    # the unnamed index column is part of the schema, Data_Clean drops it
+    interacts.to_csv(interact_pth)
+    articles.to_csv(articles_pth)
+    return interact_pth, articles_pth
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic dataset with the schema of the IBM interaction and article files')
+    parser.add_argument('--out-dir', default='data/synthetic')
+    parser.add_argument('--scale', type=float, default=1, help='size relative to the IBM data')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    interact_pth, articles_pth = write_dataset(args.out_dir, args.scale, args.seed)
+    print('Synthetic dataset written to {} and {}'.format(interact_pth, articles_pth))
+
+if __name__ == '__main__':
+    main()
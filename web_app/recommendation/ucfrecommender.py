@@ -1,14 +1,58 @@
+import copy
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from recommendation.useritem import UserItemMatrix
+from recommendation.neighbors import NeighborIndex
+from recommendation.catalog import ArticleCatalog
+
+# neighbors scored together in one product, each one gets its own power of two weight
+# so it has to stay below the 53 bits of a float64 mantissa
+RANK_BITS = 50
 
 class UCFRecommender():
     '''
     Class: User Based Collaborative Filtering Recommendations
     '''
-    def __init__(self, df, top_n=10):
+    def __init__(self, df, top_n=10, uim=None, n_neighbors=50, catalog=None, neighbors=None):
+        '''
+        Args:
+         neighbors - NeighborIndex of uim used instead of building one, e.g. read from a model artifact
+        '''
         self.top_n = top_n
         self.df=df
-        self.user_item=self.create_user_item_matrix()
+        # article id <-> title lookup, normally the one built by Data_Clean
+        self.catalog=catalog if catalog is not None else ArticleCatalog.from_interactions(self.df)
+        # sparse user-item store, it can be shared with the other recommenders
+        self.uim=uim if uim is not None else UserItemMatrix.from_interactions(self.df.drop_duplicates())
+        self._user_item=None
+        # offline top-K neighbor lists used by user_advance_recs
+        self.neighbors=neighbors if neighbors is not None else NeighborIndex.build(self.uim, k=n_neighbors)
+        self.article_rank=self.create_article_rank()
+
+    def create_article_rank(self, uim=None):
+        '''
+        Description:
+        rank of every article column by number of interactions, 0 is the most read article
+        Args:
+        uim - (UserItemMatrix) matrix to rank, self.uim when None
+        Return:
+        article_rank - (np array) one rank per column of uim
+        '''
+        uim=uim if uim is not None else self.uim
+        order=np.argsort(-uim.article_counts, kind='stable')
+        article_rank=np.empty(len(order), dtype=np.int64)
+        article_rank[order]=np.arange(len(order))
+        return article_rank
+
+    @property
+    def user_item(self):
+        '''
+        Description: dense dataframe view of the user-item matrix, built the first time it is asked for
+        '''
+        if self._user_item is None:
+            self._user_item=self.create_user_item_matrix()
+        return self._user_item
 
     '''
     1. Use the function below to reformat the df dataframe to be shaped with users as the rows and articles as the columns.
@@ -29,13 +73,8 @@ class UCFRecommender():
         OUTPUT:
         self.user_item - user item matrix
         '''
-        # Fill in the function here
-        # drop duplicate row and count interact
-        user_item=self.df.drop_duplicates().groupby(['user_id','article_id']).size().unstack(level=1)
-        # fill Null to 0
-        user_item=user_item.fillna(0)
-        # conver float to int
-        user_item=user_item.astype('int')
+        # the sparse store already holds the 1's, only expand it into a dataframe
+        user_item=self.uim.to_frame()
         return user_item # return the user_item matrix
 
     def find_similar_users(self, user_id):
@@ -46,7 +85,7 @@ class UCFRecommender():
 
         Args:
         user_id - (int) a user_id
-        self.user_item - (pandas dataframe) matrix of users by articles:
+        self.uim - (UserItemMatrix) sparse matrix of users by articles:
                     1's when a user has interacted with an article, 0 otherwise
 
         Return:
@@ -54,25 +93,41 @@ class UCFRecommender():
                         are listed first
         '''
         # compute similarity of each user to the provided user
-        user_sim=self.user_item.loc[user_id,:].dot(self.user_item.T)
+        user_sim=self.user_similarity(user_id)
         # sort by similarity
-        user_sim=user_sim.sort_values(ascending=False)
+        order=np.argsort(-user_sim, kind='stable')
 
         # remove the own user's id and return user list
-        most_similar_users=user_sim.loc[~(user_sim.index==user_id)].index.values.tolist()
+        most_similar_users=self.uim.user_ids[order]
+        most_similar_users=most_similar_users[most_similar_users!=user_id].tolist()
         return most_similar_users # return a list of the users in order from most to least similar
 
+    def user_similarity(self, user_id):
+        '''
+        Description:
+        dot product of the user row against every user row of the sparse matrix
+
+        Args:
+        user_id - (int) a user_id
+
+        Return:
+        user_sim - (np array) similarity of every user, in uim.user_ids order
+        '''
+        row=self.uim.user_row(user_id)
+        user_sim=self.uim.csr.dot(self.uim.csr[row].T).toarray().ravel()
+        return user_sim
+
     def get_article_names(self, article_ids):
         '''
         INPUT:
         article_ids - (list) a list of article ids
-        self.df - (pandas dataframe) df as defined at the top of the notebook
+        self.catalog - (ArticleCatalog) article id -> title lookup
 
         OUTPUT:
         article_names - (list) a list of article names associated with the list of article ids
-                        (this is identified by the title column)
+                        (this is identified by the title column), in the order of article_ids
         '''
-        article_names=self.df.drop_duplicates().loc[self.df['article_id'].isin(article_ids),'title'].unique().tolist()
+        article_names=self.catalog.get_article_names(article_ids)
         return article_names # Return the article names associated with list of article ids
 
 
@@ -80,7 +135,7 @@ class UCFRecommender():
         '''
         INPUT:
         user_id - (int) a user id
-        self.user_item - (pandas dataframe) matrix of users by articles:
+        self.uim - (UserItemMatrix) sparse matrix of users by articles:
                     1's when a user has interacted with an article, 0 otherwise
 
         OUTPUT:
@@ -92,13 +147,12 @@ class UCFRecommender():
         Provides a list of the article_ids and article titles that have been seen by a user
         '''
         # Your code here
-        a_user_items=self.user_item.loc[user_id,:]
-        article_ids=a_user_items[a_user_items==1].index.values.astype('str').tolist()
+        article_ids=self.uim.user_article_ids(user_id).astype('str').tolist()
         article_names=self.get_article_names(article_ids)
         return article_ids, article_names # return the ids and names
 
 
-    def user_recs(self, user_id, top_n=10):
+    def user_recs(self, user_id, top_n=None):
         '''
         Description:
         Loops through the users based on closeness to the input user_id
@@ -111,13 +165,12 @@ class UCFRecommender():
 
         Args:
         user_id - (int) a user id
-        top_n - (int) the number of recommendations you want for the user
+        top_n - (int) the number of recommendations you want for the user, self.top_n when None
 
         Return:
         recs - (list) a list of recommendations for the user
         '''
-        if top_n != 10:
-            self.top_n = top_n
+        top_n = self.top_n if top_n is None else top_n
 
         # define variable:
         closeness_user_ids=[]
@@ -135,9 +188,9 @@ class UCFRecommender():
             closeness_user_reading_ids,_=self.get_user_articles(u_id)
             ## add into rec_aids if closeness_user_reading_ids not in current_user_reading_ids and top_n < 10
             rec_aids +=list(np.setdiff1d(closeness_user_reading_ids,current_user_reading_ids))
-            if len(rec_aids) > self.top_n:
+            if len(rec_aids) > top_n:
                 break
-        recs=rec_aids[:self.top_n]
+        recs=rec_aids[:top_n]
         return recs # return your recommendations for this user_id
 
     def get_top_sorted_articles(self, article_ids):
@@ -147,7 +200,7 @@ class UCFRecommender():
              before choosing those with fewer total interactions.
         Args:
         article_ids - (str) article id list
-        user_item - (pandas dataframe) matrix of users by articles:
+        self.uim - (UserItemMatrix) sparse matrix of users by articles:
                 1's when a user has interacted with an article, 0 otherwise
 
         Return:
@@ -156,12 +209,11 @@ class UCFRecommender():
 
         Other Details - sort the df_articles by number of interactions where highest of each is higher in the dataframe
         '''
-        #sort the df_articles by number of interactions where highest of each is higher in the dataframe
-        df_articles=self.user_item.sum(axis=0).sort_values(ascending=False).reset_index()
-        df_articles.columns=['article_id','num_interactions']
+        #sort the articles by number of interactions where highest of each is higher
+        sorted_ids=self.uim.article_ids[np.argsort(self.article_rank)]
 
         # get the ordered article_ids sort by num_interactions
-        sorted_aids=df_articles.loc[df_articles['article_id'].isin(article_ids),'article_id'].values.tolist()
+        sorted_aids=sorted_ids[np.isin(sorted_ids, np.asarray(article_ids, dtype='float'))].tolist()
         sorted_names=self.get_article_names(sorted_aids)
         return sorted_aids,sorted_names
 
@@ -170,7 +222,7 @@ class UCFRecommender():
         '''
         INPUT:
         user_id - (int)
-        self.user_item - (pandas dataframe) matrix of users by articles:
+        self.uim - (UserItemMatrix) sparse matrix of users by articles:
                 1's when a user has interacted with an article, 0 otherwise
 
 
@@ -186,26 +238,67 @@ class UCFRecommender():
         '''
         # according to user_id to get most similar neighbor_ids and similarity
         ## compute similarity of each user to the provided user
-        user_sim=self.user_item.loc[user_id,:].dot(self.user_item.T)
-        ## sort by similarity
-        user_sim=user_sim.sort_values(ascending=False).reset_index()
+        user_sim=self.user_similarity(user_id)
+        user_sim=pd.DataFrame({'neighbor_id':self.uim.user_ids,
+                               'similarity':user_sim,
+                               'num_interactions':self.uim.user_counts})
 
         # remove the own user's id
-        user_sim=user_sim.loc[~(user_sim.user_id==user_id),:]
-        # calculate  num_interactions
-        user_articles=self.user_item.sum(axis=1).reset_index()
-        user_sim=user_sim.merge(user_articles, how='left',on='user_id')
-        user_sim.columns=['neighbor_id','similarity','num_interactions']
+        user_sim=user_sim.loc[~(user_sim.neighbor_id==user_id),:]
         # sort the neighbors_df by the similarity and then by number of interactions
         neighbors_df=user_sim.sort_values(['similarity','num_interactions'],ascending=False)
         return neighbors_df # Return the dataframe specified in the doc_string
 
 
-    def user_advance_recs(self, user_id, top_n=10):
+    def refresh_neighbors(self, uim, user_ids, catalog=None):
+        '''
+        INPUT:
+        uim - (UserItemMatrix) the user-item matrix including new interactions
+        user_ids - (list) the users whose interactions changed
+        catalog - (ArticleCatalog) catalog including new articles, the current one when None
+
+        OUTPUT:
+        ucfr - (UCFRecommender) a new recommender on uim, this one is left as is
+
+        Description:
+        Refresh the neighbor lists of the touched users only. The current recommender is not modified,
+        so a request running on it keeps a consistent matrix, neighbor index and article rank.
+        '''
+        ucfr=copy.copy(self)
+        ucfr.uim=uim
+        ucfr.neighbors=self.neighbors.refresh(uim, user_ids)
+        ucfr.article_rank=ucfr.create_article_rank()
+        ucfr._user_item=None
+        if catalog is not None:
+            ucfr.catalog=catalog
+        return ucfr
+
+    def sorted_neighbor_ids(self, user_id):
         '''
         INPUT:
         user_id - (int) a user id
-        top_n - (int) the number of recommendations you want for the user
+
+        OUTPUT:
+        neighbor_ids - generator of neighbor user ids, sorted by the similarity and then by number of interactions
+
+        Description:
+        The first K neighbors come from the precomputed index, the rest (rarely needed) from a full
+        get_top_sorted_users ranking.
+        '''
+        neighbor_ids,_=self.neighbors.neighbors(user_id)
+        for u_id in neighbor_ids.tolist():
+            yield u_id
+        if len(neighbor_ids) < self.neighbors.k:
+            return
+        df_neighbors=self.get_top_sorted_users(user_id)
+        for u_id in df_neighbors['neighbor_id'].values[len(neighbor_ids):].tolist():
+            yield u_id
+
+    def user_advance_recs(self, user_id, top_n=None):
+        '''
+        INPUT:
+        user_id - (int) a user id
+        top_n - (int) the number of recommendations you want for the user, self.top_n when None
 
         OUTPUT:
         recs - (list) a list of recommendations for the user by article id
@@ -224,45 +317,115 @@ class UCFRecommender():
         before choosing those with fewer total interactions.
 
         '''
-        if top_n != 10:
-            self.top_n = top_n
+        top_n = self.top_n if top_n is None else top_n
+        if user_id not in self.uim.user_index:
+            # a new user has no neighbors to learn from
+            return [], []
+
+        row=self.uim.user_row(user_id)
+        # articles the user read or that are already recommended
+        excluded=np.zeros(self.uim.shape[1], dtype=bool)
+        excluded[self.uim.csr[row].indices]=True
+        rec_cols=[]
+        # According to user_id to find out the most similar user_ids (closeness_user_ids), sorted by
+        # the similarity and then by number of interactions where highest of each comes first
+        closeness_user_ids=self.sorted_neighbor_ids(user_id)
+        # Score RANK_BITS neighbors at a time, stop once enough articles are found
+        while len(rec_cols) < top_n:
+            block_ids=[u_id for _, u_id in zip(range(RANK_BITS), closeness_user_ids)]
+            if len(block_ids) == 0:
+                break
+            block_rows=[self.uim.user_row(u_id) for u_id in block_ids]
+            weights=self.neighbor_weights(len(block_rows))
+            scores=self.uim.csr[block_rows].T.dot(weights)
+            cols=self.rank_candidates(scores, excluded, len(block_rows))
+            excluded[cols]=True
+            rec_cols+=cols.tolist()
+        recs=self.uim.article_ids[rec_cols[:top_n]].tolist()
+        rec_names=self.get_article_names(recs)
+        return recs, rec_names
 
-        # define variable:
-        closeness_user_ids=[]
-        current_user_reading_ids=[]
-        closeness_user_reading_ids=[]
-        rec_aids=[]
-        rec_aids_names=[]
+    @staticmethod
+    def neighbor_weights(n_block):
+        '''
+        Description:
+        weight 2**(n_block-1) for the closest neighbor down to 1 for the last one, so the highest
+        set bit of an article score tells which neighbor read it first
+        '''
+        return 2.0**np.arange(n_block-1, -1, -1)
 
+    def rank_candidates(self, scores, excluded, n_block):
+        '''
+        INPUT:
+        scores - (np array) weighted neighbor counts per article column, see neighbor_weights
+        excluded - (np array of bool) article columns that cannot be recommended
+        n_block - (int) number of neighbors that were scored
 
-        # df_neighbors sort the neighbors_df by the similarity and then by number of interactions where \
-        # highest of each is higher in the dataframe
-        df_neighbors=self.get_top_sorted_users(user_id)
-        # According to user_id to find out the most similar user_ids list(closeness_user_ids)
-        closeness_user_ids=df_neighbors['neighbor_id'].values.tolist()
-        # Get the current user's reading  ids list(current_user_reading_ids)
-        current_user_reading_ids,_=self.get_user_articles(user_id)
-        # For each user - finds articles the user hasn't seen before and provides them as recs
-        for u_id in closeness_user_ids:
-            ## Get the reading id lists(closeness_reading_ids) of each user in the closeness_user_reading_ids
-            closeness_user_reading_ids,_=self.get_user_articles(u_id)
-            ## add into rec_aids if closeness_user_reading_ids not in current_user_reading_ids and m < 10
-            np_diff=np.setdiff1d(closeness_user_reading_ids,current_user_reading_ids)
-            diff=list(np.setdiff1d(np_diff,rec_aids))
-            if len(diff) > 0:
-                sorted_uid_aids,sorted_uid_names=self.get_top_sorted_articles(diff)
-                rec_aids +=sorted_uid_aids
-                rec_aids_names += sorted_uid_names
-            if len(rec_aids)>self.top_n:
-                break
-        recs=rec_aids[:self.top_n]
-        rec_names=rec_aids_names[:self.top_n]
-        return recs, rec_names
+        OUTPUT:
+        cols - (np array) candidate article columns, ordered by the first neighbor that read them and
+               then by number of interactions
+        '''
+        cols=np.where((scores > 0) & ~excluded)[0]
+        _, exponent=np.frexp(scores[cols])
+        first_neighbor=n_block-exponent
+        order=np.lexsort((self.article_rank[cols], first_neighbor))
+        return cols[order]
+
+    def recommend_many(self, user_ids, top_n=None, batch_size=1024):
+        '''
+        INPUT:
+        user_ids - (list) user ids
+        top_n - (int) the number of recommendations you want for each user, self.top_n when None
+        batch_size - (int) the number of users scored by one matrix multiply
+
+        OUTPUT:
+        recs - (dict) user id -> (recs, rec_names) the same as user_advance_recs returns, users missing from
+               the user-item matrix get empty lists
+
+        Description:
+        Batched user_advance_recs for offline precompute jobs. The precomputed neighbors of a batch
+        of users are scored against the user-item matrix in a single sparse product; users whose
+        top-K neighbors do not hold enough unseen articles go through user_advance_recs.
+        '''
+        top_n = self.top_n if top_n is None else top_n
+        recs={u_id: ([], []) for u_id in user_ids}
+        known=[u_id for u_id in user_ids if u_id in self.uim.user_index]
+        n_articles=self.uim.shape[1]
+        width=min(self.neighbors.neighbor_ids.shape[1], RANK_BITS)
+        for start in range(0, len(known), batch_size):
+            batch_ids=known[start:start+batch_size]
+            rows=np.array([self.uim.user_row(u_id) for u_id in batch_ids], dtype=np.int64)
+            nbr_ids=self.neighbors.neighbor_ids[[self.neighbors.user_index[u_id] for u_id in batch_ids], :width]
+            valid=nbr_ids >= 0
+            nbr_rows=np.searchsorted(self.uim.user_ids, nbr_ids[valid])
+            weights=np.broadcast_to(self.neighbor_weights(width), nbr_ids.shape)[valid]
+            batch_pos=np.repeat(np.arange(len(batch_ids)), valid.sum(axis=1))
+            weight_matrix=sparse.csr_matrix((weights, (batch_pos, nbr_rows)), shape=(len(batch_ids), self.uim.shape[0]))
+            scores=weight_matrix.dot(self.uim.csr).toarray()
+            # the user's own articles cannot be recommended
+            seen=self.uim.csr[rows].tocoo()
+            scores[seen.row, seen.col]=0
+            _, exponent=np.frexp(scores)
+            keys=(width-exponent).astype(np.int64)*n_articles+self.article_rank
+            keys[scores == 0]=np.iinfo(np.int64).max
+            n_keep=min(top_n, n_articles)
+            top_cols=np.argpartition(keys, n_keep-1, axis=1)[:, :n_keep] if n_keep > 0 else np.empty((len(batch_ids), 0), dtype=np.int64)
+            top_cols=np.take_along_axis(top_cols, np.argsort(np.take_along_axis(keys, top_cols, axis=1), axis=1), axis=1)
+            n_found=(scores > 0).sum(axis=1)
+            n_scored=valid.sum(axis=1)
+            for i, u_id in enumerate(batch_ids):
+                if n_found[i] < top_n and n_scored[i] < self.uim.shape[0]-1:
+                    # the scored neighbors ran out, keep on with the full neighbor ranking
+                    recs[u_id]=self.user_advance_recs(u_id, top_n)
+                    continue
+                aids=self.uim.article_ids[top_cols[i][:n_found[i]]].tolist()
+                recs[u_id]=(aids, self.get_article_names(aids))
+        return recs
 
 
 if __name__ == '__main__':
-    from data_clean import Data_Clean
-    from ucfrecommender import UCFRecommender
+    # run from the web_app directory: python -m recommendation.ucfrecommender
+    from recommendation.data_clean import Data_Clean
 
     #instantiate data clean
     dc = Data_Clean()
@@ -0,0 +1,220 @@
+import hashlib
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+class UserItemMatrix():
+    '''
+    Class: Sparse user-item interaction store shared by the recommenders
+    Rows are user ids and columns are article ids (both sorted ascending, the same
+    order the groupby/unstack pivot produces). A cell holds 1 when the user has
+    interacted with the article. The dense DataFrame view is only built on request.
+    Next to the cells, the position of the first interaction of every (user, article) pair
+    is kept, so the articles of a user can be listed in the order they were read.
+    '''
+    def __init__(self, user_ids, article_ids, csr, first_seen=None):
+        '''
+        Description: initiate UserItemMatrix from already encoded arrays, use from_interactions to build from a dataframe
+        Args:
+         user_ids - np array of user ids, one per row
+         article_ids - np array of article ids, one per column
+         csr - scipy csr_matrix of shape (len(user_ids), len(article_ids))
+         first_seen - np array of int64, one per stored cell in csr order, ordinal of the first interaction of the
+                      pair; the cells are taken to be in read order when None
+        Return:
+         N/A
+        '''
+        self.user_ids = np.asarray(user_ids)
+        self.article_ids = np.asarray(article_ids)
+        self.csr = csr
+        self.first_seen = first_seen if first_seen is not None else np.arange(csr.nnz, dtype=np.int64)
+        self._csc = None
+        self._pair_keys = None
+        # id -> row/column position maps
+        self.user_index = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        self.article_index = {aid: j for j, aid in enumerate(self.article_ids.tolist())}
+        # interactions per user (row sums) and per article (column sums)
+        self.user_counts = np.asarray(self.csr.sum(axis=1)).ravel()
+        self.article_counts = np.asarray(self.csr.sum(axis=0)).ravel()
+
+    @classmethod
+    def from_interactions(cls, df):
+        '''
+        Description: build the sparse matrix from an interactions dataframe
+        Args:
+         df - pandas dataframe with article_id, user_id columns
+        Return:
+         UserItemMatrix
+        '''
+        return cls.from_pairs(df['user_id'].values, df['article_id'].values)
+
+    @classmethod
+    def from_pairs(cls, user_ids, article_ids):
+        '''
+        Description: build the sparse matrix from parallel arrays of user ids and article ids
+        Args:
+         user_ids - np array of user ids, in the order of the interactions
+         article_ids - np array of article ids, one per user id
+        Return:
+         UserItemMatrix
+        '''
+        user_ids, rows = np.unique(np.asarray(user_ids), return_inverse=True)
+        article_ids, cols = np.unique(np.asarray(article_ids), return_inverse=True)
+        return cls.from_cells(user_ids, article_ids, rows.ravel(), cols.ravel(), np.arange(len(rows), dtype=np.int64))
+
+    @classmethod
+    def from_cells(cls, user_ids, article_ids, rows, cols, seen):
+        '''
+        Description: build the matrix from cell positions, several interactions with the same article still count as 1
+        Args:
+         user_ids, article_ids - sorted np arrays of the row and column ids
+         rows, cols - np arrays of the row and column of every interaction
+         seen - np array of int64, ordinal of every interaction, the smallest one of a cell is kept
+        Return:
+         UserItemMatrix
+        '''
+        n_users, n_articles = len(user_ids), len(article_ids)
+        # one int64 key per interaction, sorted keys are the csr order of the cells
+        keys = np.asarray(rows, dtype=np.int64) * max(n_articles, 1) + np.asarray(cols, dtype=np.int64)
+        order = np.lexsort((seen, keys))
+        keys, seen = keys[order], np.asarray(seen, dtype=np.int64)[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        keys, seen = keys[first], seen[first]
+        index_dtype = np.int32 if max(len(keys), n_articles) < 2**31 else np.int64
+        indptr = np.zeros(n_users + 1, dtype=index_dtype)
+        np.cumsum(np.bincount(keys // max(n_articles, 1), minlength=n_users), out=indptr[1:])
+        indices = (keys % max(n_articles, 1)).astype(index_dtype)
+        csr = sparse.csr_matrix((np.ones(len(keys), dtype=np.int32), indices, indptr), shape=(n_users, n_articles))
+        uim = cls(user_ids, article_ids, csr, seen)
+        # the keys are the pair_keys of the matrix
+        uim._pair_keys = keys
+        return uim
+
+    def add_pairs(self, user_ids, article_ids):
+        '''
+        Description: a new matrix with the interactions of the given pairs added, this one is left as is
+                     so readers holding it are never affected. New users and articles get their sorted place,
+                     the new pairs are read after every pair already in the matrix.
+        Args:
+         user_ids - np array of user ids
+         article_ids - np array of article ids, one per user id
+        Return:
+         UserItemMatrix
+        '''
+        user_ids = np.asarray(user_ids, dtype=self.user_ids.dtype)
+        article_ids = np.asarray(article_ids, dtype=self.article_ids.dtype)
+        all_user_ids = np.union1d(self.user_ids, user_ids)
+        all_article_ids = np.union1d(self.article_ids, article_ids)
+        coo = self.csr.tocoo()
+        # old cells moved to their new positions, then the new cells
+        rows = np.concatenate([np.searchsorted(all_user_ids, self.user_ids)[coo.row],
+                               np.searchsorted(all_user_ids, user_ids)])
+        cols = np.concatenate([np.searchsorted(all_article_ids, self.article_ids)[coo.col],
+                               np.searchsorted(all_article_ids, article_ids)])
+        next_seen = int(self.first_seen.max()) + 1 if len(self.first_seen) > 0 else 0
+        seen = np.concatenate([self.first_seen, next_seen + np.arange(len(user_ids), dtype=np.int64)])
+        return UserItemMatrix.from_cells(all_user_ids, all_article_ids, rows, cols, seen)
+
+    def contains_pairs(self, user_ids, article_ids):
+        '''
+        Description: True for every (user id, article id) pair already in the matrix
+        Args:
+         user_ids - np array of user ids
+         article_ids - np array of article ids, one per user id
+        Return:
+         found - np array of bool
+        '''
+        user_ids, article_ids = np.asarray(user_ids), np.asarray(article_ids)
+        found = np.zeros(len(user_ids), dtype=bool)
+        if len(self.pair_keys) == 0:
+            return found
+        # the ids are sorted, a pair is known when both ids are there and its key is stored
+        rows = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+        cols = np.minimum(np.searchsorted(self.article_ids, article_ids), len(self.article_ids) - 1)
+        known = (self.user_ids[rows] == user_ids) & (self.article_ids[cols] == article_ids)
+        keys = rows[known].astype(np.int64) * self.csr.shape[1] + cols[known]
+        pos = np.minimum(np.searchsorted(self.pair_keys, keys), len(self.pair_keys) - 1)
+        found[known] = self.pair_keys[pos] == keys
+        return found
+
+    @property
+    def shape(self):
+        return self.csr.shape
+
+    @property
+    def csc(self):
+        '''
+        Description: column oriented copy of the matrix, built the first time it is needed
+        '''
+        if self._csc is None:
+            self._csc = self.csr.tocsc()
+        return self._csc
+
+    @property
+    def pair_keys(self):
+        '''
+        Description: int64 key row * number of articles + column of every stored cell, in csr order and so sorted,
+                     built the first time it is needed
+        '''
+        if self._pair_keys is None:
+            rows = np.repeat(np.arange(self.csr.shape[0], dtype=np.int64), np.diff(self.csr.indptr))
+            self._pair_keys = rows * max(self.csr.shape[1], 1) + self.csr.indices
+        return self._pair_keys
+
+    def user_row(self, user_id):
+        '''
+        Description: row position of a user id
+        Args:
+         user_id - (int) a user id
+        Return:
+         row - (int) position of the user in the matrix, raise KeyError if unknown
+        '''
+        return self.user_index[user_id]
+
+    def user_article_ids(self, user_id, in_seen_order=False):
+        '''
+        Description: article ids the user has interacted with
+        Args:
+         user_id - (int) a user id
+         in_seen_order - list them in the order the user first read them instead of by id
+        Return:
+         article_ids - np array of article ids, in column order or in read order
+        '''
+        row = self.user_row(user_id)
+        start, stop = self.csr.indptr[row], self.csr.indptr[row + 1]
+        cols = self.csr.indices[start:stop]
+        if in_seen_order:
+            return self.article_ids[cols[np.argsort(self.first_seen[start:stop], kind='stable')]]
+        return self.article_ids[np.sort(cols)]
+
+    def fingerprint(self):
+        '''
+        Description: short hash of the ids and the interactions, equal matrices have equal fingerprints
+        '''
+        digest = hashlib.sha1()
+        for values in (self.user_ids, self.article_ids, self.csr.indptr, self.csr.indices):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_frame(self):
+        '''
+        Description: dense DataFrame view, the same frame as groupby(['user_id','article_id']).size().unstack()
+        Return:
+         user_item - pandas dataframe, user ids as index and article ids as columns
+        '''
+        user_item = pd.DataFrame(self.csr.toarray().astype('int'),
+                                 index=pd.Index(self.user_ids, name='user_id'),
+                                 columns=pd.Index(self.article_ids, name='article_id'))
+        return user_item
+
+
+if __name__ == '__main__':
+    # run from the web_app directory: python -m recommendation.useritem
+    from recommendation.data_clean import Data_Clean
+
+    #instantiate data clean
+    dc = Data_Clean()
+    uim = UserItemMatrix.from_interactions(dc.interacts_clean)
+    print(uim.shape, uim.csr.nnz)
+    print(uim.to_frame().head())
@@ -0,0 +1,66 @@
+import os
+import pandas as pd
+import numpy as np
+
+class UserIdMap():
+    '''
+    Class: Persistent email -> user_id encoder
+    Emails get ids 1, 2, 3, ... in the order they are first seen. Once assigned an id never changes,
+    new emails are appended after the largest id, so the ids stay stable across restarts and new data files.
+    '''
+    # read_csv turns empty fields into NaN, so an empty string never collides with a real email
+    NULL_EMAIL = ''
+
+    def __init__(self, ids=None):
+        '''
+        Description: initiate UserIdMap
+        Args:
+         ids - dict, email -> user_id
+        Return:
+         N/A
+        '''
+        self.ids = dict(ids) if ids is not None else dict()
+        self.next_id = max(self.ids.values()) + 1 if len(self.ids) > 0 else 1
+        self.changed = False
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Description: read a map saved by save(), an empty map when the file does not exist
+        '''
+        if path is None or not os.path.exists(path):
+            return cls()
+        df = pd.read_csv(path, dtype={'email': str}, keep_default_na=False)
+        return cls(zip(df['email'].tolist(), df['user_id'].astype(int).tolist()))
+
+    def save(self, path):
+        '''
+        Description: write the map as a email,user_id csv file
+        '''
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # one temporary file per process, web workers starting on the same data write the same map
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        pd.DataFrame({'email': list(self.ids.keys()), 'user_id': list(self.ids.values())}).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.changed = False
+
+    def encode(self, emails):
+        '''
+        Description: user ids of emails, unknown emails (a missing email included) get new ids in first seen order
+        Args:
+         emails - list, np array or pandas series of emails
+        Return:
+         user_ids - np array of int user ids, one per email
+        '''
+        keys = pd.Series(np.asarray(emails, dtype=object)).fillna(self.NULL_EMAIL)
+        codes, uniques = pd.factorize(keys)
+        unique_ids = np.array([self.ids.get(email, 0) for email in uniques], dtype=np.int64)
+        new = np.flatnonzero(unique_ids == 0)
+        if len(new) > 0:
+            unique_ids[new] = np.arange(self.next_id, self.next_id + len(new))
+            self.ids.update(zip(np.asarray(uniques, dtype=object)[new].tolist(), unique_ids[new].tolist()))
+            self.next_id += len(new)
+            self.changed = True
+        return unique_ids[codes]
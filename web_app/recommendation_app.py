@@ -1,2 +1,7 @@
+# The following command invoke run.property from rec_app directory.
 from rec_app import app
-app.run(host='127.0.0.1', port=3001, debug=True)
+from rec_app.run import main
+
+# gunicorn imports app from here (see Procfile), the development server only runs when started directly
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import shutil
+import pytest
+
+# the packages are imported from the web_app directory, like the web app and the benchmarks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommendation import synthetic
+from recommendation.data_clean import Data_Clean
+from recommendation.recommender import Recommender
+
+# a synthetic dataset about 5% of the IBM data: a few hundred users, light and heavy ones
+SCALE = 0.05
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # the default paths (data/cache of the MF models, ...) are relative, they must not end up in the repository
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    '''
+    interact_pth, articles_pth of the synthetic dataset, written once per test session
+    '''
+    return synthetic.write_dataset(str(tmp_path_factory.mktemp('synthetic')), SCALE, seed=0)
+
+@pytest.fixture(scope='session')
+def data(dataset):
+    return Data_Clean(*dataset, use_snapshot=False)
+
+@pytest.fixture
+def files(dataset, tmp_path):
+    '''
+    a copy of the synthetic dataset per test, Data_Clean and add_interactions write the user map next to it
+    '''
+    return tuple(shutil.copy(path, str(tmp_path)) for path in dataset)
+
+@pytest.fixture
+def rec(files):
+    # a fresh Recommender per test, add_interactions changes it
+    return Recommender(*files)
@@ -0,0 +1,46 @@
+import os
+import json
+import pytest
+import numpy as np
+from recommendation.recommender import Recommender
+from recommendation.artifact import write_artifact, MANIFEST_FILE, ARTIFACT_FORMAT
+
+def edit_manifest(artifact_pth, **values):
+    manifest_pth = os.path.join(artifact_pth, MANIFEST_FILE)
+    with open(manifest_pth) as f:
+        manifest = json.load(f)
+    manifest.update(values)
+    with open(manifest_pth, 'w') as f:
+        json.dump(manifest, f)
+
+def test_artifact_answers_like_the_csv_files(rec, files, tmp_path):
+    artifact_pth = str(tmp_path / 'artifact')
+    manifest = write_artifact(rec, artifact_pth)
+    assert manifest['format'] == ARTIFACT_FORMAT
+    opened = Recommender(*files, artifact_pth=artifact_pth)
+    assert opened.state.model_id == rec.state.model_id
+    assert opened.state.data_id == rec.state.data_id
+    for user_id in [-1, 10**6] + rec.uim.user_ids.tolist():
+        for top_n in (1, 10):
+            assert opened.recommend_answer(user_id, top_n) == rec.recommend_answer(user_id, top_n)
+    for opened_curve, curve in zip(opened.mf_calculate_error(), rec.mf_calculate_error()):
+        np.testing.assert_array_equal(opened_curve, curve)
+
+@pytest.mark.parametrize('values', [{'format': ARTIFACT_FORMAT - 1}, {'model_id': 'other'}, {'data_id': 'other'}])
+def test_mismatching_artifact_is_rejected(rec, files, tmp_path, values):
+    artifact_pth = str(tmp_path / 'artifact')
+    write_artifact(rec, artifact_pth)
+    edit_manifest(artifact_pth, **values)
+    with pytest.raises(ValueError):
+        Recommender(*files, artifact_pth=artifact_pth)
+
+def test_artifact_of_an_updated_recommender(rec, files, tmp_path):
+    popular = rec.uim.article_ids[:3].tolist()
+    rec.add_interactions([{'email': 'late-{}@example.com'.format(i), 'article_id': aid}
+                          for i in range(5) for aid in popular])
+    artifact_pth = str(tmp_path / 'artifact')
+    write_artifact(rec, artifact_pth)
+    opened = Recommender(*files, artifact_pth=artifact_pth)
+    assert opened.state[:3] == rec.state[:3]
+    for user_id in rec.uim.user_ids.tolist():
+        assert opened.recommend_answer(user_id, 10) == rec.recommend_answer(user_id, 10)
@@ -0,0 +1,45 @@
+import numpy as np
+from recommendation.cbrecommender import CBRecommender
+from recommendation.useritem import UserItemMatrix
+from recommendation.ingest import InteractionStream
+
+def read_order(df, user_id):
+    # the articles of a user in the order of the interactions, like the reading_users frame of the notebook
+    return df.loc[df['user_id'] == user_id, 'article_id'].drop_duplicates().astype('str').tolist()
+
+def reference_recs(cbr, df, user_id, top_n):
+    article_ids = read_order(df, user_id)
+    recs = []
+    for art_id in article_ids:
+        recs += cbr.get_article_names(np.setdiff1d(cbr.find_similar_article_ids(art_id), article_ids))
+        if len(recs) > top_n:
+            return recs[:top_n]
+    return recs
+
+def test_user_articles_in_read_order(dataset, data):
+    df = data.interacts_clean
+    head, tail = df.iloc[:len(df) // 2], df.iloc[len(df) // 2:]
+    added = UserItemMatrix.from_interactions(head).add_pairs(tail['user_id'].values, tail['article_id'].values)
+    streamed = InteractionStream(chunksize=300).ingest(dataset[0]).user_item()
+    for uim in (UserItemMatrix.from_interactions(df), added, streamed):
+        for user_id in uim.user_ids.tolist():
+            assert uim.user_article_ids(user_id, in_seen_order=True).astype('str').tolist() == read_order(df, user_id)
+
+def test_make_content_recs_follows_read_order(data):
+    df = data.interacts_clean
+    cbr = CBRecommender(data.articles_clean, df, catalog=data.catalog)
+    for user_id in cbr.users.tolist():
+        for top_n in (3, 10):
+            assert cbr.make_content_recs(user_id, top_n) == reference_recs(cbr, df, user_id, top_n)
+
+def test_content_recs_ids_cover_the_titles(data):
+    cbr = CBRecommender(data.articles_clean, data.interacts_clean, catalog=data.catalog)
+    for user_id in cbr.users.tolist():
+        seen = set(cbr.uim.user_article_ids(user_id).tolist())
+        for top_n in (3, 10):
+            rec_ids, recs = cbr.content_recs(user_id, top_n)
+            assert recs == cbr.make_content_recs(user_id, top_n)
+            assert len(rec_ids) == len(set(rec_ids)) <= top_n
+            assert not seen & set(rec_ids)
+            assert set(recs) <= {data.catalog.title(aid) for aid in rec_ids}
+    assert cbr.content_recs(10**6, 5) == ([], [])
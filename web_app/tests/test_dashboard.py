@@ -0,0 +1,44 @@
+import os
+import importlib.util
+from flask import Flask
+
+WEB_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_dashboard():
+    # importing the rec_app package starts the web app on data/, the module is loaded on its own instead
+    spec = importlib.util.spec_from_file_location('dashboard', os.path.join(WEB_APP, 'rec_app', 'dashboard.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def client(rec, path):
+    module = load_dashboard()
+    app = Flask(__name__, template_folder=os.path.join(WEB_APP, 'rec_app', 'templates'))
+    dashboard = module.Dashboard(rec, path)
+    dashboard.thread.join()
+    module.init_dashboard(app, dashboard)
+    return app.test_client(), dashboard
+
+def test_unchanged_dashboard_is_not_sent_again(rec, tmp_path):
+    test_client, dashboard = client(rec, str(tmp_path / 'dashboard.json'))
+    assert dashboard.error is None
+    for url in ('/index', '/dashboard.json'):
+        response = test_client.get(url)
+        assert response.status_code == 200
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        assert test_client.get(url, headers={'If-None-Match': etag}).status_code == 304
+        assert test_client.get(url, headers={'If-Modified-Since': last_modified}).status_code == 304
+        assert test_client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+    graphs = test_client.get('/dashboard.json').get_json()
+    assert graphs['model_id'] == rec.state.model_id
+    assert len(graphs['graphs']) == 4
+
+def test_failed_build_is_reported(rec, tmp_path):
+    # the directory of the file is a file, writing it fails
+    (tmp_path / 'blocked').write_text('')
+    test_client, dashboard = client(rec, str(tmp_path / 'blocked' / 'dashboard.json'))
+    response = test_client.get('/dashboard.json')
+    assert response.status_code == 503
+    body = response.get_json()
+    assert body['error'] == 'building the dashboard failed: {}'.format(dashboard.error)
+    assert 'FileExistsError' in dashboard.error and body['refreshing'] is False
@@ -0,0 +1,41 @@
+import os
+import shutil
+import pandas as pd
+from recommendation.data_clean import Data_Clean
+from recommendation.usermap import UserIdMap
+
+def copy_dataset(dataset, directory):
+    return [shutil.copy(path, str(directory)) for path in dataset]
+
+def test_reading_the_data_saves_the_user_map_once(dataset, tmp_path):
+    interact_pth, articles_pth = copy_dataset(dataset, tmp_path)
+    dc = Data_Clean(interact_pth, articles_pth)
+    assert sorted(os.listdir(str(tmp_path))) == sorted([os.path.basename(interact_pth), os.path.basename(articles_pth),
+                                                        os.path.basename(dc.user_map_pth)])
+    assert UserIdMap.load(dc.user_map_pth).ids == dc.user_map.ids
+    mtime = os.stat(dc.user_map_pth).st_mtime_ns
+    # the emails are all known now, nothing is written again
+    assert not Data_Clean(interact_pth, articles_pth).user_map.changed
+    assert not Data_Clean(interact_pth, articles_pth, chunksize=500).user_map.changed
+    assert os.stat(dc.user_map_pth).st_mtime_ns == mtime
+
+def test_new_emails_do_not_move_the_old_ids(dataset, tmp_path):
+    interact_pth, articles_pth = copy_dataset(dataset, tmp_path)
+    interacts = pd.read_csv(interact_pth, index_col=0)
+    old_ids = Data_Clean(interact_pth, articles_pth).user_map.ids
+    # a new log with other emails read before the known ones
+    early = interacts.iloc[:50].assign(email=['early-{}@example.com'.format(i % 10) for i in range(50)])
+    pd.concat([early, interacts], ignore_index=True).to_csv(interact_pth)
+    for chunksize in (None, 500):
+        ids = Data_Clean(interact_pth, articles_pth, chunksize=chunksize).user_map.ids
+        assert {email: ids[email] for email in old_ids} == old_ids
+        assert sorted(set(ids) - set(old_ids)) == ['early-{}@example.com'.format(i) for i in range(10)]
+        assert min(ids[email] for email in set(ids) - set(old_ids)) == len(old_ids) + 1
+
+def test_compile_saves_the_user_map_with_the_snapshot(dataset, tmp_path):
+    interact_pth, articles_pth = copy_dataset(dataset, tmp_path)
+    dc = Data_Clean(interact_pth, articles_pth)
+    dc.compile()
+    assert UserIdMap.load(dc.user_map_pth).ids == dc.user_map.ids
+    loaded = Data_Clean(interact_pth, articles_pth)
+    assert loaded.interacts_clean['user_id'].tolist() == dc.interacts_clean['user_id'].tolist()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from recommendation import factorization
+from recommendation.factorization import dense_svd, truncated_svd, randomized_svd, implicit_als, factorize, BACKENDS
+from recommendation.useritem import UserItemMatrix
+
+@pytest.fixture(scope='module')
+def user_item(data):
+    return UserItemMatrix.from_interactions(data.interacts_clean).csr
+
+def reconstruction_error(user_item, u, s, vt):
+    return np.linalg.norm(user_item.toarray() - u.dot(np.diag(s)).dot(vt))
+
+def test_dense_svd_reconstructs_the_matrix(user_item):
+    u, s, vt = dense_svd(user_item)
+    assert reconstruction_error(user_item, u, s, vt) < 1e-8
+    assert np.all(np.diff(s) <= 0)
+
+@pytest.mark.parametrize('backend, rtol', [(truncated_svd, 1e-6), (randomized_svd, 1e-2)])
+def test_sparse_backends_match_dense_svd(user_item, backend, rtol):
+    k = 10
+    u, s, vt = backend(user_item, k=k)
+    assert u.shape == (user_item.shape[0], k) and s.shape == (k,) and vt.shape == (k, user_item.shape[1])
+    dense_u, dense_s, dense_vt = dense_svd(user_item, k=k)
+    np.testing.assert_allclose(s, dense_s, rtol=rtol)
+    # the rank k error is the smallest possible one, the one of the dense svd
+    assert reconstruction_error(user_item, u, s, vt) <= reconstruction_error(user_item, dense_u, dense_s, dense_vt) * (1 + rtol)
+
+def test_implicit_als_shapes_and_orthonormal_factors(user_item):
+    u, s, vt = implicit_als(user_item, k=8, iterations=3)
+    assert u.shape == (user_item.shape[0], 8) and s.shape == (8,) and vt.shape == (8, user_item.shape[1])
+    np.testing.assert_allclose(u.T.dot(u), np.eye(8), atol=1e-8)
+    np.testing.assert_allclose(vt.dot(vt.T), np.eye(8), atol=1e-8)
+    assert np.all(np.diff(s) <= 0)
+
+def reference_als_step(ratings, fixed, alpha, regularization):
+    # one linear system per row
+    k = fixed.shape[1]
+    gram = fixed.T.dot(fixed) + regularization * np.eye(k)
+    solved = np.zeros((ratings.shape[0], k))
+    for row in range(ratings.shape[0]):
+        cols = ratings.indices[ratings.indptr[row]:ratings.indptr[row + 1]]
+        if len(cols) > 0:
+            factors = fixed[cols]
+            solved[row] = np.linalg.solve(gram + alpha * factors.T.dot(factors), (1.0 + alpha) * factors.sum(axis=0))
+    return solved
+
+@pytest.mark.parametrize('block_entries', [2**24, 64 * 5, 1])
+def test_als_step_matches_one_solve_per_row(user_item, monkeypatch, block_entries):
+    # tiny blocks solve a few rows, or a single one, at a time
+    monkeypatch.setattr(factorization, 'ALS_BLOCK_ENTRIES', block_entries)
+    ratings = user_item.astype(np.float64)
+    fixed = np.random.RandomState(0).normal(size=(ratings.shape[1], 8))
+    # a user without interactions keeps zero factors
+    ratings = ratings[np.r_[0, np.arange(ratings.shape[0])]].tolil()
+    ratings[0, :] = 0
+    ratings = ratings.tocsr()
+    ratings.eliminate_zeros()
+    np.testing.assert_allclose(factorization._als_step(ratings, fixed, 40.0, 0.1),
+                               reference_als_step(ratings, fixed, 40.0, 0.1), rtol=1e-8, atol=1e-10)
+
+def test_factorize_dispatches_and_rejects_unknown_backends(user_item):
+    for backend in BACKENDS:
+        u, s, vt = factorize(user_item, backend=backend, k=5)
+        assert u.shape == (user_item.shape[0], 5) and vt.shape == (5, user_item.shape[1])
+    np.testing.assert_allclose(factorize(user_item, 'truncated', k=5)[1], truncated_svd(user_item, k=5)[1])
+    with pytest.raises(ValueError):
+        factorize(user_item, backend='nmf')
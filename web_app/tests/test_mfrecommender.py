@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import pytest
+from recommendation.useritem import UserItemMatrix
+from recommendation.mfrecommender import MFRecommender
+
+def make_mfr(data, cache_dir, backend='dense', n_factors=None):
+    df = data.interacts_clean
+    train_uim = UserItemMatrix.from_interactions(df.head(len(df) // 2))
+    test_uim = UserItemMatrix.from_interactions(df.tail(len(df) // 2))
+    return MFRecommender(None, None, cache_dir=cache_dir, backend=backend, n_factors=n_factors,
+                         train_uim=train_uim, test_uim=test_uim, catalog=data.catalog)
+
+def test_save_model_keeps_the_models_of_other_settings(data, tmp_path):
+    cache_dir = str(tmp_path)
+    other = make_mfr(data, cache_dir, backend='als')
+    other.save_model({'s_train': np.ones(3)})
+    mfr = make_mfr(data, cache_dir)
+    # a model of older data with the same backend and factors
+    stale = mfr.model_prefix() + '0123456789abcdef.npz'
+    open(stale, 'wb').close()
+    mfr.save_model({'s_train': np.zeros(3)})
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(path) for path in (other.model_path(), mfr.model_path()))
+
+    reloaded = make_mfr(data, cache_dir)
+    np.testing.assert_array_equal(reloaded.load_model()['s_train'], np.zeros(3))
+
+def dense_errors(u, s, vt, actual, latent_factors_num):
+    # the notebook loop: one full prediction per number of latent factors
+    actual = actual.toarray()
+    return np.array([np.abs(np.round(u[:, :lf].dot(np.diag(s[:lf])).dot(vt[:lf, :])) - actual).sum()
+                     for lf in latent_factors_num])
+
+@pytest.mark.parametrize('chunk_rows', [7, 10000])
+def test_sweep_error_matches_dense_reference(data, tmp_path, monkeypatch, chunk_rows):
+    monkeypatch.setattr(MFRecommender, 'SWEEP_CHUNK_ROWS', chunk_rows)
+    mfr = make_mfr(data, str(tmp_path))
+    actual = mfr.train_uim.csr
+    u, s, vt = np.linalg.svd(actual.toarray(), full_matrices=False)
+    latent_factors_num = [1, 2, 5, 10, 20, 40, len(s), len(s) + 10]
+    expected = dense_errors(u, s, vt, actual, latent_factors_num)
+    np.testing.assert_array_equal(mfr.sweep_error(u, s, vt, actual, latent_factors_num, dtype=np.float64), expected)
+    # float32 rounds a few predictions near 0.5 the other way: at most 0.1% of the cells
+    errors = mfr.sweep_error(u, s, vt, actual, latent_factors_num)
+    assert np.all(np.abs(errors - expected) <= 1e-3 * actual.shape[0] * actual.shape[1])
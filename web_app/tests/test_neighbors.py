@@ -0,0 +1,38 @@
+import numpy as np
+from recommendation.useritem import UserItemMatrix
+from recommendation.neighbors import NeighborIndex
+
+def dense_neighbors(uim, user_id, k):
+    # every other user by similarity, then number of interactions, then the smaller user id
+    dense = uim.csr.toarray()
+    sims = dense.dot(dense[uim.user_row(user_id)])
+    order = sorted((-sims[i], -uim.user_counts[i], uid) for i, uid in enumerate(uim.user_ids.tolist()) if uid != user_id)
+    return [uid for _, _, uid in order[:k]], [-sim for sim, _, _ in order[:k]]
+
+def test_build_matches_dense_ranking(data):
+    uim = UserItemMatrix.from_interactions(data.interacts_clean)
+    index = NeighborIndex.build(uim, k=10)
+    for user_id in uim.user_ids.tolist():
+        neighbor_ids, similarity = index.neighbors(user_id)
+        expected_ids, expected_sims = dense_neighbors(uim, user_id, 10)
+        assert neighbor_ids.tolist() == expected_ids
+        assert similarity.tolist() == expected_sims
+
+def test_build_with_few_users_pads_the_lists():
+    uim = UserItemMatrix.from_pairs(np.array([1, 1, 2, 3]), np.array([10.0, 11.0, 10.0, 12.0]))
+    index = NeighborIndex.build(uim, k=5)
+    neighbor_ids, similarity = index.neighbors(1)
+    assert neighbor_ids.tolist() == [2, 3]
+    assert similarity.tolist() == [1, 0]
+
+def test_refresh_matches_build(data):
+    df = data.interacts_clean
+    head, tail = df.iloc[:len(df) * 3 // 4], df.iloc[len(df) * 3 // 4:]
+    uim = UserItemMatrix.from_interactions(head)
+    index = NeighborIndex.build(uim, k=10)
+    updated_uim = uim.add_pairs(tail['user_id'].values, tail['article_id'].values)
+    refreshed = index.refresh(updated_uim, np.unique(tail['user_id'].values).tolist())
+    rebuilt = NeighborIndex.build(updated_uim, k=10)
+    np.testing.assert_array_equal(refreshed.user_ids, rebuilt.user_ids)
+    np.testing.assert_array_equal(refreshed.neighbor_ids, rebuilt.neighbor_ids)
+    np.testing.assert_array_equal(refreshed.similarity, rebuilt.similarity)
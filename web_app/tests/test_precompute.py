@@ -0,0 +1,56 @@
+import os
+import json
+import pytest
+from recommendation.precompute import precompute, PrecomputedRecommendations, PRECOMPUTE_FORMAT, MANIFEST_FILE
+
+def test_precomputed_answers_match_recommender(rec, tmp_path):
+    out_pth = str(tmp_path / 'precomputed')
+    precompute(rec, out_pth, strategies=('rank', 'ucf', 'content'), top_n=10, shard_size=100, workers=0)
+    table = PrecomputedRecommendations(out_pth)
+    assert table.model_id == rec.state.model_id
+    for user_id in rec.uim.user_ids.tolist() + [-1, 10**6]:
+        for top_n in (1, 10):
+            assert table.recommend_answer(user_id, top_n) == tuple(rec.recommend_answer(user_id, top_n))
+            assert table.recommend(user_id, top_n) == rec.recommend(user_id, top_n)
+    assert table.recommend_answer(1, 11) is None
+
+def read_files(out_pth):
+    files = dict()
+    for name in sorted(os.listdir(out_pth)):
+        with open(os.path.join(out_pth, name), 'rb') as f:
+            files[name] = f.read()
+    return files
+
+def test_resume_rebuilds_only_the_missing_shard(rec, tmp_path):
+    out_pth = str(tmp_path / 'precomputed')
+    report = precompute(rec, out_pth, strategies=('rank', 'ucf'), top_n=10, shard_size=100, workers=0)
+    n_users = len(rec.uim.user_ids)
+    assert report['ucf'][0] == n_users > 200
+    before = read_files(out_pth)
+    os.remove(os.path.join(out_pth, 'ucf.00001.recs.npy'))
+    shard_mtimes = {name: os.stat(os.path.join(out_pth, name)).st_mtime_ns for name in before if name.startswith('ucf.00000')}
+
+    report = precompute(rec, out_pth, strategies=('rank', 'ucf'), top_n=10, shard_size=100, workers=0)
+    assert report['ucf'][0] == 100
+    assert read_files(out_pth) == before
+    assert {name: os.stat(os.path.join(out_pth, name)).st_mtime_ns for name in shard_mtimes} == shard_mtimes
+
+def test_format_mismatch_is_rejected_and_rebuilt(rec, tmp_path):
+    out_pth = str(tmp_path / 'precomputed')
+    precompute(rec, out_pth, strategies=('rank', 'ucf'), top_n=10, shard_size=100, workers=0)
+    manifest_pth = os.path.join(out_pth, MANIFEST_FILE)
+    with open(manifest_pth) as f:
+        manifest = json.load(f)
+    manifest['format'] = PRECOMPUTE_FORMAT - 1
+    with open(manifest_pth, 'w') as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError):
+        PrecomputedRecommendations(out_pth)
+
+    # resuming does not keep shards of another format
+    report = precompute(rec, out_pth, strategies=('rank', 'ucf'), top_n=10, shard_size=100, workers=0)
+    assert report['ucf'][0] == len(rec.uim.user_ids)
+    table = PrecomputedRecommendations(out_pth)
+    assert table.manifest['format'] == PRECOMPUTE_FORMAT
+    user_id = int(rec.uim.user_ids[0])
+    assert table.recommend(user_id, 10) == rec.recommend(user_id, 10)
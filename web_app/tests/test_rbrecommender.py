@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from recommendation.rbrecommender import RBRecommender
+
+def reference_ranking(df, weights):
+    # the weighted interactions of every (article_id, title) from scratch, ties go to the smaller article id
+    frame = pd.DataFrame({'article_id': df['article_id'].values.astype('float'), 'title': df['title'].values,
+                          'weight': weights})
+    scores = frame.groupby(['article_id', 'title'])['weight'].sum().reset_index()
+    scores = scores.sort_values(['weight', 'article_id'], ascending=[False, True], kind='stable')
+    return scores['article_id'].astype('str').tolist(), scores['title'].tolist()
+
+def ranking(rbr):
+    article_ids, titles = rbr.ranking
+    return article_ids.tolist(), titles
+
+def weights(n, window=None, half_life=None):
+    weights = np.ones(n) if half_life is None else 2.0 ** (np.arange(n) / half_life)
+    if window is not None:
+        weights[:max(n - window, 0)] = 0
+    return weights
+
+@pytest.mark.parametrize('window, half_life', [(None, None), (200, None), (None, 50), (None, 1), (300, 20)])
+def test_ranking_matches_groupby(data, window, half_life):
+    df = data.interacts_clean
+    rbr = RBRecommender(df, window=window, half_life=half_life)
+    assert ranking(rbr) == reference_ranking(df, weights(len(df), window, half_life))
+    # plenty of articles share a count, the tie order is part of the answer
+    assert len(set(rbr.scores.tolist())) < len(rbr.scores) or half_life is not None
+
+@pytest.mark.parametrize('window, half_life', [(None, None), (200, None), (None, 50), (None, 1)])
+def test_add_interactions_matches_groupby(data, window, half_life):
+    df = data.interacts_clean
+    rbr = RBRecommender(df.iloc[:300], window=window, half_life=half_life)
+    before = ranking(rbr)
+    refreshed = rbr.refresh_interactions(df.iloc[300:600])
+    refreshed.add_interactions(df.iloc[600:])
+    assert ranking(refreshed) == reference_ranking(df, weights(len(df), window, half_life))
+    assert ranking(rbr) == before
+    assert refreshed.get_top_articles(5) == ranking(refreshed)[1][:5]
+    assert refreshed.get_top_article_ids(5) == ranking(refreshed)[0][:5]
@@ -0,0 +1,202 @@
+import random
+import pytest
+import threading
+import numpy as np
+from recommendation.recommender import Recommender
+from recommendation.cache import RecommendationCache, LocalBackend
+from recommendation.metrics import Metrics
+from recommendation.segments import NEW, LIGHT, HEAVY
+
+def update_batch(rec, n_users=10, n_articles=4, seed=0):
+    # new users reading popular articles, they enter the neighbor lists of existing users
+    rng = random.Random(seed)
+    popular = rec.uim.article_ids[np.argsort(-rec.uim.article_counts)[:20]].tolist()
+    return [{'email': 'new-user-{}@example.com'.format(i), 'article_id': article_id}
+            for i in range(n_users)
+            for article_id in rng.sample(popular, n_articles)]
+
+def new_user_ids(rec, n_users=10):
+    # the user map gives the emails of update_batch the next ids
+    return list(range(rec.user_map.next_id, rec.user_map.next_id + n_users))
+
+def test_recommend_routes_by_segment(rec):
+    strategies = {NEW: 'rank', LIGHT: 'content', HEAVY: 'ucf'}
+    for user_id in rec.uim.user_ids.tolist()[:100] + [-1, 10**6]:
+        recs, strategy = rec.recommend(user_id, 5)
+        assert strategy in (strategies[rec.segments.segment(user_id)], 'rank')
+        assert len(recs) <= 5
+        assert recs == rec.recommend_articles(user_id, 5)
+
+def test_add_interactions_matches_rebuilt_recommender(files, rec):
+    batch = update_batch(rec)
+    assert rec.add_interactions(batch) == len(batch)
+    # the same interactions once more add nothing
+    assert rec.add_interactions(batch) == 0
+    rebuilt = Recommender(*files)
+    rebuilt.add_interactions(batch)
+    for user_id in rec.uim.user_ids.tolist():
+        assert rec.recommend(user_id, 10) == rebuilt.recommend(user_id, 10)
+
+def test_concurrent_reads_see_one_state(files, rec):
+    # every answer given while an update is published is the single threaded answer before or after it
+    batch = update_batch(rec)
+    rng = random.Random(1)
+    asked = rng.sample(rec.uim.user_ids.tolist(), 60) + [-1] + new_user_ids(rec)
+    requests = [(user_id, top_n) for user_id in asked for top_n in (1, 5, 10)]
+    before = {key: rec.recommend_articles(*key) for key in requests}
+    reference = Recommender(*files)
+    reference.add_interactions(batch)
+    after = {key: reference.recommend_articles(*key) for key in requests}
+
+    errors = []
+    published = threading.Event()
+    done = threading.Event()
+
+    def reader(seed):
+        local = random.Random(seed)
+        n = 0
+        while not done.is_set() or n < 200:
+            key = local.choice(requests)
+            was_published = published.is_set()
+            recs = rec.recommend_articles(*key)
+            if recs not in ([after[key]] if was_published else [before[key], after[key]]):
+                errors.append((key, recs))
+            n += 1
+
+    def writer():
+        rec.add_interactions(batch)
+        published.set()
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(4)]
+    for thread in readers:
+        thread.start()
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    writer_thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+    assert errors == []
+    assert {key: rec.recommend_articles(*key) for key in requests} == after
+
+@pytest.mark.parametrize('batch', [
+    [{'user_id': 1, 'article_id': float('nan')}],
+    [{'user_id': 1, 'article_id': None, 'title': None}],
+    [{'user_id': 1, 'article_id': 'abc', 'title': 'abc'}],
+    [{'user_id': 1, 'title': 'no id'}],
+    [{'user_id': 1.5, 'article_id': 1.0}],
+    [{'user_id': 'abc', 'article_id': 1.0}],
+    [{'user_id': None, 'article_id': 1.0}],
+    [{'article_id': 1.0}],
+], ids=['nan article', 'null article', 'text article', 'no article', 'fractional user', 'text user', 'null user', 'no user'])
+def test_add_interactions_rejects_invalid_ids(rec, batch):
+    state = rec.state
+    with pytest.raises(ValueError):
+        rec.add_interactions(batch)
+    assert rec.state is state
+    assert np.isfinite(rec.uim.article_ids).all()
+
+@pytest.mark.parametrize('user_id', [3000000000, -1, 0], ids=['too large', 'negative', 'zero'])
+def test_add_interactions_rejects_user_ids_not_given_out(rec, user_id):
+    # the segment table is indexed by user id, a huge id would allocate it and -1 would overwrite the last user
+    state = rec.state
+    article_id = float(rec.uim.article_ids[0])
+    with pytest.raises(ValueError):
+        rec.add_interactions([{'user_id': user_id, 'article_id': article_id}])
+    assert rec.state is state
+    assert len(rec.segments.table) == len(state.segments.table)
+
+def test_add_interactions_accepts_known_user_ids(rec):
+    user_id = int(rec.uim.user_ids.max())
+    unseen = sorted(set(rec.uim.article_ids.tolist()) - set(rec.uim.user_article_ids(user_id).tolist()))
+    assert rec.add_interactions([{'user_id': user_id, 'article_id': unseen[0]}]) == 1
+    assert unseen[0] in rec.uim.user_article_ids(user_id).tolist()
+
+@pytest.mark.parametrize('startup', ['eager', 'parallel', 'background', 'lazy'])
+def test_builders_are_released_once_built(files, startup):
+    rec = Recommender(*files, startup=startup)
+    for name in ('ucfr', 'cbr', 'mfr'):
+        rec.component(name)
+    # the builder closures hold the Data_Clean frames
+    assert rec.builders == {} and rec.futures == {}
+    assert rec.executor is None
+
+def test_cache_follows_published_versions(files):
+    rec = Recommender(*files, cache=RecommendationCache())
+    users = {segment: rec.segments.user_ids(segment)[:20].tolist() for segment in (LIGHT, HEAVY)}
+    asked = [10**6] + users[LIGHT] + users[HEAVY]
+    for user_id in asked:
+        rec.recommend(user_id, 5)
+    # many new users reading the least read articles move them up the ranking
+    rarest = rec.uim.article_ids[np.argsort(rec.uim.article_counts)[:5]].tolist()
+    batch = [{'email': 'reader-{}@example.com'.format(i), 'article_id': article_id}
+             for i in range(40) for article_id in rarest]
+    rank_before = rec.recommend(10**6, 5)
+    rec.add_interactions(batch)
+    reference = Recommender(*files)
+    reference.add_interactions(batch)
+    assert rec.recommend(10**6, 5) == reference.recommend(10**6, 5) != rank_before
+    hits = rec.cache.hits
+    for user_id in users[LIGHT] + users[HEAVY]:
+        assert rec.recommend(user_id, 5) == reference.recommend(user_id, 5)
+    # only the content answers of the light users, whose interactions did not change, are still cached
+    content = [user_id for user_id in users[LIGHT] if reference.recommend(user_id, 5)[1] == 'content']
+    assert rec.cache.hits - hits == len(content)
+
+def test_shared_cache_keeps_the_batches_of_processes_apart(files):
+    # two workers behind one shared cache, each applies its own batch and so gets to the same version
+    shared = LocalBackend()
+    workers = [Recommender(*files, cache=RecommendationCache(backend=shared)) for _ in range(2)]
+    batches = [update_batch(workers[0], seed=seed) for seed in (1, 2)]
+    references = []
+    for worker, batch in zip(workers, batches):
+        worker.add_interactions(batch)
+        reference = Recommender(*files)
+        reference.add_interactions(batch)
+        references.append(reference)
+    assert workers[0].state.version == workers[1].state.version
+    assert workers[0].state.data_id != workers[1].state.data_id
+    user_ids = [10**6] + workers[0].uim.user_ids.tolist()
+    for worker, reference in zip(workers, references):
+        for user_id in user_ids:
+            assert worker.recommend(user_id, 5) == reference.recommend(user_id, 5)
+    # the content answers of light users untouched by both batches are shared
+    assert workers[1].cache.backend_hits > 0
+
+def test_answers_carry_the_article_ids(rec):
+    # a new article with the title of the most read one, read by enough new users to rank first
+    top_id = rec.rbr.get_top_article_ids(1)[0]
+    title = rec.catalog.title(top_id)
+    rec.add_interactions([{'email': 'twin-{}@example.com'.format(i), 'article_id': 99999.0, 'title': title}
+                          for i in range(200)])
+    answer = rec.recommend_answer(10**6, 5)
+    assert answer.strategy == 'rank'
+    assert answer.article_ids[:2] == [99999.0, float(top_id)]
+    assert [rec.catalog.title(aid) for aid in answer.article_ids] == answer.recs
+    for user_id in rec.uim.user_ids.tolist():
+        answer = rec.recommend_answer(user_id, 5)
+        assert (answer.recs, answer.strategy) == rec.recommend(user_id, 5)
+        assert len(answer.article_ids) == len(set(answer.article_ids)) <= 5
+        assert set(answer.recs) <= {rec.catalog.title(aid) for aid in answer.article_ids}
+    user_ids = rec.uim.user_ids.tolist()[:50] + [10**6]
+    answers = rec.recommend_many(user_ids, 5)
+    assert answers == {user_id: rec.recommend_answer(user_id, 5) for user_id in user_ids}
+
+def test_metrics_count_fallbacks_once_and_time_each_recommender(files):
+    rec = Recommender(*files, cache=RecommendationCache(), metrics=Metrics())
+    # a heavy user who read every article, the collaborative filtering has nothing left to recommend
+    rec.add_interactions([{'email': 'reads-all@example.com', 'article_id': aid} for aid in rec.uim.article_ids.tolist()])
+    user_id = rec.user_map.next_id - 1
+    light_user = rec.segments.user_ids(LIGHT)[0]
+    for _ in range(3):
+        assert rec.recommend(user_id, 5)[1] == 'rank'
+        rec.recommend(light_user, 5)
+        rec.recommend(10**6, 5)
+    counters = rec.metrics.counters
+    assert counters[('rec_fallbacks_total', (('reason', 'empty'), ('segment', 'heavy')))] == 1
+    assert counters[('rec_requests_total', (('source', 'cache'), ('strategy', 'rank')))] == 4
+    stages = {dict(labels)['stage']: histogram[2] for (name, labels), histogram in rec.metrics.histograms.items()
+              if name == 'rec_stage_seconds'}
+    assert stages['ucf'] == stages['fallback'] == 1
+    assert stages['content'] == stages['rank'] == 1
+    assert stages['lookup'] == 9 and stages['route'] == 3
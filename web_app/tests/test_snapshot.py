@@ -0,0 +1,36 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from recommendation import snapshot
+
+def write(data, snapshot_pth, sources, interacts):
+    snapshot.write_snapshot(snapshot_pth, sources, interacts, data.articles,
+                            interacts.drop_duplicates(), data.articles.drop_duplicates(subset=['article_id']))
+
+def test_round_trip_keeps_the_frames(data, tmp_path):
+    snapshot_pth = str(tmp_path / 'snapshot')
+    interacts = data.interacts.copy()
+    interacts.loc[interacts.index[[0, 5, 6]], 'title'] = np.nan
+    write(data, snapshot_pth, data.sources, interacts)
+    with open(os.path.join(snapshot_pth, snapshot.META_FILE)) as f:
+        kinds = {c['name']: c['kind'] for c in json.load(f)['frames']['interacts']}
+    # the titles are stored as codes into their categories, the missing ones as -1
+    assert kinds == {'article_id': 'numeric', 'title': 'category', 'user_id': 'numeric'}
+
+    frames = snapshot.read_snapshot(snapshot_pth)
+    expected = (interacts, data.articles, interacts.drop_duplicates(), data.articles.drop_duplicates(subset=['article_id']))
+    for got, want in zip(frames, expected):
+        pd.testing.assert_frame_equal(got, want)
+    assert frames[0]['title'].isnull().sum() == 3
+
+def test_touching_a_source_makes_it_stale(data, files, tmp_path):
+    snapshot_pth = str(tmp_path / 'snapshot')
+    write(data, snapshot_pth, list(files), data.interacts)
+    assert snapshot.is_fresh(snapshot_pth, list(files))
+    # a source written after the snapshot, same size
+    later = time.time() + 10
+    os.utime(files[1], (later, later))
+    assert not snapshot.is_fresh(snapshot_pth, list(files))
+    assert not snapshot.is_fresh(snapshot_pth, list(reversed(files)))
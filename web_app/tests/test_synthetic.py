@@ -0,0 +1,38 @@
+import os
+import filecmp
+import pandas as pd
+from recommendation import synthetic
+
+# the header rows of user-item-interactions.csv and articles_community.csv of the IBM data
+INTERACTIONS_HEADER = ',article_id,title,email'
+ARTICLES_HEADER = ',doc_body,doc_description,doc_full_name,doc_status,article_id'
+
+def header(path):
+    with open(path) as f:
+        return f.readline().rstrip('\n')
+
+def test_files_have_the_ibm_schema(dataset, data):
+    interact_pth, articles_pth = dataset
+    assert header(interact_pth) == INTERACTIONS_HEADER
+    assert header(articles_pth) == ARTICLES_HEADER
+    interacts = pd.read_csv(interact_pth)
+    assert interacts['article_id'].dtype == 'float64'
+    assert interacts['email'].isnull().any() and interacts['title'].notnull().all()
+    assert pd.read_csv(articles_pth)['article_id'].dtype == 'int64'
+    # what Data_Clean makes of them
+    assert data.interacts.columns.tolist() == ['article_id', 'title', 'user_id']
+    assert data.articles_clean['article_id'].is_unique
+    assert len(data.articles_clean) < len(data.articles)
+
+def test_same_seed_writes_the_same_files(tmp_path):
+    first = synthetic.write_dataset(str(tmp_path / 'first'), 0.02, seed=3)
+    second = synthetic.write_dataset(str(tmp_path / 'second'), 0.02, seed=3)
+    other = synthetic.write_dataset(str(tmp_path / 'other'), 0.02, seed=4)
+    for a, b, c in zip(first, second, other):
+        assert filecmp.cmp(a, b, shallow=False)
+        assert not filecmp.cmp(a, c, shallow=False)
+    assert [os.path.basename(path) for path in first] == [synthetic.INTERACTIONS_FILE, synthetic.ARTICLES_FILE]
+    # the IBM sizes times the scale
+    interacts = pd.read_csv(first[0])
+    assert len(interacts) == round(synthetic.IBM_SIZE['n_interactions'] * 0.02)
+    assert interacts['email'].nunique() == round(synthetic.IBM_SIZE['n_users'] * 0.02)
@@ -0,0 +1,50 @@
+import pytest
+from recommendation.ucfrecommender import UCFRecommender
+
+def reference_recs(ucfr, user_id, top_n):
+    # the notebook loop: neighbors by similarity then interactions, the unseen articles of each one by popularity
+    neighbors = ucfr.get_top_sorted_users(user_id)
+    seen = set(ucfr.uim.user_article_ids(user_id).tolist())
+    popularity = dict(zip(ucfr.uim.article_ids.tolist(), ucfr.uim.article_counts.tolist()))
+    recs = []
+    # the dataframe sort is not stable on ties, the smaller user id comes first like in the index
+    ordered = sorted(zip(neighbors['similarity'], neighbors['num_interactions'], neighbors['neighbor_id']),
+                     key=lambda row: (-row[0], -row[1], row[2]))
+    for _, _, neighbor_id in ordered:
+        articles = [aid for aid in ucfr.uim.user_article_ids(neighbor_id).tolist() if aid not in seen]
+        for aid in sorted(articles, key=lambda aid: (-popularity[aid], aid)):
+            seen.add(aid)
+            recs.append(aid)
+        if len(recs) >= top_n:
+            break
+    return recs[:top_n]
+
+@pytest.fixture(scope='module', params=[50, 3], ids=['k50', 'k3'])
+def ucfr(request, data):
+    # with 3 neighbors most users need more than the precomputed lists
+    return UCFRecommender(data.interacts_clean, catalog=data.catalog, n_neighbors=request.param)
+
+def heavy_users(ucfr):
+    return [uid for uid, count in zip(ucfr.uim.user_ids.tolist(), ucfr.uim.user_counts.tolist()) if count >= 3]
+
+@pytest.mark.parametrize('top_n', [1, 5, 10])
+def test_user_advance_recs_matches_reference(data, ucfr, top_n):
+    for user_id in heavy_users(ucfr)[:60]:
+        recs, rec_names = ucfr.user_advance_recs(user_id, top_n)
+        assert recs == reference_recs(ucfr, user_id, top_n)
+        assert rec_names == data.catalog.get_article_names(recs)
+
+@pytest.mark.parametrize('top_n', [1, 10, 40])
+def test_recommend_many_matches_user_advance_recs(data, ucfr, top_n):
+    user_ids = ucfr.uim.user_ids.tolist()
+    recs = ucfr.recommend_many(user_ids, top_n, batch_size=64)
+    assert set(recs) == set(user_ids)
+    for user_id in user_ids:
+        assert recs[user_id] == ucfr.user_advance_recs(user_id, top_n)
+
+def test_unknown_users_get_empty_lists(ucfr):
+    user_id = ucfr.uim.user_ids.tolist()[0]
+    assert ucfr.user_advance_recs(10**6, 5) == ([], [])
+    recs = ucfr.recommend_many([user_id, 10**6, -1], 5)
+    assert recs[10**6] == ([], []) and recs[-1] == ([], [])
+    assert recs[user_id] == ucfr.user_advance_recs(user_id, 5)
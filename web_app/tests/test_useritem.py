@@ -0,0 +1,65 @@
+import numpy as np
+from recommendation.useritem import UserItemMatrix
+
+def dense_reference(df):
+    # the user_item matrix of the notebook: groupby/unstack, 1 where a user read an article
+    user_item = df.groupby(['user_id', 'article_id'])['title'].count().unstack()
+    return user_item.notnull().astype('int')
+
+def test_from_interactions_matches_dense_pivot(data):
+    df = data.interacts_clean
+    uim = UserItemMatrix.from_interactions(df)
+    expected = dense_reference(df)
+    np.testing.assert_array_equal(uim.user_ids, expected.index.values)
+    np.testing.assert_array_equal(uim.article_ids, expected.columns.values)
+    np.testing.assert_array_equal(uim.csr.toarray(), expected.values)
+    np.testing.assert_array_equal(uim.user_counts, expected.values.sum(axis=1))
+    np.testing.assert_array_equal(uim.article_counts, expected.values.sum(axis=0))
+
+def test_user_article_ids(data):
+    df = data.interacts_clean
+    uim = UserItemMatrix.from_interactions(df)
+    for user_id in uim.user_ids[:50].tolist():
+        expected = np.sort(df.loc[df['user_id'] == user_id, 'article_id'].unique())
+        np.testing.assert_array_equal(uim.user_article_ids(user_id), expected)
+
+def test_add_pairs_matches_rebuild(data):
+    df = data.interacts_clean
+    head, tail = df.iloc[:len(df) // 2], df.iloc[len(df) // 2:]
+    uim = UserItemMatrix.from_interactions(head)
+    before = uim.csr.toarray().copy()
+    updated = uim.add_pairs(tail['user_id'].values, tail['article_id'].values)
+    full = UserItemMatrix.from_interactions(df)
+    np.testing.assert_array_equal(updated.user_ids, full.user_ids)
+    np.testing.assert_array_equal(updated.article_ids, full.article_ids)
+    np.testing.assert_array_equal(updated.csr.toarray(), full.csr.toarray())
+    assert updated.fingerprint() == full.fingerprint()
+    # the matrix readers hold is left as is
+    np.testing.assert_array_equal(uim.csr.toarray(), before)
+
+def test_contains_pairs(data):
+    df = data.interacts_clean
+    uim = UserItemMatrix.from_interactions(df)
+    user_ids = df['user_id'].values[:20]
+    article_ids = df['article_id'].values[:20]
+    assert uim.contains_pairs(user_ids, article_ids).all()
+    unknown = uim.contains_pairs(np.array([user_ids[0], -5]), np.array([-1.0, article_ids[0]]))
+    assert not unknown.any()
+
+def test_contains_pairs_matches_the_dense_matrix(data):
+    uim = UserItemMatrix.from_interactions(data.interacts_clean)
+    updated = uim.add_pairs(np.array([uim.user_ids[0], 10**6]), np.array([uim.article_ids[-1], 99999.0]))
+    # a matrix opened from its arrays builds its keys itself
+    opened = UserItemMatrix(updated.user_ids, updated.article_ids, updated.csr, updated.first_seen)
+    rng = np.random.default_rng(0)
+    for matrix in (uim, updated, opened):
+        rows = rng.integers(0, len(matrix.user_ids), 2000)
+        cols = rng.integers(0, len(matrix.article_ids), 2000)
+        dense = matrix.csr.toarray().astype(bool)
+        found = matrix.contains_pairs(matrix.user_ids[rows], matrix.article_ids[cols])
+        np.testing.assert_array_equal(found, dense[rows, cols])
+        assert found.any()
+    np.testing.assert_array_equal(opened.pair_keys, updated.pair_keys)
+    assert updated.contains_pairs(np.array([10**6, 10**6]), np.array([99999.0, uim.article_ids[0]])).tolist() == [True, False]
+    empty = UserItemMatrix.from_pairs(np.array([], dtype=np.int64), np.array([]))
+    assert empty.contains_pairs(np.array([1]), np.array([1.0])).tolist() == [False]